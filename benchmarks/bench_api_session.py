@@ -0,0 +1,120 @@
+"""API session benchmark.
+
+Compares a fresh ``aiohttp.ClientSession`` per request (the former
+``ApiService.get`` behaviour) against the pooled session owned by
+``ApiService``, using a local aiohttp stand-in for the Redy API.
+
+Run with::
+
+    python -m benchmarks.bench_api_session [-n REQUESTS] [-c CONCURRENCY]
+
+Note that the stand-in server is plain HTTP on localhost, so the numbers
+exclude the TLS handshake and DNS lookup that dominate against the real
+API. The pooled gain in production is therefore larger than shown here.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable
+from typing import Callable
+from typing import List
+
+import aiohttp
+from aiohttp import web
+from edp.redy.services.api import ApiService
+from edp.redy.services.houses.constants import HOUSES_URL
+
+HOUSES = {"houses": [{"houseId": str(i), "name": f"House {i}"} for i in range(5)]}
+
+
+class _StubCognitoUser:
+    @property
+    async def id_token(self):
+        return "token"
+
+
+class _StubAuth:
+    cognito_user = _StubCognitoUser()
+
+
+async def _start_server() -> web.AppRunner:
+    async def houses(request: web.Request) -> web.Response:
+        return web.json_response(HOUSES)
+
+    app = web.Application()
+    app.router.add_get(HOUSES_URL, houses)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+def _base_url(runner: web.AppRunner) -> str:
+    host, port = runner.addresses[0][:2]
+    return f"http://{host}:{port}"
+
+
+async def _run(
+    request: Callable[[], Awaitable], requests: int, concurrency: int
+) -> List[float]:
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed():
+        async with semaphore:
+            start = time.perf_counter()
+            await request()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(timed() for _ in range(requests)))
+    return latencies
+
+
+def _report(name: str, latencies: List[float], elapsed: float):
+    ordered = sorted(latencies)
+    p50 = statistics.median(ordered) * 1000
+    p99 = ordered[int(len(ordered) * 0.99) - 1] * 1000
+    print(
+        f"{name:<20} {len(ordered) / elapsed:>10.1f} req/s "
+        f"p50={p50:>7.2f} ms p99={p99:>7.2f} ms"
+    )
+
+
+async def main(requests: int, concurrency: int):
+    """Run the benchmark."""
+    runner = await _start_server()
+    base_url = _base_url(runner)
+
+    async def per_request_session():
+        async with aiohttp.ClientSession() as session, session.get(
+            base_url + HOUSES_URL, headers={"authorization": "token"}
+        ) as response:
+            await response.text()
+            return await response.json()
+
+    api = ApiService(auth=_StubAuth(), base_url=base_url)  # type: ignore
+    await api.start()
+
+    async def pooled_session():
+        return await api.get(HOUSES_URL)
+
+    try:
+        for name, request in (
+            ("per-request session", per_request_session),
+            ("pooled session", pooled_session),
+        ):
+            start = time.perf_counter()
+            latencies = await _run(request, requests, concurrency)
+            _report(name, latencies, time.perf_counter() - start)
+    finally:
+        await api.stop()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("-n", "--requests", type=int, default=2000)
+    args.add_argument("-c", "--concurrency", type=int, default=10)
+    parsed = args.parse_args()
+    asyncio.run(main(parsed.requests, parsed.concurrency))
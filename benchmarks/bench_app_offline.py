@@ -0,0 +1,115 @@
+"""Offline app benchmark.
+
+Times ``App.start``, ``Energy.in_dates`` and the ``RedyEnergyDevice``
+notification against the bundled fake Redy server, with a configurable
+artificial latency per response. A cassette recorded from a real account
+(``Cassette(path, mode=CassetteMode.Record)`` given to the ``ApiService``)
+can be served instead of the synthetic house.
+
+Run with::
+
+    python -m benchmarks.bench_app_offline [-n ITERATIONS] [-l LATENCY_MS]
+        [--cassette PATH]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable
+from typing import Callable
+from typing import Optional
+
+from edp.redy.app import App
+from edp.redy.cli.cli import RedyEnergyDevice
+from edp.redy.services.api import ApiService
+from edp.redy.services.cassette import Cassette
+from edp.redy.services.devices.models.modulesmodel import Resolution
+from edp.redy.services.devices.service import DevicesService
+from edp.redy.services.energy.service import EnergyService
+from edp.redy.services.fakeserver import FakeRedyServer
+from edp.redy.services.houses.service import HousesService
+from edp.redy.services.statevars.service import StateVariablesService
+
+
+class _StubCognitoUser:
+    @property
+    async def id_token(self):
+        return "token"
+
+
+class _StubAuth:
+    cognito_user = _StubCognitoUser()
+
+
+class _StubStream:
+    def add_devices(self, devices):
+        return self
+
+    def add_callback(self, on_notification_cb, on_response_cb):
+        return self
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+def _app(base_url: str) -> App:
+    api = ApiService(auth=_StubAuth(), base_url=base_url)  # type: ignore
+    return App(
+        HousesService(api),
+        EnergyService(api),
+        DevicesService(api),
+        StateVariablesService(api),
+        _StubStream(),  # type: ignore
+        api,
+    )
+
+
+async def _time(name: str, func: Callable[[], Awaitable], iterations: int):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await func()
+        latencies.append(time.perf_counter() - start)
+    print(
+        f"{name:<24} mean={statistics.mean(latencies) * 1000:>8.2f} ms "
+        f"max={max(latencies) * 1000:>8.2f} ms"
+    )
+
+
+async def main(iterations: int, latency: float, cassette: Optional[str]):
+    """Run the benchmark."""
+    async with FakeRedyServer(
+        cassette=Cassette(cassette) if cassette else None, latency=latency
+    ) as server:
+        apps = []
+
+        async def start():
+            app = _app(server.url)
+            await app.start()
+            apps.append(app)
+
+        await _time("App.start", start, iterations)
+        app = apps[-1]
+        for resolution in (Resolution.QuarterHour, Resolution.Day, Resolution.Month):
+            await _time(
+                f"Energy.in_dates({resolution.name})",
+                lambda r=resolution: app.energy.in_dates(r),
+                iterations,
+            )
+        device = RedyEnergyDevice(app.energy)
+        await _time("RedyEnergyDevice notify", device._notify_energy, iterations)
+        print(f"\n{server.requests} requests served")
+        for app in apps:
+            await app.stop()
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("-n", "--iterations", type=int, default=20)
+    args.add_argument("-l", "--latency", type=float, default=50, help="ms")
+    args.add_argument("--cassette", help="Cassette file served by the server")
+    parsed = args.parse_args()
+    asyncio.run(main(parsed.iterations, parsed.latency / 1000, parsed.cassette))
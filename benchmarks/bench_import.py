@@ -0,0 +1,91 @@
+"""Import time benchmark.
+
+Measures, with ``python -X importtime`` in fresh interpreters, the cold
+import time of the modules loaded by the ``redy`` CLI and the REST
+consumers. It fails when the median exceeds the budget, or when a lazily
+imported dependency (boto3, warrant, awscrt, awsiotsdk) is loaded at import
+time.
+
+Run with::
+
+    python -m benchmarks.bench_import [-n RUNS] [--budget MS]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+MODULES = ("edp.redy.app", "edp.redy.cli.cli")
+
+# Dependencies that must only be imported on first use
+LAZY_DEPENDENCIES = ("boto3", "botocore", "warrant", "awscrt", "awsiot")
+
+# Default budget of the median import time of each module, in milliseconds
+IMPORT_BUDGET_MS = 800
+
+
+def import_time(module: str) -> Tuple[float, Dict[str, float]]:
+    """Import a module in a fresh interpreter.
+
+    Returns:
+        Tuple[float, Dict[str, float]]: The cumulative import time of the
+            module, and of every top level package imported, in milliseconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    packages: Dict[str, float] = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        name = name.strip()
+        milliseconds = int(cumulative) / 1000
+        if name == module:
+            total = milliseconds
+        package = name.split(".")[0]
+        packages[package] = max(packages.get(package, 0), milliseconds)
+    return total, packages
+
+
+def main(runs: int, budget: float) -> int:
+    """Run the benchmark.
+
+    Returns:
+        int: The exit status, 1 if the budget was exceeded
+    """
+    status = 0
+    for module in MODULES:
+        times: List[float] = []
+        packages: Dict[str, float] = {}
+        for _ in range(runs):
+            total, packages = import_time(module)
+            times.append(total)
+        median = statistics.median(times)
+        print(f"{module:<20} median={median:>7.1f} ms max={max(times):>7.1f} ms")
+        slowest = sorted(packages.items(), key=lambda item: -item[1])[:5]
+        print("  " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in slowest))
+
+        eager = [name for name in LAZY_DEPENDENCIES if name in packages]
+        if eager:
+            print(f"  FAIL: imported eagerly: {', '.join(eager)}")
+            status = 1
+        if median > budget:
+            print(f"  FAIL: over the {budget:.0f} ms budget")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("-n", "--runs", type=int, default=5)
+    args.add_argument("--budget", type=float, default=IMPORT_BUDGET_MS, help="ms")
+    parsed = args.parse_args()
+    sys.exit(main(parsed.runs, parsed.budget))
@@ -0,0 +1,87 @@
+"""Metering response decoding benchmark.
+
+Compares the former ``ApiService.get`` decoding (body decoded into text,
+then decoded again and parsed by ``response.json()``) against a single read
+of the raw bytes parsed by each available JSON backend.
+
+The payloads mimic the metering endpoint responses (``energyChart`` and
+``totals``), for quarter-hour resolution over a day, a week and a month.
+
+Run with::
+
+    python -m benchmarks.bench_json [-n ITERATIONS]
+"""
+import argparse
+import json
+import random
+import timeit
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import Dict
+
+from edp.redy.services.jsonbackend import get_json_backend
+from edp.redy.services.jsonbackend import PREFERRED_BACKENDS
+
+
+def metering_payload(days: int) -> bytes:
+    """Build a quarter-hour metering response, covering the given days."""
+    rnd = random.Random(days)
+    start = datetime(2023, 1, 1)
+    chart = []
+    for quarter in range(days * 96):
+        value = round(rnd.uniform(0, 2), 3)
+        chart.append(
+            {
+                "date": (start + timedelta(minutes=15 * quarter)).strftime(
+                    "%Y-%m-%d %H:%M:%S"
+                ),
+                "value": {"N": value, "D": value},
+                "cost": {"N": round(value * 0.15, 4), "D": round(value * 0.15, 4)},
+            }
+        )
+    payload: Dict[str, Any] = {
+        "energyChart": chart,
+        "totals": {
+            "value": {"N": sum(i["value"]["N"] for i in chart), "D": 0},
+            "cost": {"N": sum(i["cost"]["N"] for i in chart), "D": 0},
+        },
+    }
+    return json.dumps(payload).encode()
+
+
+def _former(body: bytes) -> Any:
+    # response.text() followed by response.json(), which decodes again
+    body.decode("utf-8")
+    return json.loads(body.decode("utf-8"))
+
+
+def main(iterations: int):
+    """Run the benchmark."""
+    backends = []
+    for name in PREFERRED_BACKENDS:
+        try:
+            backends.append(get_json_backend(name))
+        except ImportError:
+            print(f"{name} not installed, skipped")
+
+    for days in (1, 7, 31):
+        body = metering_payload(days)
+        print(f"\n{days * 96} quarter-hours, {len(body) / 1024:.0f} KiB")
+        former = timeit.timeit(lambda: _former(body), number=iterations)
+        print(f"  {'text + json()':<16} {former / iterations * 1e6:>9.1f} us")
+        for backend in backends:
+            elapsed = timeit.timeit(
+                lambda loads=backend.loads: loads(body), number=iterations
+            )
+            print(
+                f"  {'bytes + ' + backend.name:<16} "
+                f"{elapsed / iterations * 1e6:>9.1f} us "
+                f"({former / elapsed:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("-n", "--iterations", type=int, default=200)
+    main(args.parse_args().iterations)
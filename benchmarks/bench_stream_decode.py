@@ -0,0 +1,146 @@
+"""Realtime payload decoding benchmark.
+
+Measures the messages per second handled by the ``StreamService`` message
+callback, from the raw MQTT payload to the message queued for the loop. The
+former decoding (``json.loads(payload.decode())``, every variable kept) is
+compared with parsing the bytes by each available JSON backend, with and
+without the subscribed variables filter used by ``Power``.
+
+The filter only skips the parsing of the payloads without any subscribed
+variable (the module updates here). The others are still parsed whole, and
+their other variables dropped afterwards, which costs a little in the
+callback: the saving is in the work done after it, on fewer and smaller
+messages.
+
+The payloads mimic the realtime notifications of a smart meter, mixed with
+module updates without any power variable. Payloads recorded from a real
+account, one JSON document per line, can be given instead.
+
+Run with::
+
+    python -m benchmarks.bench_stream_decode [-n MESSAGES] [--payloads PATH]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List
+from typing import Optional
+
+from edp.redy.app import POWER_VARIABLES
+from edp.redy.services.ingest import StreamMessage
+from edp.redy.services.jsonbackend import get_json_backend
+from edp.redy.services.jsonbackend import JsonBackend
+from edp.redy.services.jsonbackend import PREFERRED_BACKENDS
+from edp.redy.services.stream import StreamService
+
+
+def realtime_payloads(count: int) -> List[bytes]:
+    """Build realtime notifications and module updates, 3 to 1."""
+    rnd = random.Random(count)
+    payloads = []
+    for sequence in range(count):
+        local_id = f"module-{sequence % 4}"
+        if sequence % 4 == 3:
+            state_variables = {
+                "rssi": {"value": rnd.randint(-90, -40), "unit": "dBm"},
+                "firmware": {"value": "1.2.3"},
+                "connectivity": {"value": "CONNECTED"},
+            }
+        else:
+            state_variables = {
+                name: {"value": round(rnd.uniform(0, 5000), 1), "unit": unit}
+                for name, unit in (
+                    ("emeter:power_aplus", "W"),
+                    ("emeter:power_aminus", "W"),
+                    ("emeter:voltage", "V"),
+                    ("emeter:current", "A"),
+                    ("emeter:frequency", "Hz"),
+                    ("emeter:power_factor", ""),
+                    ("emeter:reactive_power", "var"),
+                    ("emeter:energy_aplus", "Wh"),
+                    ("emeter:energy_aminus", "Wh"),
+                )
+            }
+        payloads.append(
+            json.dumps(
+                {
+                    "messageType": "notification",
+                    "operationType": "realtime"
+                    if sequence % 4 != 3
+                    else "module/update",
+                    "timestamp": 1672531200000 + sequence * 1000,
+                    "data": [{"localId": local_id, "stateVariables": state_variables}],
+                }
+            ).encode()
+        )
+    return payloads
+
+
+class _CountingQueue:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def put_threadsafe(self, message: StreamMessage):
+        self.count += 1
+
+
+def _service(backend: JsonBackend, variables) -> StreamService:
+    service = StreamService(
+        auth=None,  # type: ignore
+        json_backend=backend,
+        variables=variables,
+    )
+    # The queue is replaced, to measure the decoding only
+    service._queue = _CountingQueue()  # type: ignore
+    service._loop = asyncio.new_event_loop()
+    return service
+
+
+def _run(name: str, service: StreamService, payloads: List[bytes]):
+    callback = service._on_message_received
+    start = time.perf_counter()
+    for payload in payloads:
+        callback("topic", payload, False, 1, False)
+    elapsed = time.perf_counter() - start
+    service._loop.close()  # type: ignore
+    print(
+        f"{name:<32} {len(payloads) / elapsed:>10.0f} msg/s "
+        f"({service._queue.count} of {len(payloads)} queued)"  # type: ignore
+    )
+
+
+def main(messages: int, payloads_path: Optional[str]):
+    """Run the benchmark."""
+    if payloads_path:
+        with open(payloads_path, "rb") as file:
+            payloads = [line.strip() for line in file if line.strip()]
+    else:
+        payloads = realtime_payloads(messages)
+
+    former = JsonBackend(
+        name="json",
+        loads=lambda payload: json.loads(payload.decode()),
+        dumps=json.dumps,
+    )
+    _run("json, payload.decode() (former)", _service(former, None), payloads)
+    for name in PREFERRED_BACKENDS:
+        try:
+            backend = get_json_backend(name)
+        except ImportError:
+            continue
+        for variables in (None, POWER_VARIABLES):
+            _run(
+                f"{name}, bytes{', variables filter' if variables else ''}",
+                _service(backend, variables),
+                payloads,
+            )
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("-n", "--messages", type=int, default=50000)
+    args.add_argument("--payloads", help="Recorded payloads, one per line")
+    parsed = args.parse_args()
+    main(parsed.messages, parsed.payloads)
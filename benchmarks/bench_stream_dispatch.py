@@ -0,0 +1,177 @@
+"""Stream dispatch benchmark.
+
+Feeds synthetic realtime payloads to the ``StreamService`` message callback
+from a producer thread, as the awscrt threads do, and measures the messages
+per second reaching the notification callback, and their latency. The
+handoff to the loop owning the service is compared with the previous
+dispatch, which ran every callback in a new loop with ``asyncio.run``.
+A slow consumer can be simulated, to compare the ingest queue overflow
+policies.
+
+Run with::
+
+    python -m benchmarks.bench_stream_dispatch [-n MESSAGES] [-d DEVICES]
+        [-p POLICY] [-q QUEUE_SIZE] [-c CONSUMER_DELAY_MS]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+
+from edp.redy.services.ingest import OverflowPolicy
+from edp.redy.services.stream import StreamService
+
+
+def _payload(device: int, sequence: int) -> bytes:
+    return json.dumps(
+        {
+            "messageType": "notification",
+            "operationType": "realtime",
+            "data": [
+                {
+                    "localId": f"module-{device}",
+                    "stateVariables": {
+                        "emeter:power_aplus": {"value": sequence % 5000},
+                        "emeter:power_aminus": {"value": 0},
+                    },
+                    "sent": time.perf_counter(),
+                }
+            ],
+        }
+    ).encode()
+
+
+def _produce(service: StreamService, messages: int, devices: int):
+    topics = [f"wifi/device-{device}/fromDev/realtime" for device in range(devices)]
+    for sequence in range(messages):
+        device = sequence % devices
+        service._on_message_received(
+            topics[device], _payload(device, sequence), False, 1, False
+        )
+
+
+def _asyncio_run_dispatch(service: StreamService, payload: bytes):
+    # The previous dispatch, running the callbacks in a new loop per message
+    payload_data = json.loads(payload.decode())
+    for data in payload_data["data"]:
+        asyncio.run(
+            service._on_notification_cb(  # type: ignore
+                operation_type=payload_data["operationType"], data=data
+            )
+        )
+
+
+def _report(name: str, messages: int, elapsed: float, latencies: List[float]):
+    if not latencies:
+        print(f"{name:<22} no message dispatched")
+        return
+    latencies.sort()
+    print(
+        f"{name:<22} {messages / elapsed:>10.0f} msg/s "
+        f"p50={statistics.median(latencies) * 1000:>7.3f} ms "
+        f"p99={latencies[int(len(latencies) * 0.99)] * 1000:>7.3f} ms"
+    )
+
+
+async def _handoff(
+    messages: int,
+    devices: int,
+    policy: OverflowPolicy,
+    queue_size: int,
+    consumer_delay: float,
+):
+    service = StreamService(
+        auth=None,
+        queue_size=queue_size,
+        overflow_policy=policy,  # type: ignore
+    )
+    latencies: List[float] = []
+
+    async def on_notification(operation_type: str, data: Dict[str, Any]):
+        latencies.append(time.perf_counter() - data["sent"])
+        if consumer_delay:
+            await asyncio.sleep(consumer_delay)
+
+    service.add_callback(on_notification_cb=on_notification)
+    service._start_dispatcher()
+    start = time.perf_counter()
+    producer = threading.Thread(target=_produce, args=(service, messages, devices))
+    producer.start()
+    while producer.is_alive():
+        await asyncio.sleep(0.01)
+    produced = time.perf_counter() - start
+    while True:
+        stats = service.ingest_stats()
+        assert stats
+        if stats.received == messages and stats.depth == 0:
+            break
+        await asyncio.sleep(0.001)
+    # Let the callback of the last message finish
+    await asyncio.sleep(consumer_delay)
+    elapsed = time.perf_counter() - start
+    await service._stop_dispatcher()
+    _report(f"handoff {policy.value}", len(latencies), elapsed, latencies)
+    print(
+        f"{'':<22} produced in {produced * 1000:.0f} ms, "
+        f"max depth={stats.max_depth} dropped={stats.dropped} "
+        f"conflated={stats.conflated} lag mean={stats.lag_mean * 1000:.3f} ms "
+        f"max={stats.lag_max * 1000:.3f} ms"
+    )
+
+
+def _per_message_loop(messages: int, devices: int):
+    service = StreamService(auth=None)  # type: ignore
+    latencies: List[float] = []
+
+    async def on_notification(operation_type: str, data: Dict[str, Any]):
+        latencies.append(time.perf_counter() - data["sent"])
+
+    service.add_callback(on_notification_cb=on_notification)
+    service._on_message_received = (  # type: ignore
+        lambda topic, payload, dup, qos, retain: _asyncio_run_dispatch(service, payload)
+    )
+    start = time.perf_counter()
+    producer = threading.Thread(target=_produce, args=(service, messages, devices))
+    producer.start()
+    producer.join()
+    _report("asyncio.run", messages, time.perf_counter() - start, latencies)
+
+
+def main(
+    messages: int,
+    devices: int,
+    policy: OverflowPolicy,
+    queue_size: int,
+    consumer_delay: float,
+):
+    """Run the benchmark."""
+    if not consumer_delay:
+        _per_message_loop(messages, devices)
+    asyncio.run(_handoff(messages, devices, policy, queue_size, consumer_delay))
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("-n", "--messages", type=int, default=20000)
+    args.add_argument("-d", "--devices", type=int, default=10)
+    args.add_argument(
+        "-p",
+        "--policy",
+        choices=[policy.value for policy in OverflowPolicy],
+        default=OverflowPolicy.DropOldest.value,
+    )
+    args.add_argument("-q", "--queue-size", type=int, default=1000)
+    args.add_argument("-c", "--consumer-delay", type=float, default=0, help="ms")
+    parsed = args.parse_args()
+    main(
+        parsed.messages,
+        parsed.devices,
+        OverflowPolicy(parsed.policy),
+        parsed.queue_size,
+        parsed.consumer_delay / 1000,
+    )
@@ -0,0 +1,146 @@
+"""Stream subscription benchmark.
+
+Measures the time from ``StreamService.start`` to the first realtime
+notification of the first and of the last device, against a simulated MQTT
+connection acknowledging every packet after a round trip. The devices
+stream once their realtime topic is subscribed and their realtime request
+published. Sequential subscriptions (the previous behaviour), concurrent
+ones and a wildcard topic per device are compared.
+
+Run with::
+
+    python -m benchmarks.bench_stream_subscribe [-d DEVICES] [-r RTT_MS]
+        [-c CONCURRENCY]
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
+
+from edp.redy.services.stream import DeviceType
+from edp.redy.services.stream import StreamDevice
+from edp.redy.services.stream import StreamService
+from edp.redy.services.stream import SUBSCRIBE_CONCURRENCY
+
+
+class _SimulatedConnection:
+    """MQTT connection acknowledging every packet after a round trip."""
+
+    client_id = "bench"
+
+    def __init__(self, rtt: float) -> None:
+        self._rtt = rtt
+        self._callbacks: Dict[str, Callable[..., None]] = {}
+
+    def _later(self, func: Optional[Callable[[], None]] = None):
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def done():
+            if func is not None:
+                func()
+            # The waiter may have been cancelled meanwhile, e.g. on stop
+            if not future.done():
+                future.set_result(None)
+
+        threading.Timer(self._rtt, done).start()
+        return future
+
+    def connect(self):
+        return self._later()
+
+    def disconnect(self):
+        return self._later()
+
+    def subscribe(self, topic, qos, callback):
+        return self._later(lambda: self._callbacks.update({topic: callback})), 1
+
+    def unsubscribe(self, topic):
+        return self._later(), 1
+
+    def publish(self, topic, payload, qos):
+        device_id = topic.split("/")[1]
+        return self._later(lambda: self._notify(device_id)), 1
+
+    def _notify(self, device_id: str):
+        topic = f"wifi/{device_id}/fromDev/realtime"
+        callback = self._callbacks.get(topic) or self._callbacks.get(
+            f"wifi/{device_id}/fromDev/#"
+        )
+        if callback is None:
+            return
+        payload = {
+            "messageType": "notification",
+            "operationType": "realtime",
+            "data": [
+                {
+                    "localId": device_id,
+                    "stateVariables": {"emeter:power_aplus": {"value": 1}},
+                }
+            ],
+        }
+        callback(topic, json.dumps(payload).encode(), False, 1, False)
+
+
+async def _time_to_first_notification(
+    devices: int, rtt: float, concurrency: int, wildcard: bool
+) -> Dict[str, float]:
+    service = StreamService(
+        auth=None,  # type: ignore
+        subscribe_concurrency=concurrency,
+        wildcard_topics=wildcard,
+    )
+    first: Dict[str, float] = {}
+    all_streaming = asyncio.Event()
+
+    async def on_notification(operation_type: str, data: Dict[str, Any]):
+        first.setdefault(data["localId"], time.perf_counter())
+        if len(first) == devices:
+            all_streaming.set()
+
+    async def create_connection():
+        return _SimulatedConnection(rtt)
+
+    service._stream._create_connection = create_connection  # type: ignore
+    service.add_devices(
+        [StreamDevice(f"device-{i}", DeviceType.WIFI) for i in range(devices)]
+    ).add_callback(on_notification_cb=on_notification)
+
+    start = time.perf_counter()
+    await service.start()
+    await all_streaming.wait()
+    await service.stop()
+    return {
+        "first": min(first.values()) - start,
+        "last": max(first.values()) - start,
+    }
+
+
+def main(devices: int, rtt: float, concurrency: int):
+    """Run the benchmark."""
+    for name, concurrency, wildcard in (
+        ("sequential", 1, False),
+        (f"concurrent ({concurrency})", concurrency, False),
+        (f"wildcard ({concurrency})", concurrency, True),
+    ):
+        times = asyncio.run(
+            _time_to_first_notification(devices, rtt, concurrency, wildcard)
+        )
+        print(
+            f"{name:<18} first device={times['first'] * 1000:>8.1f} ms "
+            f"last device={times['last'] * 1000:>8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("-d", "--devices", type=int, default=20)
+    args.add_argument("-r", "--rtt", type=float, default=30, help="ms")
+    args.add_argument("-c", "--concurrency", type=int, default=SUBSCRIBE_CONCURRENCY)
+    parsed = args.parse_args()
+    main(parsed.devices, parsed.rtt / 1000, parsed.concurrency)
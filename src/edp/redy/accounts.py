@@ -0,0 +1,227 @@
+"""Accounts module, hosting many Redy accounts in a single process."""
+import logging
+from dataclasses import dataclass
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import TYPE_CHECKING
+
+import aiohttp
+from edp.redy.app import App
+from edp.redy.app import CLIENT_ID
+from edp.redy.app import get_api_service
+from edp.redy.app import get_api_stream
+from edp.redy.app import get_auth_service
+from edp.redy.app import get_cognito
+from edp.redy.app import get_devices_service
+from edp.redy.app import get_energy_service
+from edp.redy.app import get_houses_service
+from edp.redy.app import get_statevars_service
+from edp.redy.app import IDENTITY_LOGIN
+from edp.redy.app import IDENTITY_POOL_ID
+from edp.redy.app import REGION
+from edp.redy.app import USER_POOL_ID
+from edp.redy.services.api import ConnectionConfig
+from edp.redy.services.api import create_session
+from edp.redy.services.auth import AuthService
+from edp.redy.services.auth import CognitoIdentity
+from edp.redy.services.auth import CognitoUser
+from edp.redy.services.executor import BoundedExecutor
+from edp.redy.services.ratelimit import RateLimitConfig
+from edp.redy.services.tokenstore import TokenStore
+
+if TYPE_CHECKING:
+    from mypy_boto3_cognito_identity.client import CognitoIdentityClient
+
+log = logging.getLogger(__name__)
+
+# Threads running the blocking auth calls of all the accounts
+ACCOUNTS_EXECUTOR_WORKERS = 8
+# Seconds the token renewals of the accounts are spread over
+ACCOUNTS_RENEWAL_SPREAD = 600
+
+
+@dataclass
+class Account:
+    """Account dataclass.
+
+    Attributes:
+        username (str): The account username
+        auth (AuthService): The auth service of the account
+        app (App): The app of the account, not started
+    """
+
+    username: str
+    auth: AuthService
+    app: App
+
+
+class AccountManager:
+    """Hosts the apps of many accounts, sharing their pools.
+
+    Every account keeps its own tokens, API service, cache and rate limit.
+    They all share one HTTP connection pool, one boto3 cognito identity
+    client and one executor for the blocking auth calls. The token renewals
+    are randomly spread, so that accounts logged in together don't renew
+    together.
+    """
+
+    def __init__(
+        self,
+        config: Optional[ConnectionConfig] = None,
+        rate_limit: Optional[RateLimitConfig] = None,
+        token_store_factory: Optional[Callable[[str], TokenStore]] = None,
+        executor_workers: int = ACCOUNTS_EXECUTOR_WORKERS,
+        renewal_spread: float = ACCOUNTS_RENEWAL_SPREAD,
+        user_pool_id: str = USER_POOL_ID,
+        client_id: str = CLIENT_ID,
+        region: str = REGION,
+        identity_pool_id: str = IDENTITY_POOL_ID,
+        identity_login: str = IDENTITY_LOGIN,
+    ) -> None:
+        """Create an account manager.
+
+        Args:
+            config (Optional[ConnectionConfig], optional): The shared
+                connection pool configuration. Defaults to None.
+            rate_limit (Optional[RateLimitConfig], optional): The rate limit
+                of each account. Defaults to None.
+            token_store_factory (Optional[Callable], optional): Creates the
+                token store of an account, given its username. Defaults to
+                None.
+            executor_workers (int, optional): Threads running the blocking
+                auth calls of all the accounts. Defaults to
+                ACCOUNTS_EXECUTOR_WORKERS.
+            renewal_spread (float, optional): Seconds the token renewals are
+                randomly spread over. Defaults to ACCOUNTS_RENEWAL_SPREAD.
+            user_pool_id (str, optional): The user pool id. Defaults to
+                USER_POOL_ID.
+            client_id (str, optional): The client id. Defaults to CLIENT_ID.
+            region (str, optional): The region. Defaults to REGION.
+            identity_pool_id (str, optional): The identity pool id. Defaults
+                to IDENTITY_POOL_ID.
+            identity_login (str, optional): The identity login. Defaults to
+                IDENTITY_LOGIN.
+        """
+        self._config = config
+        self._rate_limit = rate_limit
+        self._token_store_factory = token_store_factory
+        self._renewal_spread = renewal_spread
+        self._user_pool_id = user_pool_id
+        self._client_id = client_id
+        self._region = region
+        self._identity_pool_id = identity_pool_id
+        self._identity_login = identity_login
+        self._executor = BoundedExecutor(
+            max_workers=executor_workers, name="redy-accounts"
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._identity_client: Optional["CognitoIdentityClient"] = None
+        self._accounts: Dict[str, Account] = {}
+
+    @property
+    def usernames(self) -> List[str]:
+        """Return the usernames of the hosted accounts."""
+        return list(self._accounts)
+
+    @property
+    def executor(self) -> BoundedExecutor:
+        """Return the executor shared by the accounts."""
+        return self._executor
+
+    def get(self, username: str) -> App:
+        """Return the app of an account.
+
+        Raises:
+            KeyError: If the account isn't hosted
+        """
+        return self._accounts[username].app
+
+    async def add_account(self, username: str, password: str) -> App:
+        """Log an account in, resuming its stored session if possible.
+
+        Args:
+            username (str): The account username
+            password (str): The account password
+
+        Raises:
+            ValueError: If the account is already hosted
+
+        Returns:
+            App: The app of the account, to be started by the caller
+        """
+        if username in self._accounts:
+            raise ValueError(f"Account '{username}' already added")
+
+        cognito = get_cognito(self._user_pool_id, self._client_id, self._region)
+        cognito_user = CognitoUser(
+            cognito_user=cognito,
+            user_pool_id=self._user_pool_id,
+            client_id=self._client_id,
+            region=self._region,
+            renewal_jitter=self._renewal_spread,
+        )
+        cognito_identity = CognitoIdentity(
+            cognito_user=cognito_user,
+            cognito_identity=self._get_identity_client(),
+            identity_id=self._identity_pool_id,
+            login=self._identity_login,
+            region=self._region,
+        )
+        token_store = (
+            self._token_store_factory(username) if self._token_store_factory else None
+        )
+        auth_service = get_auth_service(
+            cognito_user, cognito_identity, token_store, executor=self._executor
+        )
+        if not await auth_service.resume(username, password):
+            await auth_service.login(username, password)
+
+        api_service = get_api_service(
+            auth_service,
+            rate_limit=self._rate_limit,
+            session=self._get_session(),
+        )
+        app = App(
+            get_houses_service(api_service),
+            get_energy_service(api_service),
+            get_devices_service(api_service),
+            get_statevars_service(api_service),
+            get_api_stream(auth_service),
+            api_service,
+            auth_service,
+        )
+        self._accounts[username] = Account(username, auth_service, app)
+        log.info(f"Account '{username}' added")
+        return app
+
+    async def remove_account(self, username: str):
+        """Stop the app of an account, which stops renewing its tokens."""
+        account = self._accounts.pop(username)
+        await account.app.stop()
+        log.info(f"Account '{username}' removed")
+
+    async def stop(self):
+        """Remove every account, and close the shared pools."""
+        for username in list(self._accounts):
+            await self.remove_account(username)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        await self._executor.shutdown()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = create_session(self._config)
+        return self._session
+
+    def _get_identity_client(self) -> "CognitoIdentityClient":
+        if self._identity_client is None:
+            # boto3 clients are thread safe, unlike their sessions
+            import boto3
+
+            self._identity_client = boto3.client(
+                "cognito-identity", region_name=self._region
+            )
+        return self._identity_client
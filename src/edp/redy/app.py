@@ -4,17 +4,23 @@ from dataclasses import dataclass
 from dataclasses import field
 from datetime import datetime
 from typing import Any
+from typing import Collection
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import TYPE_CHECKING
 
-import boto3
+import aiohttp
 from dataclasses_json import config
 from dataclasses_json import dataclass_json
 from edp.redy.services.api import ApiService
+from edp.redy.services.api import ConnectionConfig
+from edp.redy.services.api import GetRequest
 from edp.redy.services.auth import AuthService
 from edp.redy.services.auth import CognitoIdentity
 from edp.redy.services.auth import CognitoUser
+from edp.redy.services.cache import MemoryResponseCache
+from edp.redy.services.cassette import Cassette
 from edp.redy.services.devices.models.devicemodel import Device
 from edp.redy.services.devices.models.modulesmodel import HistoricVar
 from edp.redy.services.devices.models.modulesmodel import Module
@@ -22,15 +28,23 @@ from edp.redy.services.devices.models.modulesmodel import ModuleGroup
 from edp.redy.services.devices.models.modulesmodel import Resolution
 from edp.redy.services.devices.service import DevicesService
 from edp.redy.services.energy.service import EnergyService
+from edp.redy.services.executor import BoundedExecutor
 from edp.redy.services.houses.models.housemodel import House
 from edp.redy.services.houses.service import HousesService
+from edp.redy.services.ingest import INGEST_QUEUE_SIZE
+from edp.redy.services.ingest import OverflowPolicy
+from edp.redy.services.ratelimit import AdaptiveRateLimiter
+from edp.redy.services.ratelimit import RateLimitConfig
 from edp.redy.services.statevars.service import StateVariablesService
 from edp.redy.services.stream import DeviceType
 from edp.redy.services.stream import StreamDevice
 from edp.redy.services.stream import StreamService
+from edp.redy.services.tokenstore import TokenStore
 from marshmallow import fields
 from typing_extensions import Protocol
-from warrant import Cognito
+
+if TYPE_CHECKING:
+    from warrant import Cognito
 
 log = logging.getLogger(__name__)
 
@@ -41,6 +55,8 @@ IDENTITY_POOL_ID = REGION + ":" + "a9a52b46-1722-49a0-8f8b-e8532c12abef"
 IDENTITY_LOGIN = (
     "cognito-idp" + "." + REGION + "." + "amazonaws.com" + "/" + USER_POOL_ID
 )
+# The state variables streamed for the Power callbacks
+POWER_VARIABLES = ("emeter:power_aplus", "emeter:power_aminus")
 
 
 class App:
@@ -53,6 +69,8 @@ class App:
         devices_service: DevicesService,
         statevars_service: StateVariablesService,
         stream_service: StreamService,
+        api_service: Optional[ApiService] = None,
+        auth_service: Optional[AuthService] = None,
     ) -> None:
         """Construct the EDP Redy APP, using dependency injection.
 
@@ -62,7 +80,13 @@ class App:
             devices_service (DevicesService): _description_
             statevars_service (StateVariablesService): _description_
             stream_service (StreamService): _description_
+            api_service (Optional[ApiService]): The API service whose HTTP
+                session lifecycle is managed by the app. Defaults to None.
+            auth_service (Optional[AuthService]): The auth service whose
+                renewals are stopped with the app. Defaults to None.
         """
+        self.api = api_service
+        self.auth = auth_service
         self.stream = stream_service
         self.house_api = houses_service
         self.energy_api = energy_service
@@ -72,6 +96,8 @@ class App:
 
     async def start(self):
         """Start the app."""
+        if self.api:
+            await self.api.start()
         self.house: House = await self._get_house()
         self._modules: Dict[str, Module] = await self._get_modules()
         self._devices: Dict[str, Device] = await self._get_devices()
@@ -84,6 +110,16 @@ class App:
 
         self._started = True
 
+    async def stop(self):
+        """Stop the app."""
+        if self._started:
+            await self.stream.stop()
+        if self.api:
+            await self.api.stop()
+        if self.auth:
+            await self.auth.stop()
+        self._started = False
+
     @property
     def energy(self):
         """Return the energy object."""
@@ -129,6 +165,7 @@ class App:
                 module_id=self.injection_meter.module_id,
                 historic_var=HistoricVar.ActiveEnergySelfConsumed,
             ),
+            devices_api=self.devices_api,
         )
 
     def _get_power(self) -> "Power":
@@ -222,6 +259,16 @@ class EnergyType:
         self._historic_var = historic_var
         self._key = self._get_key()
 
+    @property
+    def devices_api(self) -> DevicesService:
+        """Return the devices service requesting the energy values."""
+        return self._devices_api
+
+    @property
+    def historic_var(self) -> HistoricVar:
+        """Return the historic variable of the energy type."""
+        return self._historic_var
+
     async def today(self, resolution: Resolution = Resolution.Hour) -> EnergyValues:
         """Return the energy values of the current day."""
         supported_resolutions = [Resolution.Hour, resolution.QuarterHour]
@@ -265,9 +312,27 @@ class EnergyType:
             start=start,
             end=end,
         )
-        return self._to_energy_values(energy, resolution)
+        return self.to_energy_values(energy, resolution)
+
+    def metering_request(
+        self,
+        resolution: Resolution,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> GetRequest:
+        """Build the request of the energy values between the specified dates."""
+        return self._devices_api.metering_request(
+            house_id=self._house_id,
+            device_id=self._device_id,
+            module_id=self._module_id,
+            resolution=resolution,
+            historicVar=self._historic_var,
+            start=start,
+            end=end,
+        )
 
-    def _to_energy_values(self, energy, resolution: Resolution) -> EnergyValues:
+    def to_energy_values(self, energy, resolution: Resolution) -> EnergyValues:
+        """Convert a metering response into the energy values."""
         DATETIME_HOUR_FORMAT = "%Y-%m-%d %H:%M:%S"
         DATETIME_DAY_FORMAT = "%Y-%m-%d"
         DATETIME_MONTH_FORMAT = "%Y-%m"
@@ -321,6 +386,44 @@ class Energy:
     self_consumed: EnergyType
     injected: EnergyType
     consumed: EnergyType
+    # Defaults to the service of the energy types
+    devices_api: Optional[DevicesService] = field(default=None, repr=False)
+
+    async def in_dates(
+        self,
+        resolution: Resolution,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Dict[EnergyType, Optional[EnergyValues]]:
+        """Return the energy values of every type between the specified dates.
+
+        The energy types are requested concurrently. The value of a type that
+        failed is None, without affecting the others.
+        """
+        energy_types = (self.produced, self.self_consumed, self.injected, self.consumed)
+        devices_api = self.devices_api or self.consumed.devices_api
+        results = await devices_api.get_meterings(
+            [
+                energy_type.metering_request(resolution, start, end)
+                for energy_type in energy_types
+            ]
+        )
+
+        values: Dict[EnergyType, Optional[EnergyValues]] = {}
+        for energy_type, result in zip(energy_types, results):
+            values[energy_type] = None
+            if not result.ok:
+                log.error(
+                    f"Energy {energy_type.historic_var.value} failed: {result.error}"
+                )
+                continue
+            try:
+                values[energy_type] = energy_type.to_energy_values(
+                    result.value, resolution
+                )
+            except Exception:
+                log.exception("Error")
+        return values
 
 
 class PowerTypeCallback(Protocol):
@@ -444,8 +547,11 @@ class Power:
         pass
 
 
-def get_cognito(user_pool_id, client_id, region) -> Cognito:
+def get_cognito(user_pool_id, client_id, region) -> "Cognito":
     """Get cognito."""
+    # Imported on first use, as warrant and boto3 are slow to import
+    from warrant import Cognito
+
     return Cognito(
         user_pool_id=user_pool_id,
         client_id=client_id,
@@ -453,7 +559,7 @@ def get_cognito(user_pool_id, client_id, region) -> Cognito:
     )
 
 
-def get_cognito_user(cognito: Cognito) -> CognitoUser:
+def get_cognito_user(cognito: "Cognito") -> CognitoUser:
     """Get cognito user."""
     return CognitoUser(
         cognito_user=cognito,
@@ -467,6 +573,8 @@ def get_cognito_identity(
     cognito_user: CognitoUser, identity_id, identity_login
 ) -> CognitoIdentity:
     """Get cognito identity."""
+    import boto3
+
     return CognitoIdentity(
         cognito_user=cognito_user,
         cognito_identity=boto3.client(
@@ -480,20 +588,57 @@ def get_cognito_identity(
 
 
 def get_auth_service(
-    cognito_user: CognitoUser, cognito_identity: CognitoIdentity
+    cognito_user: CognitoUser,
+    cognito_identity: CognitoIdentity,
+    token_store: Optional[TokenStore] = None,
+    executor: Optional[BoundedExecutor] = None,
 ) -> AuthService:
     """Get auth service."""
-    return AuthService(cognito_user=cognito_user, cognito_identity=cognito_identity)
+    return AuthService(
+        cognito_user=cognito_user,
+        cognito_identity=cognito_identity,
+        token_store=token_store,
+        executor=executor,
+    )
 
 
-def get_api_service(auth_service: AuthService) -> ApiService:
+def get_api_service(
+    auth_service: AuthService,
+    config: Optional[ConnectionConfig] = None,
+    rate_limit: Optional[RateLimitConfig] = None,
+    cassette: Optional[Cassette] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+) -> ApiService:
     """Get api service."""
-    return ApiService(auth=auth_service)
+    return ApiService(
+        auth=auth_service,
+        config=config,
+        session=session,
+        cache=MemoryResponseCache(),
+        rate_limiter=AdaptiveRateLimiter(rate_limit),
+        cassette=cassette,
+    )
 
 
-def get_api_stream(auth_service: AuthService) -> StreamService:
-    """Get stream service."""
-    return StreamService(auth_service)
+def get_api_stream(
+    auth_service: AuthService,
+    queue_size: int = INGEST_QUEUE_SIZE,
+    overflow_policy: OverflowPolicy = OverflowPolicy.DropOldest,
+    max_connections: int = 1,
+    variables: Optional[Collection[str]] = POWER_VARIABLES,
+) -> StreamService:
+    """Get stream service.
+
+    Only the variables used by Power are notified by default, None
+    notifies every variable.
+    """
+    return StreamService(
+        auth_service,
+        queue_size=queue_size,
+        overflow_policy=overflow_policy,
+        max_connections=max_connections,
+        variables=variables,
+    )
 
 
 def get_houses_service(api_service: ApiService) -> HousesService:
@@ -524,8 +669,13 @@ async def get_app(
     region: Optional[str] = REGION,
     identity_pool_id: Optional[str] = IDENTITY_POOL_ID,
     identity_login: Optional[str] = IDENTITY_LOGIN,
+    token_store: Optional[TokenStore] = None,
 ) -> App:
-    """Get redy app object."""
+    """Get redy app object.
+
+    When a token store is given, the session is resumed from the stored
+    tokens, and the user only authenticates if they are no longer valid.
+    """
 
     user_pool_id = user_pool_id or USER_POOL_ID
     client_id = client_id or CLIENT_ID
@@ -538,8 +688,9 @@ async def get_app(
     cognito_identity = get_cognito_identity(
         cognito_user, identity_pool_id, identity_login
     )
-    auth_service = get_auth_service(cognito_user, cognito_identity)
-    await auth_service.login(username, password)
+    auth_service = get_auth_service(cognito_user, cognito_identity, token_store)
+    if not await auth_service.resume(username, password):
+        await auth_service.login(username, password)
 
     api_service = get_api_service(auth_service)
     houses_service = get_houses_service(api_service)
@@ -555,4 +706,6 @@ async def get_app(
         devices_service,
         statevars_service,
         stream_service,
+        api_service,
+        auth_service,
     )
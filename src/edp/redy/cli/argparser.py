@@ -36,3 +36,11 @@ parser.add_argument(
     default=None,
     help="Identity Login",
 )
+
+parser.add_argument(
+    "-ts",
+    "--token_store",
+    action="store",
+    default=None,
+    help="File the tokens are kept in, to resume the session on restart",
+)
@@ -25,6 +25,7 @@ from edp.redy.app import ValueCost
 from edp.redy.app import ValueCostDate
 from edp.redy.cli.argparser import parser
 from edp.redy.services.devices.models.modulesmodel import Resolution
+from edp.redy.services.tokenstore import FileTokenStore
 
 logging.basicConfig(
     level="INFO",
@@ -250,17 +251,16 @@ class RedyEnergyDevice:
         try:
             resolution, start, end = self._calculate_range()
 
-            grid_consumed = await self._get_value(
-                EnergyDeviceDataTypes.GRID_CONSUMED, resolution, start, end
-            )
-            grid_injected = await self._get_value(
-                EnergyDeviceDataTypes.GRID_INJECTED, resolution, start, end
-            )
-            solar_produced = await self._get_value(
-                EnergyDeviceDataTypes.SOLAR_PRODUCED, resolution, start, end
+            # All the energy types are requested at once
+            values = await self._energy.in_dates(resolution, start, end)
+
+            grid_consumed = self._get_value(EnergyDeviceDataTypes.GRID_CONSUMED, values)
+            grid_injected = self._get_value(EnergyDeviceDataTypes.GRID_INJECTED, values)
+            solar_produced = self._get_value(
+                EnergyDeviceDataTypes.SOLAR_PRODUCED, values
             )
-            solar_consumed = await self._get_value(
-                EnergyDeviceDataTypes.SOLAR_CONSUMED, resolution, start, end
+            solar_consumed = self._get_value(
+                EnergyDeviceDataTypes.SOLAR_CONSUMED, values
             )
             total_consumed = await self._total_consumed(grid_consumed, solar_consumed)
 
@@ -282,24 +282,14 @@ class RedyEnergyDevice:
     #     # Else
     #     consumed = await self._energy.consumed.today(Resolution.QuarterHour)
 
-    async def _get_value(
+    def _get_value(
         self,
         data_type: EnergyDeviceDataTypes,
-        resolution: Optional[Resolution],
-        start: Optional[datetime],
-        end: Optional[datetime],
+        values: Dict[EnergyType, Optional[EnergyValues]],
     ) -> Optional[EnergyValues]:
         info: _EnergyDeviceInfo = self._data_types[data_type]
-        value: Optional[EnergyValues] = None
-        try:
-            assert info.energy_type
-            value = await info.energy_type.in_dates(
-                resolution=resolution, start=start, end=end
-            )
-        except Exception:
-            log.exception("Error")
-        finally:
-            return value
+        assert info.energy_type
+        return values.get(info.energy_type)
 
     async def _total_consumed(
         self, grid_consumed: EnergyValues, solar_consumed: EnergyValues
@@ -460,6 +450,7 @@ async def _main():
         region=args.region,
         identity_pool_id=args.identity_id,
         identity_login=args.identity_login,
+        token_store=FileTokenStore(args.token_store) if args.token_store else None,
     )
     await app.start()
 
@@ -1,13 +1,44 @@
 """Generic API."""
+import asyncio
 import logging
+import time
+from dataclasses import dataclass
 from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
 
 import aiohttp
 from aiohttp import client_exceptions as exceptions
 from edp.redy.services.auth import AuthService
+from edp.redy.services.cache import cache_key
+from edp.redy.services.cache import CachePolicy
+from edp.redy.services.cache import CacheStats
+from edp.redy.services.cache import ResponseCache
+from edp.redy.services.cassette import Cassette
+from edp.redy.services.jsonbackend import get_json_backend
+from edp.redy.services.jsonbackend import JsonBackend
+from edp.redy.services.metrics import ApiMetrics
+from edp.redy.services.metrics import EndpointStats
+from edp.redy.services.metrics import RequestHook
+from edp.redy.services.ratelimit import AdaptiveRateLimiter
+from edp.redy.services.ratelimit import parse_retry_after
+from edp.redy.services.ratelimit import RateLimitStats
+from edp.redy.services.ratelimit import THROTTLE_STATUSES
+from edp.redy.services.retry import CircuitBreaker
+from edp.redy.services.retry import CircuitState
+from edp.redy.services.retry import ErrorKind
+from edp.redy.services.retry import RetryPolicy
+from edp.redy.services.singleflight import SingleFlight
+from edp.redy.services.singleflight import SingleFlightStats
 
 BASE_URL = "https://uiapi.redy.edp.com"
 RETRIES = 3
+# Status codes returned by the API when the tokens are rejected
+AUTH_STATUSES = (401, 403)
 
 log = logging.getLogger(__name__)
 
@@ -19,7 +50,14 @@ class ApiServiceError(Exception):
 class ResponseError(ApiServiceError):
     """The response error class."""
 
-    def __init__(self, status: int, url: str, message: str, details: Any):
+    def __init__(
+        self,
+        status: int,
+        url: str,
+        message: str,
+        details: Any,
+        retry_after: Optional[float] = None,
+    ):
         """Create a response error object.
 
         Args:
@@ -27,11 +65,14 @@ class ResponseError(ApiServiceError):
             url (str): The endpoint used in the request
             message (str): The message received as response
             details (Any): Any further details
+            retry_after (Optional[float]): Seconds the API asked to wait
+                before retrying. Defaults to None.
         """
         self.status = status
         self.message = message
         self.url = url
         self.details = details
+        self.retry_after = retry_after
 
     def __str__(self) -> str:
         """Generate a string representation of the response error object.
@@ -45,12 +86,174 @@ class ResponseError(ApiServiceError):
         )
 
 
+class TransportError(ApiServiceError):
+    """The request couldn't be sent, or its response received."""
+
+    def __init__(self, url: str, error: Exception):
+        """Create a transport error object.
+
+        Args:
+            url (str): The endpoint used in the request
+            error (Exception): The underlying error
+        """
+        self.url = url
+        self.error = error
+
+    def __str__(self) -> str:
+        """Generate a string representation of the transport error object."""
+        return f"url={self.url}, error={self.error!r}"
+
+
+class CircuitOpenError(ApiServiceError):
+    """The request wasn't sent, as the API is considered down."""
+
+    def __init__(self, url: str):
+        """Create a circuit open error object.
+
+        Args:
+            url (str): The endpoint of the request
+        """
+        self.url = url
+
+    def __str__(self) -> str:
+        """Generate a string representation of the circuit open error object."""
+        return f"Circuit open, request not sent: url={self.url}"
+
+
+@dataclass
+class ConnectionConfig:
+    """Connection pool configuration used by the API service.
+
+    Attributes:
+        limit (int): Maximum number of simultaneous connections
+        limit_per_host (int): Maximum number of simultaneous connections to
+            the same endpoint
+        ttl_dns_cache (Optional[int]): Seconds a resolved address is cached
+        keepalive_timeout (float): Seconds an idle connection is kept open
+        total_timeout (float): Seconds allowed for a whole request
+        connect_timeout (float): Seconds allowed to acquire a connection
+    """
+
+    limit: int = 100
+    limit_per_host: int = 10
+    ttl_dns_cache: Optional[int] = 300
+    keepalive_timeout: float = 30
+    total_timeout: float = 30
+    connect_timeout: float = 10
+
+
+@dataclass
+class GetRequest:
+    """Get request dataclass, used in batches."""
+
+    url: str
+    params: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class GetResult:
+    """Get result dataclass, holding either the response or the error."""
+
+    request: GetRequest
+    value: Any = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        """Indicate whether the request succeeded."""
+        return self.error is None
+
+    def unwrap(self) -> Any:
+        """Return the response, or raise the error of the request."""
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+@dataclass
+class ApiStats:
+    """API service statistics dataclass.
+
+    Attributes:
+        endpoints (Dict[str, EndpointStats]): Request statistics, keyed by
+            url template
+        circuit_state (CircuitState): The state of the circuit breaker
+        cache (Optional[CacheStats]): Response cache statistics
+        coalescing (Optional[SingleFlightStats]): Coalesced requests
+            statistics
+        rate_limit (Optional[RateLimitStats]): Rate limit statistics
+    """
+
+    endpoints: Dict[str, EndpointStats]
+    circuit_state: CircuitState
+    cache: Optional[CacheStats] = None
+    coalescing: Optional[SingleFlightStats] = None
+    rate_limit: Optional[RateLimitStats] = None
+
+
 class ApiService:
     """API Service class."""
 
-    def __init__(self, auth: AuthService):
-        """Initialize the API Service object."""
+    def __init__(
+        self,
+        auth: AuthService,
+        base_url: str = BASE_URL,
+        config: Optional[ConnectionConfig] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        cache: Optional[ResponseCache] = None,
+        cache_policy: Optional[CachePolicy] = None,
+        coalesce: bool = True,
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        json_backend: Optional[JsonBackend] = None,
+        metrics: Optional[ApiMetrics] = None,
+        cassette: Optional[Cassette] = None,
+    ):
+        """Initialize the API Service object.
+
+        Args:
+            auth (AuthService): The auth service
+            base_url (str, optional): The API base url. Defaults to BASE_URL.
+            config (Optional[ConnectionConfig], optional): The connection pool
+                configuration. Defaults to None.
+            session (Optional[aiohttp.ClientSession], optional): An externally
+                owned session to use instead of creating one. Defaults to None.
+            cache (Optional[ResponseCache], optional): The cache for the
+                responses of slow-changing endpoints. Defaults to None.
+            cache_policy (Optional[CachePolicy], optional): Which endpoints
+                are cached and for how long. Defaults to CachePolicy().
+            coalesce (bool, optional): Whether concurrent identical requests
+                share a single round trip. Defaults to True.
+            rate_limiter (Optional[AdaptiveRateLimiter], optional): Limits the
+                request rate and concurrency, and slows down when the API
+                throttles the requests. Defaults to None.
+            retry_policy (Optional[RetryPolicy], optional): How failed
+                requests are retried. Defaults to RetryPolicy(RETRIES).
+            circuit_breaker (Optional[CircuitBreaker], optional): Fails the
+                requests fast while the API is down. Defaults to
+                CircuitBreaker().
+            json_backend (Optional[JsonBackend], optional): Parses the
+                responses. Defaults to the fastest one installed.
+            metrics (Optional[ApiMetrics], optional): Collects the per
+                endpoint metrics. Defaults to ApiMetrics().
+            cassette (Optional[Cassette], optional): Records the responses,
+                or replays them without reaching the API. Defaults to None.
+        """
         self._auth = auth
+        self._base_url = base_url
+        self._config = config or ConnectionConfig()
+        self._session = session
+        self._owns_session = session is None
+        self._cache = cache
+        self._cache_policy = cache_policy or CachePolicy()
+        self._single_flight = SingleFlight() if coalesce else None
+        self._limiter = rate_limiter
+        self._retry_policy = retry_policy or RetryPolicy(max_attempts=RETRIES)
+        self._breaker = circuit_breaker or CircuitBreaker()
+        self._json = json_backend or get_json_backend()
+        self._metrics = metrics or ApiMetrics()
+        self._cassette = cassette
 
     @property
     async def headers(self):
@@ -61,17 +264,98 @@ class ApiService:
         """
         return {"authorization": await self._auth.cognito_user.id_token}
 
+    @property
+    def started(self) -> bool:
+        """Indicate whether the HTTP session is open."""
+        return self._session is not None and not self._session.closed
+
     async def start(self):
-        """Start the instantiation of the API service."""
-        ...
+        """Start the instantiation of the API service.
+
+        Opens the pooled HTTP session that is reused by every request.
+        """
+        if self.started:
+            return
+        if not self._owns_session:
+            raise ApiServiceError("The externally owned session is closed")
+        self._session = create_session(self._config)
+        log.debug("API session started")
 
     async def stop(self):
-        """Clear the instantiation of the API service."""
-        ...
+        """Clear the instantiation of the API service.
+
+        Closes the pooled HTTP session, unless it is externally owned, and
+        saves the recorded interactions, if recording.
+        """
+        if self._cassette is not None and not self._cassette.replaying:
+            self._cassette.save()
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+            log.debug("API session stopped")
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if not self.started:
+            await self.start()
+        assert self._session
+        return self._session
+
+    def cache_stats(self) -> Optional[CacheStats]:
+        """Return the response cache statistics, if there's a cache."""
+        return self._cache.stats() if self._cache else None
+
+    def coalescing_stats(self) -> Optional[SingleFlightStats]:
+        """Return how many requests were collapsed, if coalescing is enabled."""
+        return self._single_flight.stats() if self._single_flight else None
+
+    def stats(self) -> ApiStats:
+        """Return a snapshot of the API service statistics."""
+        return ApiStats(
+            endpoints=self._metrics.snapshot(),
+            circuit_state=self._breaker.state,
+            cache=self.cache_stats(),
+            coalescing=self.coalescing_stats(),
+            rate_limit=self.rate_limit_stats(),
+        )
+
+    def add_hook(self, hook: RequestHook):
+        """Register a callback, called with every request event.
+
+        Hooks are called inline, so they must be fast and not block.
+        """
+        self._metrics.add_hook(hook)
+
+    def remove_hook(self, hook: RequestHook):
+        """Unregister a request event callback."""
+        self._metrics.remove_hook(hook)
+
+    @property
+    def circuit_state(self) -> CircuitState:
+        """Return the state of the circuit breaker."""
+        return self._breaker.state
+
+    def rate_limit_stats(self) -> Optional[RateLimitStats]:
+        """Return the rate limit statistics, if there's a rate limiter."""
+        return self._limiter.stats() if self._limiter else None
+
+    async def invalidate(self, house_id: Optional[str] = None):
+        """Drop the cached responses.
+
+        Args:
+            house_id (Optional[str], optional): Only drop the responses of this
+                house. Defaults to None, dropping every response.
+        """
+        if self._cache:
+            await self._cache.invalidate(house_id)
 
     async def get(self, url: str, *args, **kwargs):
         """Represent the API get method.
 
+        Responses of the endpoints covered by the cache policy are served from
+        the cache while fresh. Concurrent identical requests (same url and
+        parameters) share a single round trip and the same parsed response,
+        which must therefore not be modified by the callers.
+
         Args:
             url (str): The endpoint to execute the get request
             *args: Optional arguments
@@ -83,28 +367,243 @@ class ApiService:
         Returns:
             _type_: The response
         """
-        resp = None
-        retries = RETRIES
-        while retries:
-            retries -= 1
+        if args or kwargs.keys() - {"params"}:
+            return await self._get(url, *args, **kwargs)
+
+        key = cache_key(url, kwargs.get("params"))
+        ttl, house_id = None, None
+        if self._cache is not None:
+            ttl, house_id = self._cache_policy.lookup(url)
+            if ttl is not None:
+                cached = await self._cache.get(key)
+                if cached is not None:
+                    return cached
+
+        async def fetch():
+            response = await self._get(url, **kwargs)
+            if self._cache is not None and ttl is not None:
+                await self._cache.set(key, response, ttl=ttl, house_id=house_id)
+            return response
+
+        if self._single_flight is None:
+            return await fetch()
+        return await self._single_flight.do(key, fetch)
+
+    async def get_many(
+        self, requests: Sequence[GetRequest], max_concurrency: int = 8
+    ) -> List[GetResult]:
+        """Execute a batch of independent get requests concurrently.
+
+        Args:
+            requests (Sequence[GetRequest]): The requests to execute
+            max_concurrency (int, optional): Maximum requests of the batch in
+                flight at once. Defaults to 8.
+
+        Returns:
+            List[GetResult]: The results, in the order of the requests. A
+                failed request doesn't abort the others: its error is kept in
+                its result instead.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(request: GetRequest) -> GetResult:
+            async with semaphore:
+                try:
+                    value = await self.get(request.url, params=request.params)
+                except Exception as ex:
+                    return GetResult(request=request, error=ex)
+                return GetResult(request=request, value=value)
+
+        return list(await asyncio.gather(*(run(request) for request in requests)))
+
+    async def _get(self, url: str, *args, **kwargs):
+        policy = self._retry_policy
+        session = await self._get_session()
+        attempt = 0
+        auth_renewed = False
+        while True:
+            probing = self._breaker.state == CircuitState.HalfOpen
+            if not self._breaker.allow():
+                raise CircuitOpenError(url)
+            attempt += 1
             try:
-                async with aiohttp.ClientSession() as session, session.get(
-                    BASE_URL + url,
-                    *args,
-                    headers=await self.headers,
-                    raise_for_status=True,
-                    **kwargs,
-                ) as response:
-                    resp = await response.text()
-                    response.raise_for_status()
-                    return await response.json()
-            except exceptions.ClientResponseError as ex:
-                raise ResponseError(
-                    status=ex.status,
-                    url=str(ex.request_info.url),
-                    message=ex.message,
-                    details=resp,
+                result = await self._send(session, url, *args, **kwargs)
+            except asyncio.CancelledError:
+                if probing:
+                    self._breaker.release_probe()
+                raise
+            except Exception as ex:
+                kind = classify_error(ex)
+                self._record_error(ex, kind, probing)
+                if kind == ErrorKind.Auth and not auth_renewed:
+                    log.info(f"Request rejected ({ex}), renewing the tokens")
+                    auth_renewed = True
+                    self._metrics.record_auth_refresh(url, ex)
+                    await self._auth.cognito_user.refresh()
+                    continue
+                if not policy.should_retry(kind, attempt):
+                    if isinstance(ex, (aiohttp.ClientError, asyncio.TimeoutError)):
+                        raise TransportError(url, ex) from ex
+                    raise
+
+                self._metrics.record_retry(url, ex)
+                delay = self._retry_delay(ex, kind, attempt)
+                log.warning(
+                    f"Request to '{url}' failed ({kind.value}: {ex!r}), "
+                    f"attempt {attempt}/{policy.max_attempts}, "
+                    f"retrying in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+            else:
+                self._breaker.on_success()
+                return result
+
+    def _record_error(self, error: Exception, kind: ErrorKind, probing: bool):
+        if kind == ErrorKind.Transient or (
+            isinstance(error, ResponseError) and error.status >= 500
+        ):
+            # A throttling 503 counts too, as a backend down may answer it to
+            # every request
+            self._breaker.on_failure()
+        elif isinstance(error, ResponseError):
+            # The API answered, so it isn't down
+            self._breaker.on_success()
+        elif probing:
+            # Says nothing of the backend, e.g. the tokens couldn't be
+            # renewed: another request may probe it
+            self._breaker.release_probe()
+
+    def _retry_delay(self, error: Exception, kind: ErrorKind, attempt: int) -> float:
+        delay = self._retry_policy.delay(attempt)
+        if kind == ErrorKind.Throttled:
+            if self._limiter:
+                # The rate limiter already pauses for the requested delay
+                return 0
+            return max(delay, getattr(error, "retry_after", None) or 0)
+        return delay
+
+    async def _send(self, session: aiohttp.ClientSession, url: str, *args, **kwargs):
+        if self._limiter:
+            await self._limiter.acquire()
+        started = time.perf_counter()
+        try:
+            status, reason, headers, body = await self._fetch(
+                session, url, *args, **kwargs
+            )
+            error: Optional[ResponseError] = None
+            if status >= 400:
+                error = ResponseError(
+                    status=status,
+                    url=self._base_url + url,
+                    message=reason,
+                    details=body.decode(errors="replace"),
+                    retry_after=parse_retry_after(headers.get("Retry-After")),
                 )
-            except Exception:
-                log.exception("Error:")
-                await self._auth.cognito_user.authenticate()
+            else:
+                try:
+                    result = self._decode(url, status, body)
+                except ResponseError as ex:
+                    error = ex
+            self._metrics.record_response(
+                url, status, time.perf_counter() - started, len(body), error
+            )
+            if error is not None:
+                if self._limiter and status in THROTTLE_STATUSES:
+                    self._limiter.on_throttled(error.retry_after)
+                raise error
+        except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+            self._metrics.record_error(url, time.perf_counter() - started, ex)
+            raise
+        finally:
+            if self._limiter:
+                self._limiter.release()
+        if self._limiter:
+            self._limiter.on_success()
+        return result
+
+    async def _fetch(
+        self, session: aiohttp.ClientSession, url: str, *args, **kwargs
+    ) -> Tuple[int, str, Mapping[str, str], bytes]:
+        cassette = self._cassette
+        if cassette is not None and cassette.replaying:
+            return await cassette.play(url, kwargs.get("params"))
+        async with session.get(
+            self._base_url + url, *args, headers=await self.headers, **kwargs
+        ) as response:
+            # The body is read once, and only decoded into text for errors
+            result = (
+                response.status,
+                response.reason or "",
+                response.headers,
+                await response.read(),
+            )
+        if cassette is not None:
+            cassette.record(url, kwargs.get("params"), *result)
+        return result
+
+    def _decode(self, url: str, status: int, body: bytes) -> Any:
+        if not body:
+            return None
+        try:
+            return self._json.loads(body)
+        except ValueError as ex:
+            raise ResponseError(
+                status=status,
+                url=self._base_url + url,
+                message=f"Invalid JSON response: {ex}",
+                details=body.decode(errors="replace"),
+            )
+
+
+def create_session(config: Optional[ConnectionConfig] = None) -> aiohttp.ClientSession:
+    """Create a pooled HTTP session, that may be shared by several API services.
+
+    Args:
+        config (Optional[ConnectionConfig], optional): The connection pool
+            configuration. Defaults to ConnectionConfig().
+
+    Returns:
+        aiohttp.ClientSession: The session, to be closed by the caller
+    """
+    config = config or ConnectionConfig()
+    connector = aiohttp.TCPConnector(
+        limit=config.limit,
+        limit_per_host=config.limit_per_host,
+        ttl_dns_cache=config.ttl_dns_cache,
+        keepalive_timeout=config.keepalive_timeout,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(
+            total=config.total_timeout, connect=config.connect_timeout
+        ),
+    )
+
+
+def classify_error(error: Exception) -> ErrorKind:
+    """Classify a request error, to decide how it is handled.
+
+    Args:
+        error (Exception): The error raised by the request
+
+    Returns:
+        ErrorKind: The kind of error
+    """
+    if isinstance(error, ResponseError):
+        if error.status in AUTH_STATUSES:
+            return ErrorKind.Auth
+        if error.status in THROTTLE_STATUSES:
+            return ErrorKind.Throttled
+        if error.status == 408 or error.status >= 500:
+            return ErrorKind.Transient
+        return ErrorKind.Permanent
+    if isinstance(
+        error,
+        (
+            exceptions.ClientConnectionError,
+            exceptions.ClientPayloadError,
+            asyncio.TimeoutError,
+        ),
+    ):
+        return ErrorKind.Transient
+    return ErrorKind.Permanent
@@ -1,15 +1,30 @@
 """Auth Service module."""
 import asyncio
+import base64
+import contextlib
 import functools
+import json
 import logging
 import os
+import random
+import time
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Any
+from typing import Callable
+from typing import List
 from typing import Optional
+from typing import TYPE_CHECKING
 
-import boto3
-from mypy_boto3_cognito_identity.client import CognitoIdentityClient
-from warrant import Cognito
+from edp.redy.services.executor import BoundedExecutor
+from edp.redy.services.executor import ExecutorStats
+from edp.redy.services.tokenstore import StoredTokens
+from edp.redy.services.tokenstore import TokenStore
+from edp.redy.services.tokenstore import TokenStoreError
+
+if TYPE_CHECKING:
+    from mypy_boto3_cognito_identity.client import CognitoIdentityClient
+    from warrant import Cognito
 
 REGION = "eu-west-1"
 COGNITO_USER_POOL_ID = REGION + "_" + "7qre3K7aN"
@@ -19,6 +34,20 @@ IOT_LOGIN = (
     "cognito-idp" + "." + REGION + "." + "amazonaws.com" + "/" + COGNITO_USER_POOL_ID
 )
 
+# Seconds before the user tokens expiration when they are already renewed
+TOKEN_REFRESH_WINDOW = 60
+# Maximum seconds the scheduled renewal is randomly brought forward, so that
+# several processes don't renew at once
+TOKEN_RENEWAL_JITTER = 60
+# Threads running the blocking warrant and boto3 calls
+AUTH_EXECUTOR_WORKERS = 4
+# Seconds before a failed scheduled renewal is retried
+TOKEN_RENEWAL_RETRY = 30
+# Seconds before the identity credentials expiration when callers wait for
+# their renewal, and when they are renewed in the background
+CREDENTIALS_REFRESH_WINDOW = 60
+CREDENTIALS_REFRESH_AHEAD = 300
+
 log = logging.getLogger(__name__)
 
 # The following environment variable need to be settled in order to prevent
@@ -33,12 +62,43 @@ class AuthService:
         self,
         cognito_user: Optional["CognitoUser"] = None,
         cognito_identity: Optional["CognitoIdentity"] = None,
+        token_store: Optional[TokenStore] = None,
+        executor: Optional[BoundedExecutor] = None,
     ):
-        """Initialize the auth service."""
+        """Initialize the auth service.
+
+        Args:
+            cognito_user (Optional[CognitoUser], optional): The cognito user.
+                Defaults to None.
+            cognito_identity (Optional[CognitoIdentity], optional): The cognito
+                identity. Defaults to None.
+            token_store (Optional[TokenStore], optional): Persists the tokens,
+                saved whenever renewed, so that a later process can resume
+                the session. Defaults to None.
+            executor (Optional[BoundedExecutor], optional): Runs the blocking
+                warrant and boto3 calls of the user and identity that don't
+                have their own. Defaults to a BoundedExecutor owned, and shut
+                down on stop, by the service.
+        """
 
         self._cognito_user = cognito_user or CognitoUser()
         self._cognito_identity = cognito_identity or CognitoIdentity(self._cognito_user)
         self._logged_in: bool = False
+        self._owns_executor = executor is None
+        self._executor = executor or BoundedExecutor(
+            max_workers=AUTH_EXECUTOR_WORKERS, name="redy-auth"
+        )
+        if self._cognito_user._executor is None:
+            self._cognito_user._executor = self._executor
+        if self._cognito_identity._executor is None:
+            self._cognito_identity._executor = self._executor
+        self._token_store = token_store
+        # The latest tokens waiting to be written, and the task writing them
+        self._unsaved_tokens: Optional[StoredTokens] = None
+        self._save_task: Optional[asyncio.Task] = None
+        if token_store is not None:
+            self._cognito_user.add_token_listener(self.save_tokens)
+            self._cognito_identity.add_token_listener(self.save_tokens)
 
     @property
     def cognito_user(self):
@@ -58,6 +118,34 @@ class AuthService:
 
         return self._logged_in
 
+    @property
+    def next_renewal(self) -> Optional[datetime]:
+        """Returns the date the user tokens are scheduled to be renewed."""
+
+        return self._cognito_user.next_renewal
+
+    def executor_stats(self) -> ExecutorStats:
+        """Return the statistics of the executor running the blocking calls."""
+        return self._executor.stats()
+
+    async def stop(self):
+        """Stop renewing the tokens and credentials.
+
+        Cancels the scheduled token renewal and the credentials refresh
+        ahead, which would otherwise outlive the app. The tokens being
+        saved are written, then the executor is shut down, unless it is
+        externally owned.
+        """
+        try:
+            await self._cognito_identity.stop()
+        finally:
+            try:
+                await self._cognito_user.stop()
+            finally:
+                await self.flush_tokens()
+                if self._owns_executor:
+                    await self._executor.shutdown()
+
     async def login(self, username: str, password: str):
         """Login with the username and password given."""
 
@@ -67,26 +155,142 @@ class AuthService:
         log.info("User logged in")
         return self
 
+    async def resume(self, username: str, password: Optional[str] = None) -> bool:
+        """Resume the session from the token store, without authenticating.
+
+        Args:
+            username (str): The user the stored tokens must belong to
+            password (Optional[str], optional): Used if the session ever needs
+                to authenticate again. Defaults to None.
+
+        Returns:
+            bool: Whether the session was resumed. Otherwise, login is needed
+        """
+        if self._token_store is None:
+            return False
+        try:
+            tokens = await self._executor.run(self._token_store.load)
+        except TokenStoreError:
+            log.warning("Stored tokens ignored", exc_info=True)
+            return False
+        if tokens is None or tokens.username != username:
+            return False
+        if not await self._cognito_user.resume(tokens, password):
+            return False
+        if tokens.credentials_valid:
+            self._cognito_identity.restore(tokens)
+        self._logged_in = True
+        log.info("User session resumed")
+        return True
+
+    def save_tokens(self):
+        """Save the current tokens into the token store.
+
+        The tokens are taken right away, but written by the executor, off the
+        loop. When saved again meanwhile, only the latest ones are written.
+        """
+        user = self._cognito_user._cognito_user
+        if self._token_store is None or not user.refresh_token:
+            return
+        tokens = StoredTokens(
+            username=user.username,
+            id_token=user.id_token,
+            access_token=user.access_token,
+            refresh_token=user.refresh_token,
+        )
+        credentials = self._cognito_identity.current_credentials
+        if credentials is not None:
+            tokens.access_key_id = credentials.access_key_id
+            tokens.secret_key = credentials.secret_key
+            tokens.session_token = credentials.session_token
+            tokens.credentials_expiration = credentials.expiration.timestamp()
+        self._unsaved_tokens = tokens
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._write_tokens())
+
+    async def flush_tokens(self):
+        """Wait for the tokens being saved to be written."""
+        if self._save_task is not None:
+            await self._save_task
+
+    async def _write_tokens(self):
+        assert self._token_store is not None
+        while self._unsaved_tokens is not None:
+            tokens, self._unsaved_tokens = self._unsaved_tokens, None
+            try:
+                await self._executor.run(self._token_store.save, tokens)
+            except Exception:
+                log.exception("Tokens couldn't be saved")
+
+
+def jwt_expiration(token: Optional[str]) -> float:
+    """Return the expiration timestamp of a JWT token.
+
+    The token signature is not verified, as it was already verified when the
+    token was obtained.
+
+    Args:
+        token (Optional[str]): The JWT token
+
+    Returns:
+        float: The 'exp' claim of the token, or 0 if there's no token
+    """
+    if not token:
+        return 0
+    payload = token.split(".")[1]
+    payload += "=" * (-len(payload) % 4)
+    return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+
 
 class CognitoUser:
     """Cognito User class."""
 
     def __init__(
         self,
-        cognito_user: Optional[Cognito] = None,
+        cognito_user: Optional["Cognito"] = None,
         user_pool_id: str = COGNITO_USER_POOL_ID,
         client_id: str = COGNITO_CLIENT_ID,
         region: str = REGION,
+        refresh_window: float = TOKEN_REFRESH_WINDOW,
+        renewal_jitter: float = TOKEN_RENEWAL_JITTER,
+        executor: Optional[BoundedExecutor] = None,
     ):
-        """Initialize the cognito user."""
+        """Initialize the cognito user.
+
+        Args:
+            cognito_user (Optional[Cognito], optional): The warrant cognito
+                user. Defaults to None.
+            user_pool_id (str, optional): The user pool id. Defaults to
+                COGNITO_USER_POOL_ID.
+            client_id (str, optional): The client id. Defaults to
+                COGNITO_CLIENT_ID.
+            region (str, optional): The region. Defaults to REGION.
+            refresh_window (float, optional): Seconds before the tokens
+                expiration when they are renewed on demand. Defaults to
+                TOKEN_REFRESH_WINDOW.
+            renewal_jitter (float, optional): Maximum seconds the scheduled
+                renewal is randomly brought forward, before the refresh
+                window. Defaults to TOKEN_RENEWAL_JITTER.
+            executor (Optional[BoundedExecutor], optional): Runs the blocking
+                warrant calls. Defaults to the one of the AuthService, or the
+                loop default executor if there's none.
+        """
 
-        self._cognito_user = cognito_user or self._get_cognito_user()
         self._logged_in: bool = False
-        self._user_pool_id = (user_pool_id,)
+        self._user_pool_id = user_pool_id
         self._client_id = client_id
         self._region = region
-        self._auth_task: asyncio.Task
-        self._password: str
+        self._cognito_user = cognito_user or self._get_cognito_user()
+        self._auth_task: Optional[asyncio.Task] = None
+        # Only kept to authenticate again if the refresh token is rejected
+        self._password: Optional[str] = None
+        self._refresh_window = refresh_window
+        self._renewal_jitter = renewal_jitter
+        self._executor = executor
+        self._token_expiration: float = 0
+        self._next_renewal: float = 0
+        self._token_lock = asyncio.Lock()
+        self._token_listeners: List[Callable[[], None]] = []
 
     async def login(self, username: str, password: str):
         """Authenticate user given the username and password."""
@@ -94,14 +298,62 @@ class CognitoUser:
         self._cognito_user.username = username
         self._password = password
         await self.authenticate()
-        self._auth_task = asyncio.create_task(self._authenticate_task())
+        self._start_renewal()
+        self._logged_in = True
+
+    async def resume(
+        self, tokens: StoredTokens, password: Optional[str] = None
+    ) -> bool:
+        """Resume a session from stored tokens, without authenticating.
+
+        Expired tokens are renewed with the refresh token.
+
+        Args:
+            tokens (StoredTokens): The stored tokens
+            password (Optional[str], optional): Used if the session ever needs
+                to authenticate again. Defaults to None.
+
+        Returns:
+            bool: Whether the session was resumed
+        """
+        cognito = self._cognito_user
+        cognito.username = tokens.username
+        cognito.id_token = tokens.id_token
+        cognito.access_token = tokens.access_token
+        cognito.refresh_token = tokens.refresh_token
+        self._password = password
+        try:
+            self._update_token_expiration()
+            if not self._token_valid():
+                await self._run_in_executor(cognito.renew_access_token)
+                self._tokens_updated()
+        except Exception:
+            log.info("Stored tokens couldn't be renewed", exc_info=True)
+            return False
+        self._start_renewal()
         self._logged_in = True
+        return True
+
+    async def stop(self):
+        """Stop renewing the tokens."""
+        if self._auth_task is not None:
+            self._auth_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._auth_task
+            self._auth_task = None
 
     async def authenticate(self):
         """Authenticate."""
+        if not self._password:
+            raise RuntimeError("Password required to authenticate")
         await self._run_in_executor(
             self._cognito_user.authenticate, password=self._password
         )
+        self._tokens_updated()
+
+    def add_token_listener(self, listener: Callable[[], None]):
+        """Register a callback, called whenever the tokens change."""
+        self._token_listeners.append(listener)
 
     @property
     def logged_in(self):
@@ -109,6 +361,22 @@ class CognitoUser:
 
         return self._logged_in
 
+    @property
+    def token_expiration(self) -> Optional[datetime]:
+        """Returns the expiration date of the current tokens."""
+
+        if not self._token_expiration:
+            return None
+        return datetime.fromtimestamp(self._token_expiration).astimezone()
+
+    @property
+    def next_renewal(self) -> Optional[datetime]:
+        """Returns the date the tokens are scheduled to be renewed."""
+
+        if not self._next_renewal:
+            return None
+        return datetime.fromtimestamp(self._next_renewal).astimezone()
+
     @property
     async def id_token(self):
         """Returns the current cognito user id token.
@@ -139,10 +407,63 @@ class CognitoUser:
         await self._check_token()
         return self._cognito_user.refresh_token
 
+    def _token_valid(self) -> bool:
+        return time.time() < self._token_expiration - self._refresh_window
+
     async def _check_token(self):
-        await self._run_in_executor(self._cognito_user.check_token)
+        # Hot path: the expiration is cached, so no executor hop is needed
+        if self._token_valid():
+            return
+        async with self._token_lock:
+            # Concurrent callers wait for the renewal done by the first one
+            if self._token_valid():
+                return
+            await self._renew_tokens()
+
+    async def refresh(self):
+        """Force the renewal of the tokens, e.g. after they were rejected.
+
+        Concurrent calls share a single renewal.
+        """
+        expiration = self._token_expiration
+        async with self._token_lock:
+            if self._token_expiration != expiration:
+                return
+            await self._renew_tokens()
+
+    async def _renew_tokens(self):
+        log.debug("Renewing user tokens")
+        if not self._cognito_user.refresh_token:
+            raise AttributeError("Refresh Token Required to Renew Tokens")
+        try:
+            await self._run_in_executor(self._cognito_user.renew_access_token)
+        except Exception:
+            log.warning("Tokens renewal failed, authenticating again", exc_info=True)
+            await self.authenticate()
+            return
+        self._tokens_updated()
+
+    def _update_token_expiration(self):
+        self._token_expiration = min(
+            jwt_expiration(self._cognito_user.id_token),
+            jwt_expiration(self._cognito_user.access_token),
+        )
+        # Renewed before the refresh window, so requests never wait for it
+        self._next_renewal = (
+            self._token_expiration
+            - self._refresh_window
+            - random.uniform(0, self._renewal_jitter)
+        )
+        log.debug(f"Next tokens renewal at {self.next_renewal}")
+
+    def _tokens_updated(self):
+        self._update_token_expiration()
+        _notify(self._token_listeners)
+
+    def _get_cognito_user(self) -> "Cognito":
+        # Imported on first use, as warrant pulls boto3 in
+        from warrant import Cognito
 
-    def _get_cognito_user(self) -> Cognito:
         return Cognito(
             user_pool_id=self._user_pool_id,
             client_id=self._client_id,
@@ -150,20 +471,46 @@ class CognitoUser:
         )
 
     async def _run_in_executor(self, func, *args, **kwargs) -> Any:
-        return await asyncio.get_event_loop().run_in_executor(
-            None, functools.partial(func, *args, **kwargs)
-        )
+        return await _run_in_executor(self._executor, func, *args, **kwargs)
+
+    def _start_renewal(self):
+        if self._auth_task is None or self._auth_task.done():
+            self._auth_task = asyncio.create_task(self._renewal_task())
 
-    async def _authenticate_task(self):
+    async def _renewal_task(self):
         while True:
+            await asyncio.sleep(max(0, self._next_renewal - time.time()))
             try:
-                # Re-authenticate after 55 min
-                await asyncio.sleep(60 * 55)
-                await self._run_in_executor(
-                    self._cognito_user.authenticate, password=self._password
-                )
+                async with self._token_lock:
+                    # The tokens may have been renewed on demand meanwhile
+                    if time.time() < self._next_renewal:
+                        continue
+                    await self._renew_tokens()
+                log.info(f"Tokens renewed, next renewal at {self.next_renewal}")
             except Exception:
-                log.exception("Error: ")
+                log.exception("Scheduled tokens renewal failed")
+                await asyncio.sleep(TOKEN_RENEWAL_RETRY)
+
+
+@dataclass(frozen=True)
+class Credentials:
+    """Cognito identity credentials dataclass.
+
+    Attributes:
+        access_key_id (str): The access key id
+        secret_key (str): The secret key
+        session_token (str): The session token
+        expiration (datetime): The date the credentials expire at
+    """
+
+    access_key_id: str
+    secret_key: str
+    session_token: str
+    expiration: datetime
+
+    def expires_within(self, seconds: float) -> bool:
+        """Indicate whether the credentials expire within the given seconds."""
+        return time.time() + seconds >= self.expiration.timestamp()
 
 
 class CognitoIdentity:
@@ -172,22 +519,47 @@ class CognitoIdentity:
     def __init__(
         self,
         cognito_user: CognitoUser,
-        cognito_identity: Optional[CognitoIdentityClient] = None,
+        cognito_identity: Optional["CognitoIdentityClient"] = None,
         identity_id: str = IOT_IDENTITY_POOL_ID,
         login: str = IOT_LOGIN,
         region: str = REGION,
+        refresh_window: float = CREDENTIALS_REFRESH_WINDOW,
+        refresh_ahead: float = CREDENTIALS_REFRESH_AHEAD,
+        executor: Optional[BoundedExecutor] = None,
     ):
-        """Initialize the cognito identity."""
+        """Initialize the cognito identity.
+
+        Args:
+            cognito_user (CognitoUser): The cognito user
+            cognito_identity (Optional[CognitoIdentityClient], optional): The
+                boto3 cognito identity client. Defaults to None.
+            identity_id (str, optional): The identity pool id. Defaults to
+                IOT_IDENTITY_POOL_ID.
+            login (str, optional): The identity login. Defaults to IOT_LOGIN.
+            region (str, optional): The region. Defaults to REGION.
+            refresh_window (float, optional): Seconds before the credentials
+                expiration when callers wait for their renewal. Defaults to
+                CREDENTIALS_REFRESH_WINDOW.
+            refresh_ahead (float, optional): Seconds before the credentials
+                expiration when they are renewed in the background. Defaults
+                to CREDENTIALS_REFRESH_AHEAD.
+            executor (Optional[BoundedExecutor], optional): Runs the blocking
+                boto3 calls. Defaults to the one of the AuthService, or the
+                loop default executor if there's none.
+        """
 
         self._cognito_user = cognito_user
         self._identity_id = identity_id
         self._login = login
         self._region = region
         self._cognito_identity = cognito_identity or self._get_cognito_identity()
-        self._access_key_id = None
-        self._secret_key = None
-        self._session_token = None
-        self._expiration = None
+        self._refresh_window = refresh_window
+        self._refresh_ahead = refresh_ahead
+        self._executor = executor
+        self._credentials: Optional[Credentials] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._token_listeners: List[Callable[[], None]] = []
 
     @property
     async def access_key_id(self):
@@ -196,8 +568,7 @@ class CognitoIdentity:
         If token is expired, it will be automatically refreshed.
         """
 
-        await self._check_token()
-        return self._access_key_id
+        return (await self.credentials()).access_key_id
 
     @property
     async def secret_key(self):
@@ -206,8 +577,7 @@ class CognitoIdentity:
         If token is expired, it will be automatically refreshed.
         """
 
-        await self._check_token()
-        return self._secret_key
+        return (await self.credentials()).secret_key
 
     @property
     async def session_token(self):
@@ -216,8 +586,7 @@ class CognitoIdentity:
         If token is expired, it will be automatically refreshed.
         """
 
-        await self._check_token()
-        return self._session_token
+        return (await self.credentials()).session_token
 
     @property
     async def expiration(self):
@@ -226,26 +595,107 @@ class CognitoIdentity:
         If token is expired, it will be automatically refreshed.
         """
 
-        await self._check_token()
-        return self._expiration
-
-    async def _check_token(self, renew=True) -> bool:
-        now = datetime.now().timestamp()
-        if not self._session_token or now > self._expiration.timestamp():
-            expired = True
-            if renew:
-                log.debug("Renewing Session token")
-                await self._renew_access_token()
-        else:
-            expired = False
-        return expired
-
-    async def _renew_access_token(self):
-        credentials = await self._get_identity_credentials()
-        self._access_key_id = credentials["AccessKeyId"]
-        self._secret_key = credentials["SecretKey"]
-        self._session_token = credentials["SessionToken"]
-        self._expiration = credentials["Expiration"].astimezone()
+        return (await self.credentials()).expiration
+
+    @property
+    def current_credentials(self) -> Optional[Credentials]:
+        """Returns the cached credentials, without renewing them.
+
+        Suitable for synchronous callers, as they are kept fresh in the
+        background once credentials() was awaited.
+        """
+
+        return self._credentials
+
+    async def credentials(self) -> Credentials:
+        """Return a consistent snapshot of the credentials.
+
+        If they are about to expire, they are renewed first. Concurrent
+        callers share a single renewal. After the first call, they are also
+        renewed in the background ahead of their expiration.
+        """
+
+        credentials = self._credentials
+        if credentials is None or credentials.expires_within(self._refresh_window):
+            credentials = await self._renew(self._refresh_window)
+        self._start_refresh()
+        return credentials
+
+    async def refresh(self) -> Credentials:
+        """Force the renewal of the credentials, e.g. after they were rejected.
+
+        Concurrent calls share a single renewal.
+        """
+        return await self._renew(self._refresh_window, stale=self._credentials)
+
+    def add_token_listener(self, listener: Callable[[], None]):
+        """Register a callback, called whenever the credentials change."""
+        self._token_listeners.append(listener)
+
+    def restore(self, tokens: StoredTokens):
+        """Restore the stored credentials, instead of getting new ones."""
+        assert tokens.access_key_id and tokens.secret_key and tokens.session_token
+        self._credentials = Credentials(
+            access_key_id=tokens.access_key_id,
+            secret_key=tokens.secret_key,
+            session_token=tokens.session_token,
+            expiration=datetime.fromtimestamp(
+                tokens.credentials_expiration
+            ).astimezone(),
+        )
+
+    async def stop(self):
+        """Stop renewing the credentials in the background."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._refresh_task
+            self._refresh_task = None
+
+    async def _renew(
+        self, window: float, stale: Optional[Credentials] = None
+    ) -> Credentials:
+        async with self._lock:
+            # Concurrent callers wait for the renewal done by the first one
+            credentials = self._credentials
+            if (
+                credentials is not None
+                and credentials is not stale
+                and not credentials.expires_within(window)
+            ):
+                return credentials
+            log.debug("Renewing identity credentials")
+            response = await self._get_identity_credentials()
+            credentials = self._credentials = Credentials(
+                access_key_id=response["AccessKeyId"],
+                secret_key=response["SecretKey"],
+                session_token=response["SessionToken"],
+                expiration=response["Expiration"].astimezone(),
+            )
+        _notify(self._token_listeners)
+        return credentials
+
+    def _start_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_ahead_task())
+
+    async def _refresh_ahead_task(self):
+        while True:
+            credentials = self._credentials
+            if credentials is not None:
+                await asyncio.sleep(
+                    max(
+                        0,
+                        credentials.expiration.timestamp()
+                        - self._refresh_ahead
+                        - time.time(),
+                    )
+                )
+            try:
+                await self._renew(self._refresh_ahead)
+            except Exception:
+                log.exception("Identity credentials renewal failed")
+                await asyncio.sleep(TOKEN_RENEWAL_RETRY)
 
     async def _get_identity_credentials(self):
         if not self._cognito_user.logged_in:
@@ -258,13 +708,31 @@ class CognitoIdentity:
         )
         return ret["Credentials"]
 
-    def _get_cognito_identity(self) -> CognitoIdentityClient:
+    def _get_cognito_identity(self) -> "CognitoIdentityClient":
+        import boto3
+
         return boto3.client(
             "cognito-identity",
             region_name=self._region,
         )
 
     async def _run_in_executor(self, func, *args, **kwargs) -> Any:
-        return await asyncio.get_event_loop().run_in_executor(
-            None, functools.partial(func, *args, **kwargs)
-        )
+        return await _run_in_executor(self._executor, func, *args, **kwargs)
+
+
+def _notify(listeners: List[Callable[[], None]]):
+    for listener in listeners:
+        try:
+            listener()
+        except Exception:
+            log.exception("Token listener failed")
+
+
+async def _run_in_executor(
+    executor: Optional[BoundedExecutor], func, *args, **kwargs
+) -> Any:
+    if executor is not None:
+        return await executor.run(func, *args, **kwargs)
+    return await asyncio.get_event_loop().run_in_executor(
+        None, functools.partial(func, *args, **kwargs)
+    )
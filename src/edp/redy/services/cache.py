@@ -0,0 +1,187 @@
+"""API response cache module."""
+import time
+from abc import ABC
+from abc import abstractmethod
+from dataclasses import dataclass
+from typing import Any
+from typing import Dict
+from typing import Hashable
+from typing import Iterable
+from typing import Optional
+from typing import OrderedDict
+from typing import Tuple
+
+from edp.redy.services.devices.constants import DEVICES_URL
+from edp.redy.services.devices.constants import MODULE_URL
+from edp.redy.services.devices.constants import MODULES_URL
+from edp.redy.services.endpoint import EndpointMatcher
+from edp.redy.services.houses.constants import CONTRACTED_POWER_URL
+from edp.redy.services.houses.constants import HOUSES_URL
+from edp.redy.services.houses.constants import TARIFF_URL
+from edp.redy.services.statevars.constants import STATE_VARS_URL
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    """Cache rule dataclass.
+
+    Attributes:
+        template (str): The endpoint url template
+        ttl (float): Seconds a response of the endpoint is kept
+    """
+
+    template: str
+    ttl: float
+
+
+DEFAULT_CACHE_RULES: Tuple[CacheRule, ...] = (
+    CacheRule(HOUSES_URL, ttl=60 * 60),
+    CacheRule(TARIFF_URL, ttl=60 * 60),
+    CacheRule(CONTRACTED_POWER_URL, ttl=60 * 60),
+    CacheRule(DEVICES_URL, ttl=15 * 60),
+    CacheRule(MODULES_URL, ttl=15 * 60),
+    CacheRule(MODULE_URL, ttl=15 * 60),
+    CacheRule(STATE_VARS_URL, ttl=24 * 60 * 60),
+)
+
+
+@dataclass
+class CacheStats:
+    """Cache statistics dataclass."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    size: int = 0
+
+
+class CachePolicy:
+    """Decides which responses are cached and for how long."""
+
+    def __init__(self, rules: Iterable[CacheRule] = DEFAULT_CACHE_RULES) -> None:
+        """Create a cache policy.
+
+        Args:
+            rules (Iterable[CacheRule], optional): The per endpoint rules.
+                Defaults to DEFAULT_CACHE_RULES.
+        """
+        self._ttls: Dict[str, float] = {rule.template: rule.ttl for rule in rules}
+        self._matcher = EndpointMatcher(self._ttls)
+
+    def lookup(self, url: str) -> Tuple[Optional[float], Optional[str]]:
+        """Return the ttl and the house id of an url.
+
+        Args:
+            url (str): The expanded url
+
+        Returns:
+            Tuple[Optional[float], Optional[str]]: The ttl (None if the url
+                isn't cacheable) and the house the url refers to
+        """
+        template, fields = self._matcher.resolve(url)
+        if template is None:
+            return None, None
+        return self._ttls[template], fields.get("house_id")
+
+
+def cache_key(url: str, params: Optional[Dict[str, Any]] = None) -> CacheKey:
+    """Build the cache key of a request.
+
+    Args:
+        url (str): The expanded url
+        params (Optional[Dict[str, Any]], optional): The query parameters
+
+    Returns:
+        CacheKey: A key independent of the parameters order
+    """
+    if not params:
+        return url, ()
+    return url, tuple(sorted((str(k), str(v)) for k, v in params.items()))
+
+
+class ResponseCache(ABC):
+    """Base class for API response caches."""
+
+    @abstractmethod
+    async def get(self, key: Hashable) -> Optional[Any]:
+        """Return a cached response, or None if missing or expired."""
+
+    @abstractmethod
+    async def set(
+        self, key: Hashable, value: Any, ttl: float, house_id: Optional[str] = None
+    ):
+        """Cache a response for ttl seconds, tagged with its house id."""
+
+    @abstractmethod
+    async def invalidate(self, house_id: Optional[str] = None):
+        """Drop the responses of a house, or every response if not given."""
+
+    @abstractmethod
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the cache statistics."""
+
+
+class MemoryResponseCache(ResponseCache):
+    """In-memory response cache, with LRU eviction."""
+
+    def __init__(self, max_size: int = 256) -> None:
+        """Create an in-memory response cache.
+
+        Args:
+            max_size (int, optional): Maximum number of cached responses.
+                Defaults to 256.
+        """
+        self._max_size = max_size
+        self._entries: OrderedDict[
+            Hashable, Tuple[float, Optional[str], Any]
+        ] = OrderedDict()
+        self._stats = CacheStats()
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        """Return a cached response, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats.misses += 1
+            return None
+        expires, _, value = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            self._stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        return value
+
+    async def set(
+        self, key: Hashable, value: Any, ttl: float, house_id: Optional[str] = None
+    ):
+        """Cache a response for ttl seconds, tagged with its house id."""
+        self._entries[key] = (time.monotonic() + ttl, house_id, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    async def invalidate(self, house_id: Optional[str] = None):
+        """Drop the responses of a house, or every response if not given."""
+        if house_id is None:
+            self._stats.invalidations += len(self._entries)
+            self._entries.clear()
+            return
+        keys = [key for key, entry in self._entries.items() if entry[1] == house_id]
+        for key in keys:
+            del self._entries[key]
+        self._stats.invalidations += len(keys)
+
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the cache statistics."""
+        return CacheStats(
+            hits=self._stats.hits,
+            misses=self._stats.misses,
+            evictions=self._stats.evictions,
+            invalidations=self._stats.invalidations,
+            size=len(self._entries),
+        )
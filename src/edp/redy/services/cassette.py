@@ -0,0 +1,206 @@
+"""Cassette module, recording and replaying API interactions."""
+import asyncio
+import json
+import logging
+import os
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from enum import Enum
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+
+from edp.redy.services.cache import cache_key
+from edp.redy.services.cache import CacheKey
+
+log = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+# Response headers kept in the recordings
+RECORDED_HEADERS = ("Content-Type", "Retry-After")
+
+
+class CassetteMode(str, Enum):
+    """Cassette modes."""
+
+    Record = "record"
+    Replay = "replay"
+
+
+class CassetteMiss(LookupError):
+    """There's no recorded interaction for a replayed request."""
+
+
+@dataclass
+class Interaction:
+    """Recorded request/response pair.
+
+    Attributes:
+        url (str): The expanded url, without the base url
+        params (Dict[str, str]): The query parameters
+        status (int): The response status
+        body (str): The response body
+        reason (str): The response reason
+        headers (Dict[str, str]): The RECORDED_HEADERS of the response
+    """
+
+    url: str
+    params: Dict[str, str]
+    status: int
+    body: str
+    reason: str = "OK"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def key(self) -> CacheKey:
+        """Return the key identifying the request."""
+        return cache_key(self.url, self.params)
+
+
+class Cassette:
+    """Records the API interactions to a file, and replays them.
+
+    The request headers, and thus the tokens, are never recorded. The
+    responses are, so the recordings hold the account data.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        mode: CassetteMode = CassetteMode.Replay,
+        latency: float = 0,
+        match_params: bool = True,
+        interactions: Iterable[Interaction] = (),
+    ) -> None:
+        """Create a cassette.
+
+        Args:
+            path (Optional[str], optional): The recordings file. In replay
+                mode it is loaded if it exists. Defaults to None.
+            mode (CassetteMode, optional): Whether the interactions are
+                recorded or replayed. Defaults to CassetteMode.Replay.
+            latency (float, optional): Seconds each replayed response is
+                delayed. Defaults to 0.
+            match_params (bool, optional): Whether replayed requests must match
+                the recorded parameters. Otherwise the last interaction of the
+                same url is used when there's no exact match. Defaults to True.
+            interactions (Iterable[Interaction], optional): Interactions added
+                to the cassette. Defaults to ().
+        """
+        self._path = path
+        self.mode = mode
+        self.latency = latency
+        self._match_params = match_params
+        self._interactions: Dict[CacheKey, Interaction] = {}
+        self._by_url: Dict[str, Interaction] = {}
+        if path and mode == CassetteMode.Replay and os.path.exists(path):
+            self.load(path)
+        for interaction in interactions:
+            self.add(interaction)
+
+    @property
+    def replaying(self) -> bool:
+        """Indicate whether the cassette replays the interactions."""
+        return self.mode == CassetteMode.Replay
+
+    @property
+    def interactions(self) -> List[Interaction]:
+        """Return the interactions of the cassette."""
+        return list(self._interactions.values())
+
+    def add(self, interaction: Interaction):
+        """Add an interaction, replacing any other for the same request."""
+        self._interactions[interaction.key] = interaction
+        self._by_url[interaction.url] = interaction
+
+    def find(
+        self, url: str, params: Optional[Mapping[str, Any]] = None
+    ) -> Optional[Interaction]:
+        """Find the interaction of a request.
+
+        Args:
+            url (str): The expanded url, without the base url
+            params (Optional[Mapping[str, Any]], optional): The query
+                parameters. Defaults to None.
+
+        Returns:
+            Optional[Interaction]: The interaction, or None if not recorded
+        """
+        interaction = self._interactions.get(cache_key(url, params))
+        if interaction is None and not self._match_params:
+            interaction = self._by_url.get(url)
+        return interaction
+
+    def record(
+        self,
+        url: str,
+        params: Optional[Mapping[str, Any]],
+        status: int,
+        reason: str,
+        headers: Mapping[str, str],
+        body: bytes,
+    ):
+        """Record an interaction."""
+        self.add(
+            Interaction(
+                url=url,
+                params={str(k): str(v) for k, v in (params or {}).items()},
+                status=status,
+                reason=reason,
+                headers={
+                    name: headers[name] for name in RECORDED_HEADERS if name in headers
+                },
+                body=body.decode(errors="replace"),
+            )
+        )
+
+    async def play(
+        self, url: str, params: Optional[Mapping[str, Any]] = None
+    ) -> Tuple[int, str, Mapping[str, str], bytes]:
+        """Replay the response of a request, after the configured latency.
+
+        Raises:
+            CassetteMiss: If the request wasn't recorded
+
+        Returns:
+            Tuple[int, str, Mapping[str, str], bytes]: The status, reason,
+                headers and body of the response
+        """
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        interaction = self.find(url, params)
+        if interaction is None:
+            raise CassetteMiss(f"No interaction recorded for {url} {params or ''}")
+        return (
+            interaction.status,
+            interaction.reason,
+            interaction.headers,
+            interaction.body.encode(),
+        )
+
+    def load(self, path: Optional[str] = None):
+        """Load the interactions from a file."""
+        path = path or self._path
+        assert path, "No cassette path"
+        with open(path) as file:
+            content = json.load(file)
+        for interaction in content["interactions"]:
+            self.add(Interaction(**interaction))
+        log.debug(f"Loaded {len(self._interactions)} interactions from {path}")
+
+    def save(self, path: Optional[str] = None):
+        """Save the interactions to a file."""
+        path = path or self._path
+        assert path, "No cassette path"
+        content = {
+            "version": CASSETTE_VERSION,
+            "interactions": [asdict(i) for i in self._interactions.values()],
+        }
+        with open(path, "w") as file:
+            json.dump(content, file, indent=2)
+        log.debug(f"Saved {len(self._interactions)} interactions to {path}")
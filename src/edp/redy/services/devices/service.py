@@ -2,11 +2,15 @@
 import json
 import logging
 from datetime import datetime
+from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Sequence
 
 from dateutil.relativedelta import relativedelta
 from edp.redy.services.api import ApiService
+from edp.redy.services.api import GetRequest
+from edp.redy.services.api import GetResult
 from edp.redy.services.devices.constants import COST_PER_KWH_URL
 from edp.redy.services.devices.constants import DEVICES_URL
 from edp.redy.services.devices.constants import METERING_URL
@@ -48,6 +52,24 @@ class DevicesService:
         groups_not_filter: Optional[List[DeviceGroup]] = None,
     ) -> List[Module]:
         """Get  list of house modules."""
+        request = self.house_modules_request(
+            house_id, device_type, category_id, groups_or_filter, groups_not_filter
+        )
+        modules_list = (
+            await self._api_service.get(request.url, params=request.params)
+        )["Modules"]
+
+        return Module.schema().load(modules_list, many=True)
+
+    def house_modules_request(
+        self,
+        house_id,
+        device_type: Optional[DeviceType] = None,
+        category_id: Optional[str] = None,
+        groups_or_filter: Optional[List[DeviceGroup]] = None,
+        groups_not_filter: Optional[List[DeviceGroup]] = None,
+    ) -> GetRequest:
+        """Build the request getting a list of house modules."""
         params = {}
 
         if device_type and (device_type != DeviceType.Consumption or not category_id):
@@ -68,20 +90,30 @@ class DevicesService:
             if groups_not_filter:
                 params["groupsnotfilter"] = json.dumps(groups_not_filter)
 
-        modules_list = (
-            await self._api_service.get(
-                MODULES_URL.format(house_id=house_id), params=params
-            )
-        )["Modules"]
+        return GetRequest(url=MODULES_URL.format(house_id=house_id), params=params)
 
-        return Module.schema().load(modules_list, many=True)
+    async def get_house_modules_by_groups(
+        self, house_id: str, groups: Sequence[DeviceGroup], max_concurrency: int = 4
+    ) -> Dict[DeviceGroup, List[Module]]:
+        """Get the house modules of each group, with concurrent requests."""
+        results = await self._api_service.get_many(
+            [
+                self.house_modules_request(house_id, groups_or_filter=[group])
+                for group in groups
+            ],
+            max_concurrency=max_concurrency,
+        )
+        return {
+            group: Module.schema().load(result.unwrap()["Modules"], many=True)
+            for group, result in zip(groups, results)
+        }
 
     async def get_house_module_by_group(
         self, house_id, groups_or_filter: Optional[DeviceGroup] = None, *args, **kwargs
     ) -> Module:
         """Get a list of house modules by group."""
         modules = await self.get_house_modules(
-            house_id, [groups_or_filter], *args, **kwargs
+            house_id, *args, groups_or_filter=[groups_or_filter], **kwargs
         )
         return modules[0]
 
@@ -92,6 +124,19 @@ class DevicesService:
         )
         return Module.from_dict(module)
 
+    async def get_house_modules_by_id(
+        self, house_id: str, module_ids: Sequence[str], max_concurrency: int = 8
+    ) -> List[Module]:
+        """Get several house modules, with concurrent requests."""
+        results = await self._api_service.get_many(
+            [
+                GetRequest(MODULE_URL.format(house_id=house_id, module_id=module_id))
+                for module_id in module_ids
+            ],
+            max_concurrency=max_concurrency,
+        )
+        return [Module.from_dict(result.unwrap()) for result in results]
+
     async def get_smart_meter(self, house_id: str) -> Module:
         """Get the smart meter module."""
         return await self.get_house_module_by_group(
@@ -182,6 +227,25 @@ class DevicesService:
         end: Optional[datetime] = None,
     ):
         """Get metering."""
+        request = self.metering_request(
+            house_id, device_id, module_id, resolution, historicVar, start, end
+        )
+        # log.info(f"get_metering params: {request.params}")
+        metering = await self._api_service.get(request.url, params=request.params)
+
+        return metering
+
+    def metering_request(
+        self,
+        house_id: str,
+        device_id: str,
+        module_id: str,
+        resolution: Resolution,
+        historicVar: HistoricVar,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> GetRequest:
+        """Build the request getting the metering."""
         if not start:
             start = self.calculate_start(resolution)
         if not end:
@@ -193,12 +257,17 @@ class DevicesService:
             "resolution": resolution.value,
             "historicvar": historicVar.value,
         }
-        # log.info(f"get_metering params: {params}")
-        metering = await self._api_service.get(
-            METERING_URL.format(
+        return GetRequest(
+            url=METERING_URL.format(
                 house_id=house_id, device_id=device_id, module_id=module_id
             ),
             params=params,
         )
 
-        return metering
+    async def get_meterings(
+        self, requests: Sequence[GetRequest], max_concurrency: int = 4
+    ) -> List[GetResult]:
+        """Get several meterings, built by metering_request, concurrently."""
+        return await self._api_service.get_many(
+            requests, max_concurrency=max_concurrency
+        )
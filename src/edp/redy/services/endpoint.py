@@ -0,0 +1,84 @@
+"""Endpoint templates module."""
+import re
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import Tuple
+
+_FIELD = re.compile(r"\{(\w+)\}")
+
+
+class Endpoint:
+    """Endpoint template class.
+
+    Matches expanded urls, such as '/equipment/houses/123/device', against
+    the template they were built from, such as '/equipment/houses/{house_id}/device'.
+    """
+
+    def __init__(self, template: str) -> None:
+        """Create an endpoint object.
+
+        Args:
+            template (str): The url template, with '{name}' placeholders
+        """
+        self.template = template
+        pattern = ""
+        position = 0
+        for field in _FIELD.finditer(template):
+            pattern += re.escape(template[position : field.start()])
+            pattern += f"(?P<{field.group(1)}>[^/]+)"
+            position = field.end()
+        pattern += re.escape(template[position:])
+        self._regex = re.compile(pattern)
+
+    def match(self, url: str) -> Optional[Dict[str, str]]:
+        """Match an url against the endpoint template.
+
+        Args:
+            url (str): The expanded url
+
+        Returns:
+            Optional[Dict[str, str]]: The template fields, or None if the url
+                wasn't built from this template
+        """
+        match = self._regex.fullmatch(url)
+        return match.groupdict() if match else None
+
+    def __repr__(self) -> str:
+        """Generate a string representation of the endpoint."""
+        return f"Endpoint({self.template!r})"
+
+
+class EndpointMatcher:
+    """Resolves expanded urls into their endpoint templates."""
+
+    def __init__(self, templates: Iterable[str]) -> None:
+        """Create an endpoint matcher.
+
+        Args:
+            templates (Iterable[str]): The known url templates
+        """
+        self._endpoints = [Endpoint(template) for template in templates]
+        self._resolved: Dict[str, Tuple[Optional[str], Dict[str, str]]] = {}
+
+    def resolve(self, url: str) -> Tuple[Optional[str], Dict[str, str]]:
+        """Resolve an url into its template and template fields.
+
+        Args:
+            url (str): The expanded url
+
+        Returns:
+            Tuple[Optional[str], Dict[str, str]]: The template (None if
+                unknown) and the values of its fields
+        """
+        resolved = self._resolved.get(url)
+        if resolved is None:
+            resolved = (None, {})
+            for endpoint in self._endpoints:
+                fields = endpoint.match(url)
+                if fields is not None:
+                    resolved = (endpoint.template, fields)
+                    break
+            if len(self._resolved) < 4096:
+                self._resolved[url] = resolved
+        return resolved
@@ -0,0 +1,143 @@
+"""Executor module, running blocking calls off the event loop."""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class ExecutorStats:
+    """Executor statistics dataclass.
+
+    Attributes:
+        max_workers (int): Maximum threads running calls
+        queued (int): Calls waiting for a thread
+        running (int): Calls being run
+        completed (int): Calls that returned
+        failed (int): Calls that raised
+        wait_sum (float): Seconds all the calls waited for a thread
+        wait_max (float): Longest wait for a thread, in seconds
+        duration_sum (float): Seconds all the calls ran for
+        duration_max (float): Slowest call, in seconds
+    """
+
+    max_workers: int
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    failed: int = 0
+    wait_sum: float = 0
+    wait_max: float = 0
+    duration_sum: float = 0
+    duration_max: float = 0
+
+    @property
+    def duration_mean(self) -> float:
+        """Return the mean call duration, in seconds."""
+        calls = self.completed + self.failed
+        return self.duration_sum / calls if calls else 0
+
+
+class BoundedExecutor:
+    """Thread pool dedicated to blocking calls, with a bounded size.
+
+    Unlike the loop default executor, it isn't shared with unrelated work,
+    so its calls can't starve, or be starved by, other users.
+    """
+
+    def __init__(self, max_workers: int = 4, name: str = "redy") -> None:
+        """Create a bounded executor.
+
+        Args:
+            max_workers (int, optional): Maximum threads running calls, the
+                others wait in a queue. Defaults to 4.
+            name (str, optional): Prefix of the thread names. Defaults to
+                "redy".
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._stats = ExecutorStats(max_workers=max_workers)
+        # The statistics are updated from the worker threads
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking call in the executor, and wait for its result.
+
+        Raises:
+            RuntimeError: If the executor was shut down
+        """
+        if self._shutdown:
+            raise RuntimeError("Executor was shut down")
+        with self._lock:
+            self._stats.queued += 1
+        future = self._executor.submit(
+            self._call, functools.partial(func, *args, **kwargs), time.monotonic()
+        )
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Cancelled before a thread took the call, which then never
+            # leaves the queue by itself
+            if future.cancel():
+                with self._lock:
+                    self._stats.queued -= 1
+            raise
+
+    def stats(self) -> ExecutorStats:
+        """Return a copy of the executor statistics."""
+        with self._lock:
+            return ExecutorStats(**vars(self._stats))
+
+    async def shutdown(self):
+        """Stop accepting calls, and wait for the running ones to finish."""
+        if self._shutdown:
+            return
+        self._shutdown = True
+        loop = asyncio.get_event_loop()
+        done = loop.create_future()
+
+        # Waiting for the threads blocks, so it is done in another thread
+        def wait():
+            self._executor.shutdown(wait=True)
+            loop.call_soon_threadsafe(done.set_result, None)
+
+        threading.Thread(target=wait, daemon=True).start()
+        await done
+        log.debug("Executor shut down")
+
+    def _call(self, func: Callable[[], Any], submitted: float) -> Any:
+        started = time.monotonic()
+        stats = self._stats
+        with self._lock:
+            stats.queued -= 1
+            stats.running += 1
+            stats.wait_sum += started - submitted
+            stats.wait_max = max(stats.wait_max, started - submitted)
+        try:
+            result = func()
+        except BaseException:
+            self._finished(started, failed=True)
+            raise
+        self._finished(started, failed=False)
+        return result
+
+    def _finished(self, started: float, failed: bool):
+        duration = time.monotonic() - started
+        stats = self._stats
+        with self._lock:
+            stats.running -= 1
+            if failed:
+                stats.failed += 1
+            else:
+                stats.completed += 1
+            stats.duration_sum += duration
+            stats.duration_max = max(stats.duration_max, duration)
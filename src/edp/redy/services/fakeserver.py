@@ -0,0 +1,259 @@
+"""Fake Redy API server, for offline tests and benchmarks."""
+import asyncio
+import json
+import logging
+import random
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from aiohttp import web
+from dateutil.relativedelta import relativedelta
+from edp.redy.services.cassette import Cassette
+from edp.redy.services.devices.constants import DEVICES_URL
+from edp.redy.services.devices.constants import METERING_URL
+from edp.redy.services.devices.constants import MODULE_URL
+from edp.redy.services.devices.constants import MODULES_URL
+from edp.redy.services.devices.models.modulesmodel import Resolution
+from edp.redy.services.houses.constants import HOUSES_URL
+
+log = logging.getLogger(__name__)
+
+HOUSE_ID = "house"
+INJECTION_DEVICE_ID = "injection-device"
+PRODUCTION_DEVICE_ID = "production-device"
+INJECTION_MODULE_ID = "injection-module"
+PRODUCTION_MODULE_ID = "production-module"
+
+# Date format and step of the metering history, per resolution
+_METERING_STEPS = {
+    Resolution.QuarterHour: ("%Y-%m-%d %H:%M:%S", relativedelta(minutes=15)),
+    Resolution.Hour: ("%Y-%m-%d %H:%M:%S", relativedelta(hours=1)),
+    Resolution.Day: ("%Y-%m-%d", relativedelta(days=1)),
+    Resolution.Month: ("%Y-%m", relativedelta(months=1)),
+}
+
+
+def _house() -> Dict[str, Any]:
+    return {
+        "address": "Rua Fake 1",
+        "houseId": HOUSE_ID,
+        "permissionRole": "OWNER",
+        "name": "Fake house",
+        "houseProfile": "Selfconsumption",
+        "classification": "RESIDENTIAL",
+        "postalCode": "1000-001",
+        "city": "Lisboa",
+        "district": "Lisboa",
+        "country": "PT",
+        "timezone": "Europe/Lisbon",
+        "serviceProvider": "EDP",
+        "status": "ACTIVE",
+        "electricityLocalId": None,
+        "gasLocalId": None,
+        "isSettlementActive": False,
+        "productType": "REDY",
+    }
+
+
+def _device(device_id: str) -> Dict[str, Any]:
+    return {
+        "connectionState": True,
+        "creationDate": "2023-01-01T00:00:00Z",
+        "deviceId": device_id,
+        "deviceLocalId": f"{device_id}-local",
+        "firmwareVersion": "1.0.0",
+        "houseId": HOUSE_ID,
+        "lastCommunication": "2023-01-01T00:00:00Z",
+        "model": "RedyBox",
+        "type": "redybox",
+    }
+
+
+def _module(module_id: str, device_id: str, groups: List[str]) -> Dict[str, Any]:
+    return {
+        "historicVars": {"supported": ["ActiveEnergyConsumed", "ActiveEnergyProduced"]},
+        "model": "Meter",
+        "userAttributes": {},
+        "houseId": HOUSE_ID,
+        "lastCommunication": 0,
+        "moduleId": module_id,
+        "hardwareAttributes": {},
+        "creationDate": "2023-01-01T00:00:00Z",
+        "stateVars": {
+            "supported": ["voltage"],
+            "voltage": {"value": 230, "unit": "V"},
+        },
+        "name": module_id,
+        "vendor": "EDP",
+        "connectivityState": "CONNECTED",
+        "firmwareVersion": "1.0.0",
+        "groups": groups,
+        "deviceId": device_id,
+        "moduleLocalId": f"{module_id}-local",
+        "favorite": False,
+        "legacyModuleLocalId": "",
+        "serialNumber": module_id,
+    }
+
+
+def _metering(resolution: Resolution, start: str, end: str) -> Dict[str, Any]:
+    date_format, step = _METERING_STEPS[resolution]
+    date = datetime.strptime(start, "%Y-%m-%d")
+    last = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)
+    rnd = random.Random(f"{resolution.value}{start}{end}")
+    chart = []
+    while date < last:
+        value = round(rnd.uniform(0, 2), 3)
+        cost = round(value * 0.15, 4)
+        chart.append(
+            {
+                "date": date.strftime(date_format),
+                "value": {"N": value, "D": value},
+                "cost": {"N": cost, "D": cost},
+            }
+        )
+        date += step
+    total = round(sum(item["value"]["N"] for item in chart), 3)
+    total_cost = round(sum(item["cost"]["N"] for item in chart), 4)
+    return {
+        "energyChart": chart,
+        "totals": {
+            "value": {"N": total, "D": total},
+            "cost": {"N": total_cost, "D": total_cost},
+        },
+    }
+
+
+class FakeRedyServer:
+    """Local stand-in for the Redy API.
+
+    The requests recorded in the cassette, if any, are answered with the
+    recorded responses. The others are answered by a synthetic house, with an
+    injection meter, a production meter and random metering. Every response
+    is delayed by the configured latency.
+    """
+
+    def __init__(
+        self,
+        cassette: Optional[Cassette] = None,
+        latency: float = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        """Create a fake server.
+
+        Args:
+            cassette (Optional[Cassette], optional): The recorded responses.
+                Defaults to None.
+            latency (float, optional): Seconds each response is delayed.
+                Defaults to 0.
+            host (str, optional): The address listened. Defaults to
+                "127.0.0.1".
+            port (int, optional): The port listened, 0 for any free port.
+                Defaults to 0.
+        """
+        self._cassette = cassette
+        self.latency = latency
+        self._host = host
+        self._port = port
+        self._runner: Optional[web.AppRunner] = None
+        self.requests = 0
+        self._modules = [
+            _module(
+                INJECTION_MODULE_ID,
+                INJECTION_DEVICE_ID,
+                ["SMART_ENERGY_METER", "CONSUMPTION_METER", "METERING"],
+            ),
+            _module(
+                PRODUCTION_MODULE_ID,
+                PRODUCTION_DEVICE_ID,
+                ["PRODUCTION_METER", "METERING"],
+            ),
+        ]
+
+    @property
+    def url(self) -> str:
+        """Return the base url of the server, to be given to the ApiService."""
+        assert self._runner, "Server not started"
+        host, port = self._runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    async def start(self) -> str:
+        """Start listening.
+
+        Returns:
+            str: The base url of the server
+        """
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get(HOUSES_URL, self._houses)
+        app.router.add_get(DEVICES_URL, self._devices)
+        app.router.add_get(MODULES_URL, self._modules_list)
+        app.router.add_get(MODULE_URL, self._module)
+        app.router.add_get(METERING_URL, self._metering)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+        log.debug(f"Fake server listening on {self.url}")
+        return self.url
+
+    async def stop(self):
+        """Stop listening."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeRedyServer":
+        """Start the server."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        """Stop the server."""
+        await self.stop()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._cassette is not None:
+            interaction = self._cassette.find(request.path, dict(request.query))
+            if interaction is not None:
+                return web.Response(
+                    status=interaction.status,
+                    reason=interaction.reason,
+                    headers=interaction.headers,
+                    text=interaction.body,
+                )
+        return await handler(request)
+
+    async def _houses(self, request: web.Request) -> web.Response:
+        return web.json_response({"houses": [_house()]})
+
+    async def _devices(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            [_device(INJECTION_DEVICE_ID), _device(PRODUCTION_DEVICE_ID)]
+        )
+
+    async def _modules_list(self, request: web.Request) -> web.Response:
+        modules = self._modules
+        if "groupsorfilter" in request.query:
+            groups = set(json.loads(request.query["groupsorfilter"]))
+            modules = [m for m in modules if groups.intersection(m["groups"])]
+        return web.json_response({"Modules": modules})
+
+    async def _module(self, request: web.Request) -> web.Response:
+        for module in self._modules:
+            if module["moduleId"] == request.match_info["module_id"]:
+                return web.json_response(module)
+        raise web.HTTPNotFound()
+
+    async def _metering(self, request: web.Request) -> web.Response:
+        query = request.query
+        return web.json_response(
+            _metering(Resolution(query["resolution"]), query["start"], query["end"])
+        )
@@ -0,0 +1,223 @@
+"""Ingest module, bounding the stream messages waiting to be dispatched."""
+import asyncio
+import collections
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+# Default maximum stream messages waiting to be dispatched
+INGEST_QUEUE_SIZE = 1000
+
+
+class OverflowPolicy(str, Enum):
+    """What is done with a message received while the queue is full.
+
+    Block: The receiving thread waits for a free slot, pushing the
+        backpressure to the MQTT connection
+    DropOldest: The oldest waiting message is dropped
+    DropNewest: The received message is dropped
+    Conflate: The notifications of a module still waiting are merged, keeping
+        the latest value of every variable. Other messages received while
+        full are dropped
+    """
+
+    Block = "block"
+    DropOldest = "drop_oldest"
+    DropNewest = "drop_newest"
+    Conflate = "conflate"
+
+
+@dataclass
+class StreamMessage:
+    """Stream message dataclass.
+
+    Attributes:
+        topic (str): The topic the message was received from
+        message_type (Optional[str]): "notification" or "response"
+        operation_type (Optional[str]): The type of operation
+        data (Dict[str, Any]): The data, a single module for the
+            notifications
+        success (Optional[bool]): Whether a response is a success
+        received (float): Monotonic time the message was received at
+        timestamp (float): Timestamp the message was received at
+    """
+
+    topic: str
+    message_type: Optional[str]
+    operation_type: Optional[str]
+    data: Dict[str, Any]
+    success: Optional[bool] = None
+    received: float = 0
+    timestamp: float = 0
+
+
+@dataclass
+class IngestStats:
+    """Ingest queue statistics dataclass.
+
+    Attributes:
+        policy (OverflowPolicy): The overflow policy
+        maxsize (int): Maximum messages waiting
+        depth (int): Messages waiting
+        max_depth (int): Most messages ever waiting
+        received (int): Messages received
+        dispatched (int): Messages taken from the queue
+        dropped (int): Messages dropped while full
+        conflated (int): Variable values replaced by a newer one
+        lag_sum (float): Seconds all the dispatched messages waited
+        lag_max (float): Longest wait of a message, in seconds
+    """
+
+    policy: OverflowPolicy
+    maxsize: int
+    depth: int = 0
+    max_depth: int = 0
+    received: int = 0
+    dispatched: int = 0
+    dropped: int = 0
+    conflated: int = 0
+    lag_sum: float = 0
+    lag_max: float = 0
+
+    @property
+    def lag_mean(self) -> float:
+        """Return the mean wait of the dispatched messages, in seconds."""
+        return self.lag_sum / self.dispatched if self.dispatched else 0
+
+
+class IngestQueue:
+    """Bounded queue of stream messages, fed from any thread.
+
+    The messages are put from the awscrt threads and taken from the loop
+    the queue was created in. Apart from blocking the putting thread, the
+    queue is only ever changed from that loop.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = INGEST_QUEUE_SIZE,
+        policy: OverflowPolicy = OverflowPolicy.DropOldest,
+    ) -> None:
+        """Create an ingest queue, in the running loop.
+
+        Args:
+            maxsize (int, optional): Maximum messages waiting. Defaults to
+                INGEST_QUEUE_SIZE.
+            policy (OverflowPolicy, optional): What is done with the messages
+                received while full. Defaults to OverflowPolicy.DropOldest.
+        """
+        if maxsize < 1:
+            raise ValueError("The ingest queue size must be positive")
+        self._loop = asyncio.get_running_loop()
+        self._maxsize = maxsize
+        self._policy = OverflowPolicy(policy)
+        self._items: Deque[StreamMessage] = collections.deque()
+        # Notifications still waiting, per module, when conflating
+        self._pending: Dict[Any, StreamMessage] = {}
+        self._waiter: Optional[asyncio.Future] = None
+        self._stats = IngestStats(policy=self._policy, maxsize=maxsize)
+        # Slots taken by the blocked policy, counted across threads
+        self._slots = threading.Condition()
+        self._used_slots = 0
+        self._closed = False
+
+    def stats(self) -> IngestStats:
+        """Return a copy of the queue statistics."""
+        return IngestStats(**vars(self._stats))
+
+    def put_threadsafe(self, message: StreamMessage):
+        """Put a message from another thread than the loop one.
+
+        With the block policy, waits while the queue is full.
+        """
+        if self._policy is OverflowPolicy.Block:
+            with self._slots:
+                while self._used_slots >= self._maxsize and not self._closed:
+                    self._slots.wait()
+                self._used_slots += 1
+        if self._closed:
+            return
+        self._loop.call_soon_threadsafe(self.put_nowait, message)
+
+    def put_nowait(self, message: StreamMessage):
+        """Put a message, from the loop thread."""
+        stats = self._stats
+        stats.received += 1
+        if self._closed:
+            return
+
+        key = None
+        if self._policy is OverflowPolicy.Conflate:
+            key = self._conflation_key(message)
+            pending = self._pending.get(key) if key is not None else None
+            if pending is not None:
+                variables = pending.data["stateVariables"]
+                new_variables = message.data["stateVariables"]
+                stats.conflated += len(variables.keys() & new_variables.keys())
+                variables.update(new_variables)
+                return
+
+        if len(self._items) >= self._maxsize:
+            if self._policy is OverflowPolicy.DropOldest:
+                self._items.popleft()
+                stats.dropped += 1
+            elif self._policy is not OverflowPolicy.Block:
+                stats.dropped += 1
+                return
+
+        self._items.append(message)
+        if key is not None:
+            self._pending[key] = message
+        stats.depth = len(self._items)
+        stats.max_depth = max(stats.max_depth, stats.depth)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def get(self) -> StreamMessage:
+        """Wait for the oldest message, and take it."""
+        while not self._items:
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+        message = self._items.popleft()
+        if self._pending:
+            key = self._conflation_key(message)
+            if self._pending.get(key) is message:
+                del self._pending[key]
+        if self._policy is OverflowPolicy.Block:
+            with self._slots:
+                self._used_slots -= 1
+                self._slots.notify()
+
+        stats = self._stats
+        lag = time.monotonic() - message.received
+        stats.depth = len(self._items)
+        stats.dispatched += 1
+        stats.lag_sum += lag
+        stats.lag_max = max(stats.lag_max, lag)
+        return message
+
+    def close(self):
+        """Drop the messages put from now on, and release the blocked threads."""
+        self._closed = True
+        with self._slots:
+            self._slots.notify_all()
+
+    @staticmethod
+    def _conflation_key(message: StreamMessage) -> Any:
+        if message.message_type != "notification":
+            return None
+        if not isinstance(message.data.get("stateVariables"), dict):
+            return None
+        return (message.topic, message.operation_type, message.data.get("localId"))
@@ -0,0 +1,89 @@
+"""JSON backend module."""
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Union
+
+log = logging.getLogger(__name__)
+
+# Backends tried, in order, when none is specified
+PREFERRED_BACKENDS = ("orjson", "ujson", "json")
+
+
+@dataclass(frozen=True)
+class JsonBackend:
+    """JSON backend dataclass.
+
+    Attributes:
+        name (str): The name of the backend
+        loads (Callable[[Union[bytes, str]], Any]): Parses a JSON document,
+            given as bytes or str
+        dumps (Callable[[Any], str]): Serializes an object into a JSON string
+    """
+
+    name: str
+    loads: Callable[[Union[bytes, str]], Any]
+    dumps: Callable[[Any], str]
+
+
+def _json() -> JsonBackend:
+    return JsonBackend(name="json", loads=json.loads, dumps=json.dumps)
+
+
+def _orjson() -> JsonBackend:
+    import orjson
+
+    return JsonBackend(
+        name="orjson",
+        loads=orjson.loads,
+        dumps=lambda obj: orjson.dumps(obj).decode(),
+    )
+
+
+def _ujson() -> JsonBackend:
+    import ujson
+
+    return JsonBackend(name="ujson", loads=ujson.loads, dumps=ujson.dumps)
+
+
+_BACKENDS: Dict[str, Callable[[], JsonBackend]] = {
+    "json": _json,
+    "orjson": _orjson,
+    "ujson": _ujson,
+}
+
+
+def get_json_backend(name: Optional[str] = None) -> JsonBackend:
+    """Get a JSON backend.
+
+    Args:
+        name (Optional[str], optional): One of 'orjson', 'ujson' or 'json'.
+            Defaults to None, selecting the fastest one installed.
+
+    Raises:
+        ValueError: If the backend is unknown
+        ImportError: If the backend requested isn't installed
+
+    Returns:
+        JsonBackend: The JSON backend
+    """
+    if name is not None:
+        if name not in _BACKENDS:
+            raise ValueError(
+                f"JSON backend '{name}' is not supported. "
+                f"Only {list(_BACKENDS)} are supported"
+            )
+        return _BACKENDS[name]()
+
+    for candidate in PREFERRED_BACKENDS:
+        try:
+            backend = _BACKENDS[candidate]()
+        except ImportError:
+            continue
+        log.debug(f"Using the '{backend.name}' JSON backend")
+        return backend
+    return _json()
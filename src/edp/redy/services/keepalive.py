@@ -0,0 +1,172 @@
+"""Keepalive module, renewing the realtime requests of the stream devices."""
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import random
+import time
+from asyncio import Task
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+log = logging.getLogger(__name__)
+
+# Seconds the devices are asked to stream their realtime data for
+REALTIME_TIMEOUT = 60
+# Seconds before the realtime timeout the request is renewed
+KEEPALIVE_MARGIN = 5
+# Fraction of the renewal period randomly taken off each deadline, so that
+# the devices added together drift apart
+KEEPALIVE_JITTER = 0.1
+
+RealtimeRequest = Callable[[str, float], Awaitable[None]]
+
+
+class KeepaliveScheduler:
+    """Renews the realtime requests of many devices from a single task.
+
+    The next deadline of every device is kept in a min-heap, and the task
+    sleeps until the earliest one. Each renewal is scheduled timeout -
+    margin seconds later, but at least half the timeout, minus a random
+    jitter. Changing the timeout of a device renews its request right away.
+    """
+
+    def __init__(
+        self,
+        request: RealtimeRequest,
+        margin: float = KEEPALIVE_MARGIN,
+        jitter: float = KEEPALIVE_JITTER,
+    ) -> None:
+        """Create a keepalive scheduler.
+
+        Args:
+            request (RealtimeRequest): Sends the realtime request of a device,
+                given its id and the timeout
+            margin (float, optional): Seconds before the timeout the request
+                is renewed. Defaults to KEEPALIVE_MARGIN.
+            jitter (float, optional): Fraction of the renewal period randomly
+                taken off each deadline. Defaults to KEEPALIVE_JITTER.
+        """
+        self._request = request
+        self._margin = margin
+        self._jitter = jitter
+        # Entries are never removed from the heap, those whose sequence isn't
+        # the device one anymore are skipped
+        self._heap: List[Tuple[float, int, str]] = []
+        self._sequences: Dict[str, int] = {}
+        self._counter = itertools.count()
+        self._timeouts: Dict[str, float] = {}
+        self._task: Optional[Task] = None
+        self._requests: Set[Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        """Indicate whether the scheduler is started."""
+        return self._task is not None
+
+    @property
+    def devices(self) -> List[str]:
+        """Return the ids of the scheduled devices."""
+        return list(self._timeouts)
+
+    def add(self, device_id: str, timeout: float = REALTIME_TIMEOUT):
+        """Schedule the requests of a device, starting now.
+
+        Raises:
+            ValueError: If the timeout isn't positive
+        """
+        if timeout <= 0:
+            raise ValueError("The realtime timeout must be positive")
+        self._timeouts[device_id] = timeout
+        self._schedule(device_id, time.monotonic())
+
+    def remove(self, device_id: str):
+        """Stop renewing the requests of a device."""
+        self._timeouts.pop(device_id, None)
+        self._sequences.pop(device_id, None)
+
+    def set_timeout(self, device_id: str, timeout: float):
+        """Change the timeout of a device, and renew its request right away.
+
+        Raises:
+            KeyError: If the device isn't scheduled
+            ValueError: If the timeout isn't positive
+        """
+        if self._timeouts[device_id] != timeout:
+            self.add(device_id, timeout)
+
+    def start(self):
+        """Start sending the requests."""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop sending the requests, and forget the devices."""
+        tasks = list(self._requests)
+        if self._task is not None:
+            tasks.append(self._task)
+        self._task = None
+        self._requests.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._heap.clear()
+        self._sequences.clear()
+        self._timeouts.clear()
+
+    def _schedule(self, device_id: str, deadline: float):
+        sequence = next(self._counter)
+        self._sequences[device_id] = sequence
+        heapq.heappush(self._heap, (deadline, sequence, device_id))
+        if self._wakeup is not None and self._heap[0][1] == sequence:
+            self._wakeup.set()
+
+    def _next_deadline(self, timeout: float) -> float:
+        # A timeout shorter than the margin still leaves time between renewals
+        period = max(timeout / 2, timeout - self._margin)
+        return time.monotonic() + period - random.uniform(0, period * self._jitter)
+
+    async def _run(self):
+        assert self._wakeup is not None
+        heap = self._heap
+        while True:
+            while heap and self._sequences.get(heap[0][2]) != heap[0][1]:
+                heapq.heappop(heap)
+            delay = heap[0][0] - time.monotonic() if heap else None
+            if delay is None or delay > 0:
+                self._wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                continue
+
+            now = time.monotonic()
+            due = []
+            while heap and heap[0][0] <= now:
+                _, sequence, device_id = heapq.heappop(heap)
+                if self._sequences.get(device_id) == sequence:
+                    due.append(device_id)
+            for device_id in due:
+                timeout = self._timeouts[device_id]
+                self._schedule(device_id, self._next_deadline(timeout))
+                # Sent concurrently, so a slow acknowledgement doesn't delay
+                # the other devices
+                task = asyncio.create_task(self._send(device_id, timeout))
+                self._requests.add(task)
+                task.add_done_callback(self._requests.discard)
+            # The requests, and the rest of the loop, run before the next ones
+            await asyncio.sleep(0)
+
+    async def _send(self, device_id: str, timeout: float):
+        log.debug(f"Keeping connection alive for {device_id}")
+        try:
+            await self._request(device_id, timeout)
+        except Exception:
+            log.exception(f"Realtime request of {device_id} failed")
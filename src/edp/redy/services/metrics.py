@@ -0,0 +1,256 @@
+"""API metrics module."""
+import logging
+from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import replace
+from enum import Enum
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from edp.redy.services.devices import constants as devices
+from edp.redy.services.endpoint import EndpointMatcher
+from edp.redy.services.energy import constants as energy
+from edp.redy.services.houses import constants as houses
+from edp.redy.services.statevars import constants as statevars
+
+log = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    float("inf"),
+)
+
+# Key of the requests whose url doesn't match any known template
+OTHER_ENDPOINT = "other"
+
+DEFAULT_TEMPLATES: Tuple[str, ...] = (
+    houses.HOUSES_URL,
+    houses.HOUSE_URL,
+    houses.TARIFF_URL,
+    houses.CONTRACTED_POWER_URL,
+    devices.DEVICES_URL,
+    devices.MODULES_URL,
+    devices.MODULE_URL,
+    devices.INTERFACE_DATA_URL,
+    devices.METERING_URL,
+    devices.COST_PER_KWH_URL,
+    energy.PREDICTION_TOTAL_URL,
+    energy.PREDICTION_GRAPH_URL,
+    energy.POWER_URL,
+    energy.POWER_TOTALS_URL,
+    statevars.STATE_VARS_URL,
+)
+
+
+class EventType(str, Enum):
+    """Request event types."""
+
+    Response = "response"
+    Error = "error"
+    Retry = "retry"
+    AuthRefresh = "auth_refresh"
+
+
+@dataclass
+class RequestEvent:
+    """Request event dataclass, given to the hooks.
+
+    Attributes:
+        type (EventType): The type of event
+        endpoint (str): The url template of the request
+        url (str): The expanded url of the request
+        status (Optional[int]): The response status, if any
+        latency (float): Seconds the attempt took, if finished
+        bytes (int): Bytes received
+        error (Optional[Exception]): The error of the attempt, if any
+    """
+
+    type: EventType
+    endpoint: str
+    url: str
+    status: Optional[int] = None
+    latency: float = 0
+    bytes: int = 0
+    error: Optional[Exception] = None
+
+
+RequestHook = Callable[[RequestEvent], None]
+
+
+@dataclass
+class EndpointStats:
+    """Endpoint statistics dataclass.
+
+    Attributes:
+        requests (int): Attempts that got a response or failed
+        errors (int): Attempts that failed, with or without a response
+        retries (int): Attempts retried
+        auth_refreshes (int): Token renewals after a rejected request
+        bytes_received (int): Body bytes received
+        latency_sum (float): Seconds spent in all the attempts
+        latency_max (float): Slowest attempt, in seconds
+        latency_buckets (List[int]): Attempts per LATENCY_BUCKETS bucket
+    """
+
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    auth_refreshes: int = 0
+    bytes_received: int = 0
+    latency_sum: float = 0
+    latency_max: float = 0
+    latency_buckets: List[int] = field(
+        default_factory=lambda: [0] * len(LATENCY_BUCKETS)
+    )
+
+    @property
+    def latency_mean(self) -> float:
+        """Return the mean latency, in seconds."""
+        return self.latency_sum / self.requests if self.requests else 0
+
+    def latency_quantile(self, quantile: float) -> float:
+        """Estimate a latency quantile, e.g. 0.99, from the histogram.
+
+        Returns:
+            float: The upper bound of the bucket holding the quantile, capped
+                at the slowest attempt
+        """
+        target = quantile * self.requests
+        count = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, self.latency_buckets):
+            count += bucket
+            if count >= target and count:
+                return min(bound, self.latency_max)
+        return self.latency_max
+
+
+class ApiMetrics:
+    """Collects the per endpoint metrics of the API requests."""
+
+    def __init__(self, templates: Iterable[str] = DEFAULT_TEMPLATES) -> None:
+        """Create an API metrics object.
+
+        Args:
+            templates (Iterable[str], optional): The url templates the
+                requests are grouped by. Defaults to DEFAULT_TEMPLATES.
+        """
+        self._matcher = EndpointMatcher(templates)
+        self._endpoints: Dict[str, EndpointStats] = {}
+        self._hooks: List[RequestHook] = []
+
+    def add_hook(self, hook: RequestHook):
+        """Register a callback, called with every request event."""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: RequestHook):
+        """Unregister a callback."""
+        self._hooks.remove(hook)
+
+    def record_response(
+        self,
+        url: str,
+        status: int,
+        latency: float,
+        size: int,
+        error: Optional[Exception] = None,
+    ):
+        """Record an attempt that got a response."""
+        endpoint, stats = self._observe(url, latency)
+        stats.bytes_received += size
+        if error is not None:
+            stats.errors += 1
+        if self._hooks:
+            self._emit(
+                RequestEvent(
+                    type=EventType.Response if error is None else EventType.Error,
+                    endpoint=endpoint,
+                    url=url,
+                    status=status,
+                    latency=latency,
+                    bytes=size,
+                    error=error,
+                )
+            )
+
+    def record_error(self, url: str, latency: float, error: Exception):
+        """Record an attempt that failed without a response."""
+        endpoint, stats = self._observe(url, latency)
+        stats.errors += 1
+        if self._hooks:
+            self._emit(
+                RequestEvent(
+                    type=EventType.Error,
+                    endpoint=endpoint,
+                    url=url,
+                    latency=latency,
+                    error=error,
+                )
+            )
+
+    def record_retry(self, url: str, error: Exception):
+        """Record an attempt being retried."""
+        endpoint, stats = self._stats(url)
+        stats.retries += 1
+        if self._hooks:
+            self._emit(
+                RequestEvent(
+                    type=EventType.Retry, endpoint=endpoint, url=url, error=error
+                )
+            )
+
+    def record_auth_refresh(self, url: str, error: Exception):
+        """Record a token renewal, after the request was rejected."""
+        endpoint, stats = self._stats(url)
+        stats.auth_refreshes += 1
+        if self._hooks:
+            self._emit(
+                RequestEvent(
+                    type=EventType.AuthRefresh, endpoint=endpoint, url=url, error=error
+                )
+            )
+
+    def snapshot(self) -> Dict[str, EndpointStats]:
+        """Return a copy of the statistics, keyed by url template."""
+        return {
+            endpoint: replace(stats, latency_buckets=list(stats.latency_buckets))
+            for endpoint, stats in self._endpoints.items()
+        }
+
+    def _stats(self, url: str) -> Tuple[str, EndpointStats]:
+        endpoint = self._matcher.resolve(url)[0] or OTHER_ENDPOINT
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = EndpointStats()
+        return endpoint, stats
+
+    def _observe(self, url: str, latency: float) -> Tuple[str, EndpointStats]:
+        endpoint, stats = self._stats(url)
+        stats.requests += 1
+        stats.latency_sum += latency
+        if latency > stats.latency_max:
+            stats.latency_max = latency
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                stats.latency_buckets[index] += 1
+                break
+        return endpoint, stats
+
+    def _emit(self, event: RequestEvent):
+        for hook in self._hooks:
+            try:
+                hook(event)
+            except Exception:
+                log.exception("Request hook failed")
@@ -0,0 +1,191 @@
+"""Rate limit module."""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+# Status codes returned by the API when it's throttling the requests
+THROTTLE_STATUSES = (429, 503)
+
+
+@dataclass
+class RateLimitConfig:
+    """Rate limit configuration.
+
+    Attributes:
+        rate (float): Maximum requests per second
+        burst (int): Maximum requests sent at once after an idle period
+        max_concurrency (int): Maximum requests in flight
+        min_rate (float): The rate is never reduced below this value
+        decrease_factor (float): Factor applied to the rate when throttled
+        increase_step (float): Requests per second regained on each success
+        default_retry_after (float): Seconds to pause when throttled without
+            a Retry-After header
+    """
+
+    rate: float = 10
+    burst: int = 10
+    max_concurrency: int = 8
+    min_rate: float = 0.5
+    decrease_factor: float = 0.5
+    increase_step: float = 0.25
+    default_retry_after: float = 1
+
+
+@dataclass
+class RateLimitStats:
+    """Rate limit statistics dataclass."""
+
+    rate: float
+    in_flight: int
+    throttled: int
+    delayed: int
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header value.
+
+    Args:
+        value (Optional[str]): Delay in seconds, or an HTTP date
+
+    Returns:
+        Optional[float]: Seconds to wait, or None if missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter:
+    """Token bucket rate limiter with a concurrency cap.
+
+    The rate is reduced multiplicatively whenever the API throttles the
+    requests, and recovered additively with every successful request
+    (AIMD), so that large batches run close to the maximum accepted rate.
+
+    Usage::
+
+        async with limiter:
+            ...  # Send the request
+    """
+
+    def __init__(self, config: Optional[RateLimitConfig] = None) -> None:
+        """Create an adaptive rate limiter.
+
+        Args:
+            config (Optional[RateLimitConfig], optional): The limiter
+                configuration. Defaults to RateLimitConfig().
+        """
+        self._config = config or RateLimitConfig()
+        self._rate = self._config.rate
+        self._tokens = float(self._config.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(self._config.max_concurrency)
+        self._in_flight = 0
+        self._throttled = 0
+        self._delayed = 0
+
+    @property
+    def rate(self) -> float:
+        """Return the current allowed requests per second."""
+        return self._rate
+
+    async def acquire(self):
+        """Wait for a request slot and a token."""
+        await self._semaphore.acquire()
+        try:
+            await self._take_token()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self._in_flight += 1
+
+    def release(self):
+        """Release the request slot."""
+        self._in_flight -= 1
+        self._semaphore.release()
+
+    async def __aenter__(self) -> "AdaptiveRateLimiter":
+        """Acquire a request slot."""
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *args):
+        """Release the request slot."""
+        self.release()
+
+    def on_success(self):
+        """Recover the rate after a successful request."""
+        if self._rate < self._config.rate:
+            self._rate = min(self._config.rate, self._rate + self._config.increase_step)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        """Slow down after the API throttled a request.
+
+        Args:
+            retry_after (Optional[float], optional): Seconds the API asked to
+                wait. Defaults to the configured default_retry_after.
+        """
+        self._throttled += 1
+        self._rate = max(
+            self._config.min_rate, self._rate * self._config.decrease_factor
+        )
+        if retry_after is None:
+            retry_after = self._config.default_retry_after
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        # Don't allow a burst right after the pause
+        self._tokens = min(self._tokens, 1.0)
+        log.warning(
+            f"Requests throttled: pausing {retry_after:.1f}s, "
+            f"rate reduced to {self._rate:.2f} req/s"
+        )
+
+    def stats(self) -> RateLimitStats:
+        """Return a snapshot of the rate limit statistics."""
+        return RateLimitStats(
+            rate=self._rate,
+            in_flight=self._in_flight,
+            throttled=self._throttled,
+            delayed=self._delayed,
+        )
+
+    async def _take_token(self):
+        # The lock keeps the waiters in order
+        async with self._lock:
+            delayed = False
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    float(self._config.burst),
+                    self._tokens + (now - self._updated) * self._rate,
+                )
+                self._updated = now
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                else:
+                    wait = (1 - self._tokens) / self._rate
+                delayed = True
+                await asyncio.sleep(wait)
+            if delayed:
+                self._delayed += 1
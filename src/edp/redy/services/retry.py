@@ -0,0 +1,143 @@
+"""Retry module."""
+import logging
+import random
+import time
+from dataclasses import dataclass
+from enum import Enum
+
+log = logging.getLogger(__name__)
+
+
+class ErrorKind(str, Enum):
+    """Request error kinds."""
+
+    # Network errors, timeouts and server errors: retried with backoff
+    Transient = "transient"
+    # The API is throttling the requests: retried after the requested delay
+    Throttled = "throttled"
+    # The tokens were rejected: retried once after renewing them
+    Auth = "auth"
+    # Any other error: never retried
+    Permanent = "permanent"
+
+
+@dataclass
+class RetryPolicy:
+    """Retry policy, with exponential backoff and jitter.
+
+    Attributes:
+        max_attempts (int): Maximum attempts per request, including the first
+        base_delay (float): Seconds to wait before the first retry
+        max_delay (float): Maximum seconds to wait between attempts
+        jitter (float): Fraction of the delay that is randomized, from 0 (no
+            jitter) to 1 (full jitter)
+    """
+
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 30
+    jitter: float = 1
+
+    def should_retry(self, kind: ErrorKind, attempt: int) -> bool:
+        """Return whether a failed attempt is retried.
+
+        Args:
+            kind (ErrorKind): The kind of error of the attempt
+            attempt (int): The number of the failed attempt, starting at 1
+        """
+        return (
+            kind in (ErrorKind.Transient, ErrorKind.Throttled)
+            and attempt < self.max_attempts
+        )
+
+    def delay(self, attempt: int) -> float:
+        """Return the seconds to wait after a failed attempt.
+
+        Args:
+            attempt (int): The number of the failed attempt, starting at 1
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+
+class CircuitState(str, Enum):
+    """Circuit breaker states."""
+
+    Closed = "closed"
+    Open = "open"
+    HalfOpen = "half-open"
+
+
+class CircuitBreaker:
+    """Circuit breaker.
+
+    After failure_threshold consecutive transient or server failures the
+    circuit opens and requests fail fast. Once reset_timeout elapses, a
+    single probe request is let through: the circuit closes if it succeeds,
+    and opens again otherwise.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30) -> None:
+        """Create a circuit breaker.
+
+        Args:
+            failure_threshold (int, optional): Consecutive failures opening
+                the circuit. Defaults to 5.
+            reset_timeout (float, optional): Seconds the circuit stays open
+                before probing the backend. Defaults to 30.
+        """
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._state = CircuitState.Closed
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> CircuitState:
+        """Return the circuit state."""
+        if (
+            self._state == CircuitState.Open
+            and time.monotonic() - self._opened_at >= self._reset_timeout
+        ):
+            return CircuitState.HalfOpen
+        return self._state
+
+    def allow(self) -> bool:
+        """Return whether a request may be sent."""
+        state = self.state
+        if state == CircuitState.Closed:
+            return True
+        if state == CircuitState.HalfOpen and not self._probing:
+            self._state = CircuitState.HalfOpen
+            self._probing = True
+            return True
+        return False
+
+    def on_success(self):
+        """Record a request that reached the backend."""
+        if self._state != CircuitState.Closed:
+            log.info("Circuit closed")
+        self._state = CircuitState.Closed
+        self._failures = 0
+        self._probing = False
+
+    def release_probe(self):
+        """Let another probe through, the previous one having been aborted.
+
+        Does nothing once the probe was recorded as a success or a failure.
+        """
+        self._probing = False
+
+    def on_failure(self):
+        """Record a request that failed with a transient or server error."""
+        self._failures += 1
+        if (
+            self._state == CircuitState.HalfOpen
+            or self._failures >= self._failure_threshold
+        ):
+            if self._state != CircuitState.Open:
+                log.warning(f"Circuit opened after {self._failures} failures")
+            self._state = CircuitState.Open
+            self._opened_at = time.monotonic()
+            self._probing = False
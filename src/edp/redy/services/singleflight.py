@@ -0,0 +1,89 @@
+"""Single-flight module."""
+import asyncio
+from dataclasses import dataclass
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+
+
+@dataclass
+class SingleFlightStats:
+    """Single-flight statistics dataclass.
+
+    Attributes:
+        executed (int): Calls that were actually executed
+        collapsed (int): Calls that joined an identical in-flight call
+        in_flight (int): Calls currently being executed
+    """
+
+    executed: int = 0
+    collapsed: int = 0
+    in_flight: int = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into a single call.
+
+    Every caller gets the same result (or exception). Cancelling one of the
+    callers doesn't cancel the shared call while other callers wait for it,
+    the call is only cancelled once all of its callers are.
+    """
+
+    def __init__(self) -> None:
+        """Create a single-flight object."""
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        # The callers waiting for each call
+        self._waiters: Dict["asyncio.Future[Any]", int] = {}
+        self._executed = 0
+        self._collapsed = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Execute the call, or join the in-flight call with the same key.
+
+        Args:
+            key (Hashable): The key identifying identical calls
+            func (Callable[[], Awaitable[Any]]): The call to execute
+
+        Returns:
+            Any: The result of the call
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(func())
+            self._calls[key] = call
+            self._executed += 1
+            call.add_done_callback(lambda done: self._done(key, done))
+        else:
+            self._collapsed += 1
+        self._waiters[call] = self._waiters.get(call, 0) + 1
+        try:
+            return await asyncio.shield(call)
+        finally:
+            self._leave(key, call)
+
+    def stats(self) -> SingleFlightStats:
+        """Return a snapshot of the single-flight statistics."""
+        return SingleFlightStats(
+            executed=self._executed,
+            collapsed=self._collapsed,
+            in_flight=len(self._calls),
+        )
+
+    def _leave(self, key: Hashable, call: "asyncio.Future[Any]"):
+        waiters = self._waiters.pop(call) - 1
+        if waiters:
+            self._waiters[call] = waiters
+        elif not call.done():
+            # Every caller was cancelled, so nobody needs the result anymore
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            call.cancel()
+
+    def _done(self, key: Hashable, call: "asyncio.Future[Any]"):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Retrieve the exception, in case every caller was cancelled
+        if not call.cancelled():
+            call.exception()
@@ -1,24 +1,59 @@
 """Stream module."""
 import asyncio
+import contextlib
 import json
 import logging
+import time
 from asyncio import Task
 from dataclasses import dataclass
 from enum import Enum
 from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
 from typing import Callable
+from typing import Collection
 from typing import Dict
 from typing import List
 from typing import Optional
 from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import Union
 
-from awscrt import mqtt
 from edp.redy.services.auth import AuthService
-from edp.redy.services.wsmqtt import WebSocketMqtt
+from edp.redy.services.ingest import INGEST_QUEUE_SIZE
+from edp.redy.services.ingest import IngestQueue
+from edp.redy.services.ingest import IngestStats
+from edp.redy.services.ingest import OverflowPolicy
+from edp.redy.services.ingest import StreamMessage
+from edp.redy.services.jsonbackend import get_json_backend
+from edp.redy.services.jsonbackend import JsonBackend
+from edp.redy.services.keepalive import KeepaliveScheduler
+from edp.redy.services.keepalive import REALTIME_TIMEOUT
+from edp.redy.services.retry import RetryPolicy
+from edp.redy.services.updates import StreamUpdate
+from edp.redy.services.updates import UpdateBuffer
+from edp.redy.services.updates import UpdateFilter
+from edp.redy.services.updates import UPDATES_BUFFER_SIZE
 from typing_extensions import Protocol
 
+if TYPE_CHECKING:
+    # awscrt is only imported once the stream starts, as it is slow to import
+    from awscrt import mqtt
+    from edp.redy.services.streampool import StreamPool
+
 log = logging.getLogger(__name__)
 
+# Seconds an interrupted connection is given to resume, before being rebuilt
+RECONNECT_GRACE = 10
+# Seconds waited before the second attempt to rebuild the connection, doubled
+# after every failed attempt, up to the maximum
+RECONNECT_BASE_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+# Maximum subscriptions waiting for their acknowledgement
+SUBSCRIBE_CONCURRENCY = 8
+# Seconds waited for a connection to disconnect
+DISCONNECT_TIMEOUT = 5
+
 
 class DeviceType(str, Enum):
     """Device Types."""
@@ -29,10 +64,18 @@ class DeviceType(str, Enum):
 
 @dataclass
 class StreamDevice:
-    """Stream Device class."""
+    """Stream Device class.
+
+    Attributes:
+        localId (str): The device local id
+        type (DeviceType): The device type
+        timeout (float): Seconds the device is asked to stream its realtime
+            data for, the request being renewed before
+    """
 
     localId: str
     type: DeviceType
+    timeout: float = REALTIME_TIMEOUT
 
 
 DEVICE_ITEMS = {DeviceType.REDYBOX: "rb", DeviceType.WIFI: "wifi"}
@@ -49,7 +92,7 @@ class StreamCallback(Protocol):
     """The stream callback protocol."""
 
     def __call__(
-        self, topic: str, payload: str, dup: bool, qos: mqtt.QoS, retain: bool
+        self, topic: str, payload: str, dup: bool, qos: "mqtt.QoS", retain: bool
     ):
         """Call.
 
@@ -63,21 +106,88 @@ class StreamCallback(Protocol):
         ...
 
 
+@dataclass
+class ConnectionStats:
+    """Stream connection statistics dataclass.
+
+    Attributes:
+        connected (bool): Whether the connection is up
+        interruptions (int): Times the connection was lost
+        resumed (int): Times the connection resumed by itself
+        reconnects (int): Times the connection was rebuilt
+        failed_reconnects (int): Attempts to rebuild the connection that
+            failed
+        downtime_sum (float): Seconds the connection was down, interruptions
+            in progress excluded
+        downtime_max (float): Longest interruption, in seconds
+    """
+
+    connected: bool = False
+    interruptions: int = 0
+    resumed: int = 0
+    reconnects: int = 0
+    failed_reconnects: int = 0
+    downtime_sum: float = 0
+    downtime_max: float = 0
+
+
 class Stream:
-    """The stream class."""
+    """The stream class.
+
+    Once started, the connection is supervised: when it is interrupted and
+    doesn't resume by itself within the reconnect grace period, it is
+    rebuilt with renewed credentials, with exponential backoff between the
+    failed attempts. The device topics are subscribed again, and the realtime
+    keepalive restarted.
+    """
 
-    def __init__(self, auth: AuthService) -> None:
+    def __init__(
+        self,
+        auth: AuthService,
+        reconnect_policy: Optional[RetryPolicy] = None,
+        reconnect_grace: float = RECONNECT_GRACE,
+        subscribe_concurrency: int = SUBSCRIBE_CONCURRENCY,
+        wildcard_topics: bool = False,
+    ) -> None:
         """Create a new stream object.
 
         Args:
             auth (AuthService): The auth service
+            reconnect_policy (Optional[RetryPolicy], optional): The backoff
+                between the attempts to rebuild the connection, its
+                max_attempts is ignored. Defaults to
+                RetryPolicy(RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY).
+            reconnect_grace (float, optional): Seconds an interrupted
+                connection is given to resume, before being rebuilt. Defaults
+                to RECONNECT_GRACE.
+            subscribe_concurrency (int, optional): Maximum subscriptions
+                waiting for their acknowledgement. Defaults to
+                SUBSCRIBE_CONCURRENCY.
+            wildcard_topics (bool, optional): Subscribe a single wildcard
+                topic, wifi/{id}/fromDev/#, per device instead of one per
+                message kind. Defaults to False.
         """
-        self._qos = mqtt.QoS.AT_LEAST_ONCE
         self._auth = auth
-        self._con: mqtt.Connection
+        # None until the first connection is created
+        self._con: Optional[mqtt.Connection] = None
+        self._qos: mqtt.QoS
         self._devices: List[StreamDevice] = []
-        self._tasks: Dict[str, Task] = {}
+        self._keepalive = KeepaliveScheduler(self._request_realtime)
         self._callback: StreamCallback = self._on_message_received
+        self._reconnect_policy = reconnect_policy or RetryPolicy(
+            base_delay=RECONNECT_BASE_DELAY, max_delay=RECONNECT_MAX_DELAY
+        )
+        self._reconnect_grace = reconnect_grace
+        self._subscribe_concurrency = subscribe_concurrency
+        self._wildcard_topics = wildcard_topics
+        # The connection callbacks are handed off to the loop of start()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._supervisor: Optional[Task] = None
+        self._down_since: Optional[float] = None
+        self._restore_task: Optional[Task] = None
+        self._connection_lost: asyncio.Event
+        self._connection_up: asyncio.Event
+        self._stats = ConnectionStats()
 
     def add_devices(self, devices: List[StreamDevice]):
         """Add a list of devices streaming the data from."""
@@ -85,6 +195,45 @@ class Stream:
         self._devices = [device for device in devices if device.type in DEVICE_ITEMS]
         return self
 
+    async def subscribe_device(self, device: StreamDevice):
+        """Stream a device, without disturbing the others.
+
+        Once started, its topics are subscribed and its realtime requests
+        scheduled on the live connection. While the connection is down, it is
+        subscribed along with the others once back.
+
+        Raises:
+            ValueError: If the device type can't be streamed, or the device
+                was already added
+        """
+        if device.type not in DEVICE_ITEMS:
+            raise ValueError(f"Devices of type {device.type} can't be streamed")
+        if any(added.localId == device.localId for added in self._devices):
+            raise ValueError(f"Device {device.localId} already added")
+        self._devices.append(device)
+        if not self._stats.connected:
+            return
+        try:
+            await self._for_each_topic(self._subscribe, [device])
+        except BaseException:
+            self._devices.remove(device)
+            raise
+        self._keepalive.add(device.localId, device.timeout)
+        log.info(f"Device {device.localId} subscribed")
+
+    async def unsubscribe_device(self, device_id: str):
+        """Stop streaming a device, without disturbing the others.
+
+        Raises:
+            KeyError: If the device wasn't added
+        """
+        device = self._get_device(device_id)
+        self._devices.remove(device)
+        self._keepalive.remove(device_id)
+        if self._stats.connected:
+            await self._for_each_topic(self._unsubscribe, [device], suppress=True)
+        log.info(f"Device {device_id} unsubscribed")
+
     def add_callback(self, callback: StreamCallback):
         """Add a callback to stream.
 
@@ -97,42 +246,221 @@ class Stream:
         self._callback = callback
         return self
 
-    async def start(self):
-        """Start streaming."""
+    def stats(self) -> ConnectionStats:
+        """Return a copy of the connection statistics."""
+        return ConnectionStats(**vars(self._stats))
 
-        self._con = await self._create_connection()
+    @property
+    def devices(self) -> List[str]:
+        """Return the ids of the streamed devices."""
+        return [device.localId for device in self._devices]
 
-        log.debug("Mqtt socket connection establishing...")
-        # self._con.connect().result()
-        await asyncio.wrap_future(self._con.connect())
+    @property
+    def down_for(self) -> float:
+        """Return the seconds the connection has been interrupted, 0 if up."""
+        if self._down_since is None:
+            return 0
+        return time.monotonic() - self._down_since
 
-        log.debug("Mqtt socket connection established")
+    @property
+    def topics_per_device(self) -> int:
+        """Return the topics subscribed per device."""
+        return len(self._device_topics(""))
 
-        for device in self._devices:
-            for topic in self._device_topics(device.localId):
-                await self._subscribe(topic)
+    def set_timeout(self, device_id: str, timeout: float):
+        """Change the realtime timeout of a device.
 
-            self._tasks[device.localId] = asyncio.create_task(
-                self._keep_connection_alive(device_id=device.localId)
-            )
+        Once streaming, its realtime request is renewed right away.
+
+        Raises:
+            KeyError: If the device wasn't added
+        """
+        self._get_device(device_id).timeout = timeout
+        if device_id in self._keepalive.devices:
+            self._keepalive.set_timeout(device_id, timeout)
+
+    async def start(self):
+        """Start streaming."""
+        from awscrt import mqtt
+
+        self._qos = mqtt.QoS.AT_LEAST_ONCE
+        self._loop = asyncio.get_running_loop()
+        self._connection_lost = asyncio.Event()
+        self._connection_up = asyncio.Event()
+        await self._connect()
+        self._supervisor = asyncio.create_task(self._supervise())
 
     async def stop(self):
         """Stop streaming."""
+        self._loop = None
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._supervisor
+            self._supervisor = None
+        if self._restore_task is not None:
+            self._restore_task.cancel()
+        await self._stop_keepalive()
+
+        if self._stats.connected:
+            await self._for_each_topic(self._unsubscribe, self._devices, suppress=True)
+        await self._disconnect(self._con)
+        self._stats.connected = False
+
+    async def _connect(self):
+        self._con = con = await self._create_connection()
+        try:
+            log.debug("Mqtt socket connection establishing...")
+            await asyncio.wrap_future(con.connect())
+            log.debug("Mqtt socket connection established")
+
+            await self._for_each_topic(self._subscribe, self._devices)
+            self._start_keepalive()
+        except BaseException:
+            # The socket isn't left open by a connection failing half way
+            await self._stop_keepalive()
+            await self._disconnect(con)
+            raise
+        self._stats.connected = True
+        self._connection_up.set()
+
+    async def _disconnect(self, con: Optional["mqtt.Connection"]):
+        if con is None:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.wrap_future(con.disconnect()), DISCONNECT_TIMEOUT
+            )
+        except Exception as ex:
+            log.debug(f"Mqtt socket disconnection failed: {ex!r}")
 
-        self._con.unsubscribe()
-        await asyncio.wrap_future(self._con.disconnect())
-
-        for task in self._tasks.values():
-            task.cancel()
+    @property
+    def _connection(self) -> "mqtt.Connection":
+        assert self._con is not None, "Stream not started"
+        return self._con
 
-        await asyncio.wrap_future(self._con.disconnect())
+    async def _create_connection(self) -> "mqtt.Connection":
+        from edp.redy.services.wsmqtt import WebSocketMqtt
 
-    async def _create_connection(self) -> mqtt.Connection:
         log.debug("Configuring the mqtt socket connection...")
-        con = await WebSocketMqtt(auth=self._auth).new_connection()
+        con = await WebSocketMqtt(auth=self._auth).new_connection(
+            on_interrupted=self._on_connection_interrupted,
+            on_resumed=self._on_connection_resumed,
+        )
         log.debug("Mqtt socket connection done")
         return con
 
+    def _on_connection_interrupted(self, connection, error, **kwargs):
+        # Called from the awscrt threads
+        log.warning(f"Connection interrupted. error: {error}")
+        self._call_soon(self._interrupted, connection)
+
+    def _on_connection_resumed(
+        self, connection, return_code, session_present, **kwargs
+    ):
+        # Called from the awscrt threads
+        log.info(
+            f"Connection resumed. return_code: {return_code} session_present: "
+            f"{session_present}"
+        )
+        self._call_soon(self._resumed, connection, session_present)
+
+    def _call_soon(self, callback: Callable[..., None], *args):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(callback, *args)
+
+    def _interrupted(self, connection: "mqtt.Connection"):
+        if connection is not self._con or self._down_since is not None:
+            return
+        self._down_since = time.monotonic()
+        self._stats.connected = False
+        self._stats.interruptions += 1
+        self._connection_up.clear()
+        self._connection_lost.set()
+
+    def _resumed(self, connection: "mqtt.Connection", session_present: bool):
+        if connection is not self._con or self._down_since is None:
+            return
+        self._stats.resumed += 1
+        self._up()
+        # The realtime requests may have expired while down, and the
+        # subscriptions are lost along with the session
+        self._restore_task = asyncio.create_task(
+            self._restore(resubscribe=not session_present)
+        )
+
+    def _up(self):
+        if self._down_since is not None:
+            downtime = time.monotonic() - self._down_since
+            self._down_since = None
+            self._stats.downtime_sum += downtime
+            self._stats.downtime_max = max(self._stats.downtime_max, downtime)
+            log.info(f"Stream connection back after {downtime:.1f} s")
+        self._stats.connected = True
+        self._connection_lost.clear()
+        self._connection_up.set()
+
+    async def _restore(self, resubscribe: bool):
+        try:
+            if resubscribe:
+                await self._for_each_topic(self._subscribe, self._devices)
+            await self._stop_keepalive()
+            self._start_keepalive()
+        except Exception:
+            log.exception("Stream subscriptions couldn't be restored")
+
+    async def _supervise(self):
+        while True:
+            await self._connection_lost.wait()
+            try:
+                await asyncio.wait_for(
+                    self._connection_up.wait(), self._reconnect_grace
+                )
+                continue
+            except asyncio.TimeoutError:
+                pass
+            await self._reconnect()
+
+    async def _reconnect(self):
+        attempt = 0
+        while True:
+            attempt += 1
+            log.info(f"Stream connection being rebuilt (attempt {attempt})...")
+            try:
+                await self._stop_keepalive()
+                await self._disconnect(self._con)
+                # The credentials may have been rejected, new ones are used
+                await self._auth.cognito_identity.refresh()
+                await self._connect()
+            except Exception:
+                self._stats.failed_reconnects += 1
+                delay = self._reconnect_policy.delay(attempt)
+                log.warning(
+                    f"Stream connection couldn't be rebuilt, retrying in "
+                    f"{delay:.1f} s",
+                    exc_info=True,
+                )
+                await asyncio.sleep(delay)
+            else:
+                self._stats.reconnects += 1
+                self._up()
+                return
+
+    def _get_device(self, device_id: str) -> StreamDevice:
+        for device in self._devices:
+            if device.localId == device_id:
+                return device
+        raise KeyError(device_id)
+
+    def _start_keepalive(self):
+        for device in self._devices:
+            self._keepalive.add(device.localId, device.timeout)
+        self._keepalive.start()
+
+    async def _stop_keepalive(self):
+        await self._keepalive.stop()
+
     def _module_update_topic(self, device_id: str) -> str:
         return f"wifi/{device_id}/fromDev/module/update"
 
@@ -142,7 +470,12 @@ class Stream:
     def _realtime_topic(self, device_id: str) -> str:
         return f"wifi/{device_id}/fromDev/realtime"
 
-    def _device_topics(self, device_id: str) -> Tuple[str, str, str]:
+    def _wildcard_topic(self, device_id: str) -> str:
+        return f"wifi/{device_id}/fromDev/#"
+
+    def _device_topics(self, device_id: str) -> Tuple[str, ...]:
+        if self._wildcard_topics:
+            return (self._wildcard_topic(device_id),)
         return (
             self._module_update_topic(device_id),
             self._module_changed_topic(device_id),
@@ -155,10 +488,36 @@ class Stream:
     def _on_message_received(self, topic, payload, dup, qos, retain):
         log.debug(f"Received message from topic '{topic}': {payload}")
 
+    async def _for_each_topic(
+        self,
+        operation: Callable[[str], Awaitable[None]],
+        devices: List[StreamDevice],
+        suppress: bool = False,
+    ):
+        # The operations run concurrently, up to the subscribe concurrency
+        semaphore = asyncio.Semaphore(self._subscribe_concurrency)
+
+        async def run(topic: str):
+            async with semaphore:
+                try:
+                    await operation(topic)
+                except Exception:
+                    if not suppress:
+                        raise
+                    log.debug(f"Operation on topic '{topic}' failed", exc_info=True)
+
+        await asyncio.gather(
+            *(
+                run(topic)
+                for device in devices
+                for topic in self._device_topics(device.localId)
+            )
+        )
+
     async def _subscribe(self, topic: str):
         log.debug(f"Subscribing to topic: '{topic}'...")
         await asyncio.wrap_future(
-            self._con.subscribe(
+            self._connection.subscribe(
                 topic=topic,
                 qos=self._qos,
                 callback=self._callback,  # type: ignore
@@ -166,35 +525,30 @@ class Stream:
         )
         log.debug("Subscribing to topic done")
 
+    async def _unsubscribe(self, topic: str):
+        log.debug(f"Unsubscribing from topic: '{topic}'...")
+        await asyncio.wrap_future(self._connection.unsubscribe(topic)[0])
+        log.debug("Unsubscribing from topic done")
+
     async def _publish(self, topic: str, payload: dict):
         log.debug(f"Publishing the request to topic '{topic}': {payload}...")
         await asyncio.wrap_future(
-            self._con.publish(topic=topic, payload=json.dumps(payload), qos=self._qos)[
-                0
-            ]
+            self._connection.publish(
+                topic=topic, payload=json.dumps(payload), qos=self._qos
+            )[0]
         )
         log.debug("Publishing the realtime request done")
 
-    async def _keep_connection_alive(self, device_id: str, period_s: float = 55):
-        while True:
-            try:
-                log.debug(f"Keeping connection alive for {device_id}")
-
-                await self._publish(
-                    topic=self._device_req_topic(device_id),
-                    payload={
-                        "id": self._con.client_id,
-                        "operationType": "realtime",
-                        "messageType": "request",
-                        "data": {"timeout": 60},
-                    },
-                )
-                await asyncio.sleep(period_s)
-
-            except asyncio.exceptions.CancelledError:
-                pass
-            except BaseException:
-                log.exception("Unexpected error")
+    async def _request_realtime(self, device_id: str, timeout: float):
+        await self._publish(
+            topic=self._device_req_topic(device_id),
+            payload={
+                "id": self._connection.client_id,
+                "operationType": "realtime",
+                "messageType": "request",
+                "data": {"timeout": timeout},
+            },
+        )
 
 
 class OnNotificationStreamCallback(Protocol):
@@ -229,17 +583,87 @@ class OnResponseStreamCallback(Protocol):
 class StreamService:
     """Stream service class."""
 
-    def __init__(self, auth: AuthService) -> None:
+    def __init__(
+        self,
+        auth: AuthService,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DropOldest,
+        reconnect_policy: Optional[RetryPolicy] = None,
+        subscribe_concurrency: int = SUBSCRIBE_CONCURRENCY,
+        wildcard_topics: bool = False,
+        max_connections: int = 1,
+        json_backend: Optional[JsonBackend] = None,
+        variables: Optional[Collection[str]] = None,
+    ) -> None:
         """Initialize a streams service object.
 
         Args:
             auth (AuthService): The auth service
+            queue_size (int, optional): Maximum messages waiting for the
+                callbacks. Defaults to INGEST_QUEUE_SIZE.
+            overflow_policy (OverflowPolicy, optional): What is done with the
+                messages received while the callbacks are behind. Defaults to
+                OverflowPolicy.DropOldest.
+            reconnect_policy (Optional[RetryPolicy], optional): The backoff
+                between the attempts to rebuild a lost connection. Defaults
+                to None, for the Stream default.
+            subscribe_concurrency (int, optional): Maximum subscriptions
+                waiting for their acknowledgement. Defaults to
+                SUBSCRIBE_CONCURRENCY.
+            wildcard_topics (bool, optional): Subscribe a single wildcard
+                topic per device. Defaults to False.
+            max_connections (int, optional): Maximum connections the devices
+                are sharded over, by a StreamPool when above 1. Defaults to 1.
+            json_backend (Optional[JsonBackend], optional): Parses the
+                payloads. Defaults to None, for the fastest one installed.
+            variables (Optional[Collection[str]], optional): The only state
+                variables notified. The payloads containing none of them,
+                and which aren't responses, are dropped unparsed. The others
+                are still parsed whole, as none of the JSON backends can
+                parse selectively, and their other variables dropped right
+                after. Defaults to None, for every variable.
         """
         self._auth = auth
-        self._stream = Stream(auth=self._auth)
+        self._json = json_backend or get_json_backend()
+        self._variables = tuple(variables) if variables is not None else None
+        # The payloads containing none of these can be dropped unparsed
+        self._payload_tokens = (
+            tuple(json.dumps(name).encode() for name in (*self._variables, "response"))
+            if self._variables is not None
+            else None
+        )
+        self._queue_size = queue_size
+        self._overflow_policy = overflow_policy
+
+        def create_stream() -> Stream:
+            return Stream(
+                auth=self._auth,
+                reconnect_policy=reconnect_policy,
+                subscribe_concurrency=subscribe_concurrency,
+                wildcard_topics=wildcard_topics,
+            )
+
+        self._stream: Union[Stream, "StreamPool"]
+        if max_connections > 1:
+            # Imported here, as the pool module imports this one
+            from edp.redy.services.streampool import StreamPool
+
+            self._stream = StreamPool(
+                auth,
+                max_connections=max_connections,
+                stream_factory=create_stream,
+            )
+        else:
+            self._stream = create_stream()
         self._devices: List[StreamDevice] = []
         self._on_response_cb: Optional[OnResponseStreamCallback] = None
         self._on_notification_cb: Optional[OnNotificationStreamCallback] = None
+        # The messages are handed off from the awscrt threads to the loop
+        # owning the service, where the callbacks run
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[IngestQueue] = None
+        self._dispatcher: Optional[Task] = None
+        self._update_buffers: List[Tuple[UpdateFilter, UpdateBuffer]] = []
 
     def add_devices(self, devices: List[StreamDevice]) -> "StreamService":
         """Add devices to stream service.
@@ -253,6 +677,36 @@ class StreamService:
         self._devices = devices
         return self
 
+    async def subscribe_device(self, device: StreamDevice):
+        """Stream one more device, on the live connection once started.
+
+        The device is kept when the service is stopped and started again.
+
+        Raises:
+            ValueError: If the device type can't be streamed, or the device
+                was already added
+        """
+        if device.type not in DEVICE_ITEMS:
+            raise ValueError(f"Devices of type {device.type} can't be streamed")
+        if any(added.localId == device.localId for added in self._devices):
+            raise ValueError(f"Device {device.localId} already added")
+        if self._dispatcher is not None:
+            await self._stream.subscribe_device(device)
+        self._devices = [*self._devices, device]
+
+    async def unsubscribe_device(self, device_id: str):
+        """Stop streaming a device, on the live connection once started.
+
+        Raises:
+            KeyError: If the device wasn't added
+        """
+        devices = [d for d in self._devices if d.localId != device_id]
+        if len(devices) == len(self._devices):
+            raise KeyError(device_id)
+        if self._dispatcher is not None:
+            await self._stream.unsubscribe_device(device_id)
+        self._devices = devices
+
     def add_callback(
         self,
         *,
@@ -273,16 +727,98 @@ class StreamService:
         return self
 
     async def start(self) -> "StreamService":
-        """Start a stream service."""
-        await self._start_stream()
+        """Start a stream service.
+
+        The callbacks are called from the loop running this method.
+        """
+        self._start_dispatcher()
+        try:
+            await self._start_stream()
+        except BaseException:
+            await self._stop_dispatcher()
+            raise
         return self
 
     async def stop(self):
         """Stop a stream service."""
         log.info("Real Time Streaming being stopped...")
         await self._stream.stop()
+        await self._stop_dispatcher()
         log.info("Real Time Streaming stopped")
 
+    async def updates(
+        self,
+        filter: Optional[UpdateFilter] = None,
+        buffer_size: int = UPDATES_BUFFER_SIZE,
+        overflow_policy: OverflowPolicy = OverflowPolicy.Block,
+    ) -> AsyncIterator[StreamUpdate]:
+        """Iterate over the realtime state variable updates.
+
+        The updates received from the first iteration on are yielded, until
+        the service is stopped. Those not matching the filter are skipped
+        before being buffered.
+
+        Example:
+            async for update in stream_service.updates(
+                UpdateFilter(variables={"emeter:power_aplus"})
+            ):
+                print(update.localId, update.value)
+
+        Args:
+            filter (Optional[UpdateFilter], optional): The updates yielded.
+                Defaults to None, for every update.
+            buffer_size (int, optional): Maximum updates waiting for this
+                iterator. Defaults to UPDATES_BUFFER_SIZE.
+            overflow_policy (OverflowPolicy, optional): What is done with the
+                updates received while the buffer is full. Blocking holds
+                the stream dispatch until there is room. Defaults to
+                OverflowPolicy.Block.
+
+        Yields:
+            StreamUpdate: The updates, in the order they were received
+        """
+        buffer = UpdateBuffer(buffer_size, overflow_policy)
+        subscription = (filter or UpdateFilter(), buffer)
+        self._update_buffers.append(subscription)
+        try:
+            while True:
+                update = await buffer.get()
+                if update is None:
+                    return
+                yield update
+        finally:
+            buffer.close()
+            self._update_buffers.remove(subscription)
+
+    def connection_stats(self) -> ConnectionStats:
+        """Return the statistics of the stream connection."""
+        return self._stream.stats()
+
+    def ingest_stats(self) -> Optional[IngestStats]:
+        """Return the statistics of the messages waiting for the callbacks.
+
+        Returns:
+            Optional[IngestStats]: The statistics, or None if never started
+        """
+        return self._queue.stats() if self._queue is not None else None
+
+    def _start_dispatcher(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = IngestQueue(self._queue_size, self._overflow_policy)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _stop_dispatcher(self):
+        if self._queue is not None:
+            self._queue.close()
+        for _, buffer in self._update_buffers:
+            buffer.close()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._dispatcher
+            self._dispatcher = None
+        self._loop = None
+
     async def _start_stream(self):
         # Configuring realtime connection
         log.info("Real Time Streaming being configured...")
@@ -299,38 +835,127 @@ class StreamService:
         log.info("Real Time Streaming configured")
 
     def _on_message_received(self, topic, payload: bytes, dup, qos, retain):
-        payload_data: Dict[str, Any] = json.loads(payload.decode())
-        message_type = payload_data.get("messageType")
+        # Called from the awscrt threads: the payload is parsed here, off the
+        # loop, and handed off to the loop owning the service
+        queue = self._queue
+        loop = self._loop
+        if queue is None or loop is None or loop.is_closed():
+            log.debug(f"Message from topic {topic} dropped, service stopped")
+            return
+        received = time.monotonic()
+        timestamp = time.time()
+        payload_data = self._decode(topic, payload)
+        if payload_data is None:
+            return
 
+        message_type = payload_data.get("messageType")
+        operation_type = payload_data.get("operationType")
         if message_type == "notification":
-            operation_type = payload_data["operationType"]
-            data_list = payload_data["data"]
-            if self._on_notification_cb:
-                for data in data_list:
-                    asyncio.run(
-                        self._on_notification_cb(
-                            operation_type=operation_type, data=data
-                        )
+            for data in payload_data["data"]:
+                if self._variables is not None and not self._select_variables(data):
+                    continue
+                queue.put_threadsafe(
+                    StreamMessage(
+                        topic,
+                        message_type,
+                        operation_type,
+                        data,
+                        received=received,
+                        timestamp=timestamp,
                     )
-            else:
-                log.info(
-                    f"Notification from topic {topic} '{operation_type}': "
-                    f"{data_list}"
                 )
         elif message_type == "response":
-            operation_type = payload_data["operationType"]
-            success = payload_data["success"]
-            data = payload_data["data"]
-            if self._on_response_cb:
-                asyncio.run(
-                    self._on_response_cb(
-                        operation_type=operation_type, success=success, data=data
-                    )
+            queue.put_threadsafe(
+                StreamMessage(
+                    topic,
+                    message_type,
+                    operation_type,
+                    payload_data["data"],
+                    success=payload_data["success"],
+                    received=received,
+                    timestamp=timestamp,
                 )
+            )
+        else:
+            log.info(f"Unknown message type. Data: {payload_data}")
+
+    def _decode(self, topic: str, payload: bytes) -> Optional[Dict[str, Any]]:
+        # A notification without any subscribed variable, and which isn't a
+        # response either, is dropped before being parsed
+        tokens = self._payload_tokens
+        if tokens is not None:
+            for token in tokens:
+                if token in payload:
+                    break
             else:
+                return None
+        # Parsed from the bytes, without decoding them into a str first
+        try:
+            return self._json.loads(payload)
+        except ValueError:
+            log.warning(f"Invalid message from topic {topic}: {payload!r}")
+            return None
+
+    def _select_variables(self, data: Dict[str, Any]) -> bool:
+        # Keeps the subscribed variables only, returns whether there are any.
+        # The others were already parsed, but don't reach the queue and the
+        # callbacks
+        state_variables = data.get("stateVariables")
+        if not isinstance(state_variables, dict):
+            return False
+        selected = {
+            name: state_variables[name]
+            for name in self._variables or ()
+            if name in state_variables
+        }
+        data["stateVariables"] = selected
+        return bool(selected)
+
+    async def _dispatch(self):
+        assert self._queue is not None
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._handle_message(message)
+            except Exception:
+                log.exception(f"Error handling the message from topic {message.topic}")
+
+    async def _handle_message(self, message: StreamMessage):
+        if message.message_type == "notification":
+            if self._update_buffers:
+                await self._put_updates(message)
+            if self._on_notification_cb:
+                await self._on_notification_cb(
+                    operation_type=message.operation_type, data=message.data
+                )
+            elif not self._update_buffers:
                 log.info(
-                    f"Response from topic {topic} '{operation_type}'"
-                    f"({success}): {data}"
+                    f"Notification from topic {message.topic} "
+                    f"'{message.operation_type}': {message.data}"
                 )
+        elif self._on_response_cb:
+            await self._on_response_cb(
+                operation_type=message.operation_type,
+                success=message.success,
+                data=message.data,
+            )
         else:
-            log.info(f"Unknown message type. Data: {payload_data}")
+            log.info(
+                f"Response from topic {message.topic} '{message.operation_type}'"
+                f"({message.success}): {message.data}"
+            )
+
+    async def _put_updates(self, message: StreamMessage):
+        local_id = message.data.get("localId")
+        state_variables = message.data.get("stateVariables")
+        if not local_id or not isinstance(state_variables, dict):
+            return
+        # Copied, as an iterator may stop while the updates are put
+        for update_filter, buffer in list(self._update_buffers):
+            if not update_filter.matches_module(local_id):
+                continue
+            for variable, value in state_variables.items():
+                if update_filter.matches_variable(variable):
+                    await buffer.put(
+                        StreamUpdate(local_id, variable, value, message.timestamp)
+                    )
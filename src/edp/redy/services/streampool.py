@@ -0,0 +1,309 @@
+"""Stream pool module, sharding the devices over many MQTT connections."""
+import asyncio
+import contextlib
+import logging
+import math
+from asyncio import Task
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from edp.redy.services.auth import AuthService
+from edp.redy.services.stream import ConnectionStats
+from edp.redy.services.stream import DEVICE_ITEMS
+from edp.redy.services.stream import Stream
+from edp.redy.services.stream import StreamCallback
+from edp.redy.services.stream import StreamDevice
+
+log = logging.getLogger(__name__)
+
+# Maximum subscriptions per connection accepted by AWS IoT
+MAX_TOPICS_PER_CONNECTION = 50
+# Default maximum connections of a pool
+MAX_CONNECTIONS = 8
+# Seconds a connection may be down before its devices are moved to others
+REBALANCE_AFTER = 30
+# Seconds between the checks of the connections
+REBALANCE_CHECK_PERIOD = 1
+
+
+class StreamPool:
+    """Streams many devices over a pool of connections.
+
+    Each connection, a Stream, streams up to its capacity of devices, bound
+    by the topics a connection may subscribe. The devices are spread over
+    the least loaded connections, new ones being opened when all are full.
+    The messages of every connection reach the pool callback. When a
+    connection stays down for rebalance_after seconds, its devices are moved
+    to the others, while it keeps trying to reconnect.
+
+    The pool has the Stream interface, so a StreamService can use either.
+    """
+
+    def __init__(
+        self,
+        auth: AuthService,
+        max_topics_per_connection: int = MAX_TOPICS_PER_CONNECTION,
+        max_devices_per_connection: Optional[int] = None,
+        max_connections: int = MAX_CONNECTIONS,
+        rebalance_after: float = REBALANCE_AFTER,
+        stream_factory: Optional[Callable[[], Stream]] = None,
+    ) -> None:
+        """Create a stream pool.
+
+        Args:
+            auth (AuthService): The auth service
+            max_topics_per_connection (int, optional): Maximum topics
+                subscribed per connection. Defaults to
+                MAX_TOPICS_PER_CONNECTION.
+            max_devices_per_connection (Optional[int], optional): Maximum
+                devices per connection. Defaults to None, only limited by
+                the topics.
+            max_connections (int, optional): Maximum connections opened.
+                Defaults to MAX_CONNECTIONS.
+            rebalance_after (float, optional): Seconds a connection may be
+                down before its devices are moved. Defaults to
+                REBALANCE_AFTER.
+            stream_factory (Optional[Callable[[], Stream]], optional):
+                Creates the connections. Defaults to None, for Stream(auth).
+        """
+        self._stream_factory = stream_factory or (lambda: Stream(auth))
+        self._max_topics = max_topics_per_connection
+        self._max_devices = max_devices_per_connection
+        self._max_connections = max_connections
+        self._rebalance_after = rebalance_after
+        self._callback: Optional[StreamCallback] = None
+        self._devices: Dict[str, StreamDevice] = {}
+        self._shards: List[Stream] = []
+        # The connection streaming each device
+        self._routes: Dict[str, Stream] = {}
+        self._monitor: Optional[Task] = None
+        self._rebalanced = 0
+        # Serializes the changes of the shards
+        self._lock = asyncio.Lock()
+
+    @property
+    def connections(self) -> int:
+        """Return the connections opened."""
+        return len(self._shards)
+
+    @property
+    def devices(self) -> List[str]:
+        """Return the ids of the streamed devices."""
+        return list(self._devices)
+
+    @property
+    def rebalanced(self) -> int:
+        """Return the devices moved off a lost connection so far."""
+        return self._rebalanced
+
+    def add_devices(self, devices: List[StreamDevice]) -> "StreamPool":
+        """Set the devices streamed once started."""
+        self._devices = {
+            device.localId: device for device in devices if device.type in DEVICE_ITEMS
+        }
+        return self
+
+    def add_callback(self, callback: StreamCallback) -> "StreamPool":
+        """Set the callback receiving the messages of every connection."""
+        self._callback = callback
+        return self
+
+    def stats(self) -> ConnectionStats:
+        """Return the statistics of all the connections, summed.
+
+        The pool is only connected when all of its connections are.
+        """
+        shards = [shard.stats() for shard in self._shards]
+        return ConnectionStats(
+            connected=bool(shards) and all(stats.connected for stats in shards),
+            interruptions=sum(stats.interruptions for stats in shards),
+            resumed=sum(stats.resumed for stats in shards),
+            reconnects=sum(stats.reconnects for stats in shards),
+            failed_reconnects=sum(stats.failed_reconnects for stats in shards),
+            downtime_sum=sum(stats.downtime_sum for stats in shards),
+            downtime_max=max((stats.downtime_max for stats in shards), default=0),
+        )
+
+    def connection_stats(self) -> List[ConnectionStats]:
+        """Return the statistics of every connection."""
+        return [shard.stats() for shard in self._shards]
+
+    def connection_of(self, device_id: str) -> int:
+        """Return the index of the connection streaming a device.
+
+        Raises:
+            KeyError: If the device isn't streamed
+        """
+        return self._shards.index(self._routes[device_id])
+
+    def set_timeout(self, device_id: str, timeout: float):
+        """Change the realtime timeout of a device.
+
+        Raises:
+            KeyError: If the device wasn't added
+        """
+        self._devices[device_id].timeout = timeout
+        if device_id in self._routes:
+            self._routes[device_id].set_timeout(device_id, timeout)
+
+    async def start(self):
+        """Open the connections needed by the devices, and start streaming.
+
+        Raises:
+            RuntimeError: If the devices need more than max_connections
+        """
+        async with self._lock:
+            devices = list(self._devices.values())
+            # The first connection tells the capacity, and streams the first
+            # group of devices
+            first = self._stream_factory()
+            shards = math.ceil(len(devices) / self._capacity(first)) or 1
+            if shards > self._max_connections:
+                raise RuntimeError(
+                    f"{len(devices)} devices need {shards} connections, "
+                    f"more than {self._max_connections}"
+                )
+            groups = [devices[i::shards] for i in range(shards)]
+            try:
+                await asyncio.gather(
+                    self._open(groups[0], first),
+                    *(self._open(group) for group in groups[1:]),
+                )
+            except BaseException:
+                await self._close_all()
+                raise
+        self._monitor = asyncio.create_task(self._monitor_task())
+        log.info(
+            f"Streaming {len(devices)} devices over {self.connections} connections"
+        )
+
+    async def stop(self):
+        """Stop streaming, and close every connection."""
+        if self._monitor is not None:
+            self._monitor.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._monitor
+            self._monitor = None
+        async with self._lock:
+            await self._close_all()
+
+    async def subscribe_device(self, device: StreamDevice):
+        """Stream a device on the least loaded connection with room.
+
+        Raises:
+            ValueError: If the device type can't be streamed, or the device
+                was already added
+            RuntimeError: If every connection is full, and no more can be
+                opened
+        """
+        if device.type not in DEVICE_ITEMS:
+            raise ValueError(f"Devices of type {device.type} can't be streamed")
+        if device.localId in self._devices:
+            raise ValueError(f"Device {device.localId} already added")
+        async with self._lock:
+            if self._monitor is None:
+                self._devices[device.localId] = device
+                return
+            await self._place(device)
+            self._devices[device.localId] = device
+
+    async def unsubscribe_device(self, device_id: str):
+        """Stop streaming a device, closing its connection once unused.
+
+        Raises:
+            KeyError: If the device wasn't added
+        """
+        async with self._lock:
+            del self._devices[device_id]
+            shard = self._routes.pop(device_id, None)
+            if shard is None:
+                return
+            await shard.unsubscribe_device(device_id)
+            if not shard.devices and len(self._shards) > 1:
+                self._shards.remove(shard)
+                await shard.stop()
+
+    def _capacity(self, shard: Stream) -> int:
+        capacity = max(1, self._max_topics // shard.topics_per_device)
+        if self._max_devices is not None:
+            capacity = min(capacity, self._max_devices)
+        return capacity
+
+    def _on_message_received(self, topic, payload, dup, qos, retain):
+        # Called from the awscrt threads of every connection
+        if self._callback is not None:
+            self._callback(topic, payload, dup, qos, retain)
+
+    async def _open(
+        self, devices: List[StreamDevice], shard: Optional[Stream] = None
+    ) -> Stream:
+        shard = shard or self._stream_factory()
+        shard.add_devices(devices).add_callback(self._on_message_received)
+        try:
+            await shard.start()
+        except BaseException:
+            with contextlib.suppress(Exception):
+                await shard.stop()
+            raise
+        self._shards.append(shard)
+        for device in devices:
+            self._routes[device.localId] = shard
+        return shard
+
+    async def _close_all(self):
+        shards, self._shards = self._shards, []
+        self._routes.clear()
+        await asyncio.gather(
+            *(shard.stop() for shard in shards), return_exceptions=True
+        )
+
+    async def _place(self, device: StreamDevice, exclude: Optional[Stream] = None):
+        candidates = [
+            shard
+            for shard in self._shards
+            if shard is not exclude
+            and shard.stats().connected
+            and len(shard.devices) < self._capacity(shard)
+        ]
+        if candidates:
+            shard = min(candidates, key=lambda shard: len(shard.devices))
+            await shard.subscribe_device(device)
+            self._routes[device.localId] = shard
+        elif len(self._shards) < self._max_connections:
+            await self._open([device])
+        else:
+            raise RuntimeError(
+                f"All the {len(self._shards)} connections are full or down"
+            )
+
+    async def _monitor_task(self):
+        while True:
+            await asyncio.sleep(REBALANCE_CHECK_PERIOD)
+            try:
+                async with self._lock:
+                    for shard in list(self._shards):
+                        if shard.devices and shard.down_for > self._rebalance_after:
+                            await self._rebalance(shard)
+            except Exception:
+                log.exception("Stream pool rebalance failed")
+
+    async def _rebalance(self, lost: Stream):
+        # The lost connection keeps reconnecting, empty, and takes devices
+        # again once back
+        log.warning(
+            f"Connection {self._shards.index(lost)} down for "
+            f"{lost.down_for:.0f} s, moving its {len(lost.devices)} devices"
+        )
+        for device_id in lost.devices:
+            device = self._devices[device_id]
+            await lost.unsubscribe_device(device_id)
+            try:
+                await self._place(device, exclude=lost)
+            except Exception:
+                log.warning(f"Device {device_id} couldn't be moved", exc_info=True)
+                await lost.subscribe_device(device)
+                self._routes[device_id] = lost
+                return
+            self._rebalanced += 1
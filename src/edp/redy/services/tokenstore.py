@@ -0,0 +1,174 @@
+"""Token store module, persisting the tokens between restarts."""
+import contextlib
+import json
+import logging
+import os
+import stat
+import time
+from abc import ABC
+from abc import abstractmethod
+from dataclasses import asdict
+from dataclasses import dataclass
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+# Permissions of the token files: read and write by the owner only
+TOKEN_FILE_MODE = 0o600
+
+
+class TokenStoreError(Exception):
+    """The stored tokens couldn't be loaded."""
+
+
+@dataclass
+class StoredTokens:
+    """Stored tokens dataclass.
+
+    Attributes:
+        username (str): The user the tokens belong to
+        id_token (str): The cognito user id token
+        access_token (str): The cognito user access token
+        refresh_token (str): The cognito user refresh token
+        access_key_id (Optional[str]): The identity access key id
+        secret_key (Optional[str]): The identity secret key
+        session_token (Optional[str]): The identity session token
+        credentials_expiration (float): Timestamp the identity credentials
+            expire at, 0 if there are none
+    """
+
+    username: str
+    id_token: str
+    access_token: str
+    refresh_token: str
+    access_key_id: Optional[str] = None
+    secret_key: Optional[str] = None
+    session_token: Optional[str] = None
+    credentials_expiration: float = 0
+
+    @property
+    def credentials_valid(self) -> bool:
+        """Indicate whether the identity credentials didn't expire yet."""
+        return bool(self.session_token) and time.time() < self.credentials_expiration
+
+
+class TokenStore(ABC):
+    """Token store interface."""
+
+    @abstractmethod
+    def load(self) -> Optional[StoredTokens]:
+        """Load the stored tokens.
+
+        Returns:
+            Optional[StoredTokens]: The tokens, or None if there are none
+        """
+
+    @abstractmethod
+    def save(self, tokens: StoredTokens):
+        """Store the tokens, replacing the previous ones."""
+
+    @abstractmethod
+    def clear(self):
+        """Delete the stored tokens."""
+
+
+class FileTokenStore(TokenStore):
+    """Stores the tokens in a file only readable by its owner.
+
+    When a key is given, the file is also encrypted with Fernet, which
+    requires the 'encryption' extra (cryptography).
+    """
+
+    def __init__(self, path: str, key: Optional[bytes] = None) -> None:
+        """Create a file token store.
+
+        Args:
+            path (str): The tokens file
+            key (Optional[bytes], optional): A Fernet key, as generated by
+                FileTokenStore.generate_key(), encrypting the file. Defaults to
+                None.
+        """
+        self._path = os.path.expanduser(path)
+        self._fernet = self._get_fernet(key) if key else None
+
+    @staticmethod
+    def generate_key() -> bytes:
+        """Generate a new encryption key."""
+        from cryptography.fernet import Fernet
+
+        return Fernet.generate_key()
+
+    def load(self) -> Optional[StoredTokens]:
+        """Load the stored tokens.
+
+        Files readable by other users are ignored, as the tokens may have
+        leaked.
+
+        Raises:
+            TokenStoreError: If the file can't be read or decrypted
+
+        Returns:
+            Optional[StoredTokens]: The tokens, or None if there are none
+        """
+        try:
+            mode = stat.S_IMODE(os.stat(self._path).st_mode)
+        except FileNotFoundError:
+            return None
+        if mode & ~TOKEN_FILE_MODE:
+            log.warning(
+                f"Ignoring {self._path}, as its permissions {oct(mode)} "
+                f"are not {oct(TOKEN_FILE_MODE)}"
+            )
+            return None
+        try:
+            with open(self._path, "rb") as file:
+                content = file.read()
+            if self._fernet is not None:
+                content = self._fernet.decrypt(content)
+            return StoredTokens(**json.loads(content))
+        except Exception as ex:
+            raise TokenStoreError(
+                f"Tokens couldn't be loaded from {self._path}"
+            ) from ex
+
+    def save(self, tokens: StoredTokens):
+        """Store the tokens, replacing the previous ones.
+
+        The file is replaced atomically, and is never readable by other
+        users, not even while being written.
+        """
+        content = json.dumps(asdict(tokens)).encode()
+        if self._fernet is not None:
+            content = self._fernet.encrypt(content)
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self._path}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, TOKEN_FILE_MODE)
+        try:
+            if hasattr(os, "fchmod"):
+                # The mode given to open is masked by the umask
+                os.fchmod(fd, TOKEN_FILE_MODE)
+            with os.fdopen(fd, "wb") as file:
+                file.write(content)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        os.replace(temp_path, self._path)
+        log.debug(f"Tokens saved to {self._path}")
+
+    def clear(self):
+        """Delete the stored tokens."""
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self._path)
+
+    @staticmethod
+    def _get_fernet(key: bytes):
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError as ex:
+            raise ImportError(
+                "Encrypting the tokens requires the 'encryption' extra: "
+                "pip install edp-redy-api[encryption]"
+            ) from ex
+        return Fernet(key)
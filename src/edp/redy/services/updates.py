@@ -0,0 +1,145 @@
+"""Updates module, the realtime state variable updates of the stream."""
+import asyncio
+import collections
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Any
+from typing import Collection
+from typing import Optional
+
+from edp.redy.services.ingest import OverflowPolicy
+
+log = logging.getLogger(__name__)
+
+# Default maximum updates waiting in each iterator
+UPDATES_BUFFER_SIZE = 100
+
+
+@dataclass(frozen=True)
+class StreamUpdate:
+    """Realtime update of a module state variable.
+
+    Attributes:
+        localId (str): The module local id
+        variable (str): The state variable, e.g. "emeter:power_aplus"
+        value (Any): The new value of the variable
+        received (float): Timestamp the update was received at
+    """
+
+    localId: str
+    variable: str
+    value: Any
+    received: float
+
+
+@dataclass(frozen=True)
+class UpdateFilter:
+    """Selects the updates yielded by an iterator.
+
+    Attributes:
+        local_ids (Optional[Collection[str]]): The module local ids, or None
+            for every module
+        variables (Optional[Collection[str]]): The state variables, or None
+            for every variable
+    """
+
+    local_ids: Optional[Collection[str]] = None
+    variables: Optional[Collection[str]] = None
+
+    def matches_module(self, local_id: str) -> bool:
+        """Indicate whether the updates of a module may be yielded."""
+        return self.local_ids is None or local_id in self.local_ids
+
+    def matches_variable(self, variable: str) -> bool:
+        """Indicate whether the updates of a variable may be yielded."""
+        return self.variables is None or variable in self.variables
+
+
+class UpdateBuffer:
+    """Bounded buffer of the updates waiting for an iterator.
+
+    The overflow policies are the ingest queue ones: blocking makes the
+    stream dispatcher wait for the iterator, so the backpressure reaches the
+    ingest queue, and conflating keeps the latest value of every module
+    variable.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = UPDATES_BUFFER_SIZE,
+        policy: OverflowPolicy = OverflowPolicy.Block,
+    ) -> None:
+        """Create an update buffer, in the running loop.
+
+        Args:
+            maxsize (int, optional): Maximum updates waiting. Defaults to
+                UPDATES_BUFFER_SIZE.
+            policy (OverflowPolicy, optional): What is done with the updates
+                put while full. Defaults to OverflowPolicy.Block.
+        """
+        if maxsize < 1:
+            raise ValueError("The update buffer size must be positive")
+        self._maxsize = maxsize
+        self._policy = OverflowPolicy(policy)
+        # Keyed by module variable when conflating, else by arrival
+        self._items: "collections.OrderedDict[Any, StreamUpdate]" = (
+            collections.OrderedDict()
+        )
+        self._counter = itertools.count()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._closed = False
+        self.dropped = 0
+        self.conflated = 0
+
+    def __len__(self) -> int:
+        """Return the updates waiting."""
+        return len(self._items)
+
+    async def put(self, update: StreamUpdate):
+        """Put an update, waiting while full with the block policy."""
+        if self._policy is OverflowPolicy.Conflate:
+            key: Any = (update.localId, update.variable)
+            if key in self._items:
+                self._items[key] = update
+                self.conflated += 1
+                return
+        else:
+            key = next(self._counter)
+
+        while len(self._items) >= self._maxsize and not self._closed:
+            if self._policy is OverflowPolicy.Block:
+                self._writable.clear()
+                await self._writable.wait()
+            elif self._policy is OverflowPolicy.DropOldest:
+                self._items.popitem(last=False)
+                self.dropped += 1
+            else:
+                self.dropped += 1
+                return
+        if self._closed:
+            return
+        self._items[key] = update
+        self._readable.set()
+
+    async def get(self) -> Optional[StreamUpdate]:
+        """Wait for the oldest update, and take it.
+
+        Returns:
+            Optional[StreamUpdate]: The update, or None once closed and empty
+        """
+        while not self._items:
+            if self._closed:
+                return None
+            self._readable.clear()
+            await self._readable.wait()
+        _, update = self._items.popitem(last=False)
+        self._writable.set()
+        return update
+
+    def close(self):
+        """Stop accepting updates, the waiting ones can still be taken."""
+        self._closed = True
+        self._readable.set()
+        self._writable.set()
@@ -1,9 +1,11 @@
 """Websocket MQTT connection."""
 import logging
+from typing import Callable
 from typing import Optional
 from uuid import uuid4
 
 from awscrt import mqtt
+from awscrt.auth import AwsCredentials
 from awscrt.auth import AwsCredentialsProvider
 from awsiot import mqtt_connection_builder as mqtt_conn_builder
 from edp.redy.services.auth import AuthService
@@ -26,8 +28,6 @@ def on_connection_interrupted(connection, error, **kwargs):
         kwargs: Other keyword arguments
     """
     log.warning(f"Connection interrupted. error: {error}")
-    # TODO: Implement the mechanism to check if the token have expired, and
-    # needs to disconnect and connect again with the new credentials
 
 
 # Callback when an interrupted connection is re-established.
@@ -61,21 +61,45 @@ class WebSocketMqtt:
         self._con: Optional[mqtt.Connection] = None
 
     async def _credentials_provider(self):
-        return AwsCredentialsProvider.new_static(
-            access_key_id=await self._auth.cognito_identity.access_key_id,
-            secret_access_key=await self._auth.cognito_identity.secret_key,
-            session_token=await self._auth.cognito_identity.session_token,
+        # Fetch the credentials once, then keep them renewed in the background
+        await self._auth.cognito_identity.credentials()
+        return AwsCredentialsProvider.new_delegate(self._get_credentials)
+
+    def _get_credentials(self) -> AwsCredentials:
+        # Called from the CRT threads on every (re)connection, so it must not
+        # block: the cached snapshot is returned
+        credentials = self._auth.cognito_identity.current_credentials
+        return AwsCredentials(
+            access_key_id=credentials.access_key_id,
+            secret_access_key=credentials.secret_key,
+            session_token=credentials.session_token,
+            expiration=credentials.expiration,
         )
 
     async def new_connection(
-        self, endpoint: str = IOT_CONN_HOST, region: str = REGION, client_id: str = ""
+        self,
+        endpoint: str = IOT_CONN_HOST,
+        region: str = REGION,
+        client_id: str = "",
+        on_interrupted: Callable[..., None] = on_connection_interrupted,
+        on_resumed: Callable[..., None] = on_connection_resumed,
     ) -> mqtt.Connection:
         """Establish a new Websocket MQTT connection.
 
+        The connection resumes by itself after an interruption, signing with
+        the latest identity credentials. Rebuilding it when it doesn't is up
+        to the callers, as the Stream does.
+
         Args:
             endpoint (str, optional): The endpoint to connect to. Defaults to IOT_CONN_HOST.
             region (str, optional): AWS region. Defaults to REGION.
             client_id (str, optional): The client ID. Defaults to "".
+            on_interrupted (Callable[..., None], optional): Called from the
+                awscrt threads when the connection is lost. Defaults to
+                on_connection_interrupted.
+            on_resumed (Callable[..., None], optional): Called from the
+                awscrt threads when the connection resumes. Defaults to
+                on_connection_resumed.
 
         Returns:
             mqtt.Connection: The MQTT connection object
@@ -87,8 +111,8 @@ class WebSocketMqtt:
                 endpoint=endpoint,
                 region=region,
                 credentials_provider=await self._credentials_provider(),
-                on_connection_interrupted=on_connection_interrupted,
-                on_connection_resumed=on_connection_resumed,
+                on_connection_interrupted=on_interrupted,
+                on_connection_resumed=on_resumed,
                 client_id=client_id,
                 clean_session=False,
                 keep_alive_secs=30,
@@ -1,6 +1,64 @@
 """Integration tests."""
+import pytest
+from edp.redy.app import App
+from edp.redy.services.api import ApiService
+from edp.redy.services.devices.models.modulesmodel import Resolution
+from edp.redy.services.devices.service import DevicesService
+from edp.redy.services.energy.service import EnergyService
+from edp.redy.services.fakeserver import FakeRedyServer
+from edp.redy.services.fakeserver import INJECTION_MODULE_ID
+from edp.redy.services.fakeserver import PRODUCTION_MODULE_ID
+from edp.redy.services.houses.service import HousesService
+from edp.redy.services.statevars.service import StateVariablesService
+
+
+class _StubCognitoUser:
+    @property
+    async def id_token(self):
+        return "token"
+
+
+class _StubAuth:
+    cognito_user = _StubCognitoUser()
+
+
+class _StubStream:
+    def add_devices(self, devices):
+        self.devices = devices
+        return self
+
+    def add_callback(self, on_notification_cb, on_response_cb):
+        return self
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
 
 
 def test_integration():
     """Integration test."""
     assert True
+
+
+@pytest.mark.asyncio
+async def test_app_against_fake_server():
+    """The app starts and gets the energy from the fake server."""
+    async with FakeRedyServer(latency=0.001) as server:
+        api = ApiService(auth=_StubAuth(), base_url=server.url)  # type: ignore
+        app = App(
+            HousesService(api),
+            EnergyService(api),
+            DevicesService(api),
+            StateVariablesService(api),
+            _StubStream(),  # type: ignore
+            api,
+        )
+        await app.start()
+        assert app.injection_meter.module_id == INJECTION_MODULE_ID
+        assert app.production_meter.module_id == PRODUCTION_MODULE_ID
+
+        values = await app.energy.in_dates(Resolution.Day)
+        assert all(value is not None and value.history for value in values.values())
+        await app.stop()
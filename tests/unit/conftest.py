@@ -0,0 +1,39 @@
+"""Unit tests shared helpers."""
+import base64
+import json
+import time
+
+
+def fake_token(exp: float) -> str:
+    """Build an unsigned JWT token expiring at exp."""
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode())
+    return "header." + payload.decode().rstrip("=") + ".signature"
+
+
+class FakeCognito:
+    """In memory stand-in for a warrant Cognito user."""
+
+    def __init__(self, lifetime: float):
+        """Create a user whose tokens expire lifetime seconds after issued."""
+        self.username = None
+        self.lifetime = lifetime
+        self.id_token = None
+        self.access_token = None
+        self.refresh_token = None
+        self.renewals = 0
+
+    def authenticate(self, password):
+        """Issue the tokens, and the refresh token."""
+        self._issue()
+        self.refresh_token = "refresh"
+
+    def renew_access_token(self):
+        """Renew the tokens, with the refresh token."""
+        time.sleep(0.01)
+        self.renewals += 1
+        self._issue()
+
+    def _issue(self):
+        exp = time.time() + self.lifetime
+        self.id_token = fake_token(exp)
+        self.access_token = fake_token(exp)
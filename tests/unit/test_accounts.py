@@ -0,0 +1,44 @@
+"""Account manager unit tests."""
+from unittest.mock import Mock
+
+import pytest
+from edp.redy import accounts
+from edp.redy.accounts import AccountManager
+
+from tests.unit.conftest import FakeCognito
+
+
+@pytest.mark.asyncio
+async def test_accounts_share_pools_but_not_tokens(monkeypatch):
+    """The accounts share the pools, but keep their own tokens."""
+    cognitos = {}
+
+    def get_cognito(user_pool_id, client_id, region):
+        cognito = FakeCognito(lifetime=3600)
+        cognitos[len(cognitos)] = cognito
+        return cognito
+
+    monkeypatch.setattr(accounts, "get_cognito", get_cognito)
+    manager = AccountManager(renewal_spread=300)
+    manager._identity_client = Mock()
+
+    first = await manager.add_account("first", "password")
+    second = await manager.add_account("second", "password")
+
+    assert manager.usernames == ["first", "second"]
+    assert first.api._session is second.api._session is manager._session
+    auth = [manager._accounts[name].auth for name in manager.usernames]
+    assert auth[0]._executor is auth[1]._executor is manager.executor
+    assert (
+        auth[0].cognito_identity._cognito_identity
+        is auth[1].cognito_identity._cognito_identity
+    )
+    assert cognitos[0].username == "first"
+    assert cognitos[1].username == "second"
+    assert auth[0].cognito_user._renewal_jitter == 300
+    with pytest.raises(ValueError):
+        await manager.add_account("first", "password")
+
+    await manager.stop()
+    assert manager.usernames == []
+    assert manager._session is None
@@ -0,0 +1,375 @@
+"""API service unit tests."""
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from edp.redy.services.api import ApiService
+from edp.redy.services.api import CircuitOpenError
+from edp.redy.services.api import GetRequest
+from edp.redy.services.api import ResponseError
+from edp.redy.services.api import TransportError
+from edp.redy.services.cache import cache_key
+from edp.redy.services.cache import MemoryResponseCache
+from edp.redy.services.cassette import Cassette
+from edp.redy.services.cassette import CassetteMiss
+from edp.redy.services.cassette import CassetteMode
+from edp.redy.services.fakeserver import FakeRedyServer
+from edp.redy.services.jsonbackend import get_json_backend
+from edp.redy.services.ratelimit import AdaptiveRateLimiter
+from edp.redy.services.ratelimit import parse_retry_after
+from edp.redy.services.ratelimit import RateLimitConfig
+from edp.redy.services.retry import CircuitBreaker
+from edp.redy.services.retry import CircuitState
+from edp.redy.services.retry import RetryPolicy
+from edp.redy.services.singleflight import SingleFlight
+
+
+class _StubCognitoUser:
+    def __init__(self):
+        self.refreshes = 0
+        self.error = None
+
+    @property
+    async def id_token(self):
+        if self.error is not None:
+            raise self.error
+        return f"token{self.refreshes or ''}"
+
+    async def refresh(self):
+        self.refreshes += 1
+
+
+class _StubAuth:
+    def __init__(self):
+        self.cognito_user = _StubCognitoUser()
+
+
+@pytest_asyncio.fixture
+async def server():
+    """Serve a local stand-in for the Redy API."""
+
+    async def houses(request: web.Request) -> web.Response:
+        return web.json_response(
+            {"houses": [], "auth": request.headers["authorization"]}
+        )
+
+    async def house_devices(request: web.Request) -> web.Response:
+        request.app["hits"]["devices"] += 1
+        await asyncio.sleep(0.01)
+        return web.json_response([{"houseId": request.match_info["house_id"]}])
+
+    async def throttled(request: web.Request) -> web.Response:
+        request.app["hits"]["throttled"] += 1
+        if request.app["hits"]["throttled"] == 1:
+            return web.json_response({}, status=429, headers={"Retry-After": "0.05"})
+        return web.json_response({"ok": True})
+
+    async def status(request: web.Request) -> web.Response:
+        key = request.path
+        request.app["hits"][key] = request.app["hits"].get(key, 0) + 1
+        if request.app["hits"][key] <= int(request.query.get("failures", 1)):
+            return web.json_response({}, status=int(request.match_info["status"]))
+        return web.json_response({"auth": request.headers["authorization"]})
+
+    app = web.Application()
+    app["hits"] = {"devices": 0, "throttled": 0}
+    app.router.add_get("/status/{status}", status)
+    app.router.add_get("/throttled", throttled)
+    app.router.add_get("/equipment/houses", houses)
+    app.router.add_get("/equipment/houses/{house_id}/device", house_devices)
+    async with TestServer(app) as test_server:
+        yield test_server
+
+
+@pytest_asyncio.fixture
+async def api(server):
+    """Create an API service pointing to the local server."""
+    api = ApiService(
+        auth=_StubAuth(),  # type: ignore
+        base_url=f"http://{server.host}:{server.port}",
+        retry_policy=RetryPolicy(base_delay=0.001),
+    )
+    yield api
+    await api.stop()
+
+
+@pytest.mark.asyncio
+async def test_session_is_reused(api: ApiService):
+    """Requests share the pooled session opened on start."""
+    await api.start()
+    session = api._session
+
+    assert await api.get("/equipment/houses") == {"houses": [], "auth": "token"}
+    await api.get("/equipment/houses")
+
+    assert api._session is session
+
+
+@pytest.mark.asyncio
+async def test_stop_closes_session(api: ApiService):
+    """The session is opened lazily and closed on stop."""
+    await api.get("/equipment/houses")
+    assert api.started
+
+    await api.stop()
+    assert not api.started
+
+
+@pytest.mark.asyncio
+async def test_cached_endpoint(server, api: ApiService):
+    """Slow-changing endpoints are served from the cache until invalidated."""
+    api._cache = MemoryResponseCache()
+
+    await api.get("/equipment/houses/1/device")
+    await api.get("/equipment/houses/1/device")
+    await api.get("/equipment/houses/2/device")
+    assert server.app["hits"]["devices"] == 2
+
+    await api.invalidate(house_id="1")
+    await api.get("/equipment/houses/1/device")
+    await api.get("/equipment/houses/2/device")
+    assert server.app["hits"]["devices"] == 3
+
+    stats = api.cache_stats()
+    assert stats and (stats.hits, stats.misses, stats.size) == (2, 3, 2)
+
+
+@pytest.mark.asyncio
+async def test_cache_lru_eviction():
+    """The least recently used response is evicted first."""
+    cache = MemoryResponseCache(max_size=2)
+    await cache.set(cache_key("/a"), "a", ttl=60)
+    await cache.set(cache_key("/b"), "b", ttl=60)
+    await cache.get(cache_key("/a"))
+    await cache.set(cache_key("/c"), "c", ttl=60)
+
+    assert await cache.get(cache_key("/b")) is None
+    assert await cache.get(cache_key("/a")) == "a"
+    assert cache.stats().evictions == 1
+
+
+def test_cache_key_ignores_params_order():
+    """Parameters are normalized in the cache key."""
+    assert cache_key("/a", {"x": 1, "y": "2"}) == cache_key("/a", {"y": 2, "x": "1"})
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_are_coalesced(server, api: ApiService):
+    """Concurrent identical requests share a single round trip."""
+    responses = await asyncio.gather(
+        *(api.get("/equipment/houses/1/device") for _ in range(5)),
+        api.get("/equipment/houses/2/device"),
+    )
+
+    assert server.app["hits"]["devices"] == 2
+    assert responses[0] is responses[4]
+    stats = api.coalescing_stats()
+    assert stats and (stats.executed, stats.collapsed) == (2, 4)
+
+
+@pytest.mark.asyncio
+async def test_coalesced_call_cancelled_with_its_callers():
+    """The shared call runs while a caller waits, and stops with the last."""
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def call():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    single_flight = SingleFlight()
+    callers = [asyncio.ensure_future(single_flight.do("key", call)) for _ in range(2)]
+    await started.wait()
+
+    callers[0].cancel()
+    await asyncio.sleep(0.01)
+    assert not cancelled.is_set()
+
+    callers[1].cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert cancelled.is_set()
+    assert single_flight.stats().in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_throttled_requests_slow_down(api: ApiService):
+    """A 429 reduces the rate, honours Retry-After and retries."""
+    api._limiter = AdaptiveRateLimiter(RateLimitConfig(rate=20, decrease_factor=0.5))
+
+    assert await api.get("/throttled") == {"ok": True}
+
+    stats = api.rate_limit_stats()
+    assert stats and stats.throttled == 1
+    assert 10 <= stats.rate < 20
+
+
+def test_parse_retry_after():
+    """Retry-After is accepted as seconds or as an HTTP date."""
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried(server, api: ApiService):
+    """Server errors are retried with backoff."""
+    assert await api.get("/status/500") == {"auth": "token"}
+    assert server.app["hits"]["/status/500"] == 2
+
+
+@pytest.mark.asyncio
+async def test_permanent_errors_are_not_retried(server, api: ApiService):
+    """Client errors are raised at once."""
+    with pytest.raises(ResponseError) as error:
+        await api.get("/status/404")
+
+    assert error.value.status == 404
+    assert server.app["hits"]["/status/404"] == 1
+
+
+@pytest.mark.asyncio
+async def test_auth_errors_renew_the_tokens(api: ApiService):
+    """Rejected tokens are renewed once, and the request retried."""
+    assert await api.get("/status/401") == {"auth": "token1"}
+
+    with pytest.raises(ResponseError):
+        await api.get("/status/403", params={"failures": 2})
+    assert api._auth.cognito_user.refreshes == 2
+
+
+@pytest.mark.asyncio
+async def test_network_errors_open_the_circuit(api: ApiService):
+    """The circuit opens after repeated failures, and fails fast."""
+    api._base_url = "http://127.0.0.1:1"
+    api._breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+
+    with pytest.raises(TransportError):
+        await api.get("/equipment/houses")
+    assert api.circuit_state == CircuitState.Open
+
+    with pytest.raises(CircuitOpenError):
+        await api.get("/equipment/houses")
+
+
+@pytest.mark.asyncio
+async def test_server_errors_open_the_circuit(server, api: ApiService):
+    """Repeated 503s open the circuit, though classified as throttling."""
+    api._breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+
+    with pytest.raises(ResponseError):
+        await api.get("/status/503", params={"failures": 10})
+    assert api.circuit_state == CircuitState.Open
+    assert server.app["hits"]["/status/503"] == 3
+
+
+@pytest.mark.asyncio
+async def test_aborted_probe_is_released(api: ApiService):
+    """A probe failing before reaching the API lets the next one through."""
+    api._breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    api._breaker.on_failure()
+    assert api.circuit_state == CircuitState.HalfOpen
+
+    api._auth.cognito_user.error = RuntimeError("Not logged in")
+    with pytest.raises(RuntimeError):
+        await api.get("/equipment/houses")
+    api._auth.cognito_user.error = None
+
+    assert await api.get("/equipment/houses") == {"houses": [], "auth": "token"}
+    assert api.circuit_state == CircuitState.Closed
+
+
+@pytest.mark.asyncio
+async def test_get_many(api: ApiService):
+    """Batched results keep their order, and failures don't abort the batch."""
+    results = await api.get_many(
+        [
+            GetRequest("/equipment/houses/1/device"),
+            GetRequest("/status/404", params={"failures": 5}),
+            GetRequest("/equipment/houses/2/device"),
+        ],
+        max_concurrency=2,
+    )
+
+    assert [result.ok for result in results] == [True, False, True]
+    assert results[2].unwrap() == [{"houseId": "2"}]
+    with pytest.raises(ResponseError):
+        results[1].unwrap()
+
+
+def test_json_backends():
+    """Every installed backend parses bytes, and unknown ones are rejected."""
+    for name in ("json", "orjson", "ujson"):
+        try:
+            backend = get_json_backend(name)
+        except ImportError:
+            continue
+        assert backend.loads(b'{"a": [1]}') == {"a": [1]}
+        assert backend.loads(backend.dumps({"a": 1})) == {"a": 1}
+
+    with pytest.raises(ValueError):
+        get_json_backend("yaml")
+
+
+@pytest.mark.asyncio
+async def test_stats_are_keyed_by_template(api: ApiService):
+    """Requests are measured per url template, and reported to the hooks."""
+    events: list = []
+    api.add_hook(events.append)
+
+    await api.get("/equipment/houses/1/device")
+    await api.get("/equipment/houses/2/device")
+    await api.get("/status/500")
+
+    endpoints = api.stats().endpoints
+    devices = endpoints["/equipment/houses/{house_id}/device"]
+    assert (devices.requests, devices.errors, devices.retries) == (2, 0, 0)
+    assert devices.bytes_received > 0
+    assert 0 < devices.latency_quantile(0.99) <= devices.latency_max
+    other = endpoints["other"]
+    assert (other.requests, other.errors, other.retries) == (2, 1, 1)
+    assert [event.type.value for event in events] == [
+        "response",
+        "response",
+        "error",
+        "retry",
+        "response",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cassette_record_and_replay(tmp_path):
+    """Recorded responses are replayed without reaching the API."""
+    path = str(tmp_path / "cassette.json")
+    params = {"start": "2023-01-01", "end": "2023-01-31", "resolution": "D"}
+    metering = "/meteringapi/house/h/device/d/module/m/energy/graph"
+
+    async with FakeRedyServer() as server:
+        api = ApiService(
+            auth=_StubAuth(),  # type: ignore
+            base_url=server.url,
+            cassette=Cassette(path, mode=CassetteMode.Record),
+        )
+        houses = await api.get("/equipment/houses")
+        energy = await api.get(metering, params=params)
+        await api.stop()
+
+    api = ApiService(
+        auth=_StubAuth(),  # type: ignore
+        base_url="http://127.0.0.1:9",
+        cassette=Cassette(path),
+        retry_policy=RetryPolicy(max_attempts=1),
+    )
+    assert await api.get("/equipment/houses") == houses
+    assert await api.get(metering, params=params) == energy
+    assert len(energy["energyChart"]) == 31
+    with pytest.raises(CassetteMiss):
+        await api.get(metering, params={**params, "resolution": "M"})
+    await api.stop()
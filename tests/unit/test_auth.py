@@ -0,0 +1,272 @@
+"""Auth service unit tests."""
+import asyncio
+import os
+import stat
+import threading
+import time
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from unittest.mock import Mock
+
+import pytest
+from edp.redy.app import App
+from edp.redy.services.auth import AuthService
+from edp.redy.services.auth import CognitoIdentity
+from edp.redy.services.auth import CognitoUser
+from edp.redy.services.auth import jwt_expiration
+from edp.redy.services.executor import BoundedExecutor
+from edp.redy.services.tokenstore import FileTokenStore
+from edp.redy.services.tokenstore import StoredTokens
+
+from tests.unit.conftest import fake_token
+from tests.unit.conftest import FakeCognito
+
+
+def test_jwt_expiration():
+    """The expiration is read from the token claims."""
+    assert jwt_expiration(fake_token(1234)) == 1234
+    assert jwt_expiration(None) == 0
+
+
+@pytest.mark.asyncio
+async def test_id_token_fast_path():
+    """A valid token is returned without renewing it."""
+    cognito = FakeCognito(lifetime=3600)
+    user = CognitoUser(cognito_user=cognito)  # type: ignore
+    await user.login("user", "password")
+
+    assert await user.id_token == cognito.id_token
+    assert cognito.renewals == 0
+    assert user.token_expiration is not None
+    user._auth_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_renewals_are_coalesced():
+    """Callers within the refresh window share a single renewal."""
+    cognito = FakeCognito(lifetime=30)
+    user = CognitoUser(cognito_user=cognito, refresh_window=60)  # type: ignore
+    await user.login("user", "password")
+    cognito.lifetime = 3600
+
+    tokens = await asyncio.gather(*(user.id_token for _ in range(10)))
+
+    assert cognito.renewals == 1
+    assert set(tokens) == {cognito.id_token}
+    user._auth_task.cancel()
+
+
+def test_file_token_store(tmp_path):
+    """The tokens are stored in a file only readable by its owner."""
+    path = tmp_path / "tokens.json"
+    store = FileTokenStore(str(path))
+    assert store.load() is None
+
+    tokens = StoredTokens("user", "id", "access", "refresh")
+    store.save(tokens)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert store.load() == tokens
+
+    os.chmod(path, 0o644)
+    assert store.load() is None
+
+
+def _auth_service(cognito: FakeCognito, store: FileTokenStore) -> AuthService:
+    user = CognitoUser(cognito_user=cognito)  # type: ignore
+    identity = CognitoIdentity(user, cognito_identity=Mock())
+    return AuthService(user, identity, token_store=store)
+
+
+@pytest.mark.asyncio
+async def test_session_is_resumed_from_the_store(tmp_path):
+    """A stored session is resumed without authenticating again."""
+    store = FileTokenStore(str(tmp_path / "tokens.json"))
+    cognito = FakeCognito(lifetime=3600)
+    auth = _auth_service(cognito, store)
+    assert not await auth.resume("user")
+    await auth.login("user", "password")
+    await auth.flush_tokens()
+    auth.cognito_user._auth_task.cancel()
+
+    # A new process, whose tokens already expired
+    cognito = FakeCognito(lifetime=3600)
+    cognito.authenticate = Mock()
+    stored = store.load()
+    assert stored is not None
+    stored.id_token = stored.access_token = fake_token(time.time() - 10)
+    store.save(stored)
+    auth = _auth_service(cognito, store)
+
+    assert await auth.resume("user")
+    assert cognito.renewals == 1
+    cognito.authenticate.assert_not_called()
+    await auth.flush_tokens()
+    assert store.load().id_token == cognito.id_token  # type: ignore
+    assert not await _auth_service(FakeCognito(3600), store).resume("other")
+    auth.cognito_user._auth_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_tokens_are_saved_off_the_loop(tmp_path):
+    """The tokens are written by the auth executor, and flushed on stop."""
+    store = FileTokenStore(str(tmp_path / "tokens.json"))
+    threads = []
+    save = store.save
+
+    def save_in_thread(tokens):
+        threads.append(threading.current_thread().name)
+        save(tokens)
+
+    store.save = save_in_thread  # type: ignore
+    auth = _auth_service(FakeCognito(lifetime=3600), store)
+    await auth.login("user", "password")
+    await auth.stop()
+
+    assert threads and all(name.startswith("redy-auth") for name in threads)
+    assert store.load() is not None
+
+
+@pytest.mark.asyncio
+async def test_tokens_are_renewed_before_expiring():
+    """The tokens are renewed from their expiration, with the refresh token."""
+    cognito = FakeCognito(lifetime=1.2)
+    cognito.authenticate = Mock(wraps=cognito.authenticate)
+    user = CognitoUser(cognito, refresh_window=1, renewal_jitter=0)  # type: ignore
+    await user.login("user", "password")
+    assert user.next_renewal is not None
+    cognito.lifetime = 3600
+
+    await asyncio.sleep(0.5)
+
+    assert cognito.renewals == 1
+    assert cognito.authenticate.call_count == 1
+    assert user.next_renewal.timestamp() > time.time() + 3000
+    await user.stop()
+
+
+class _FakeIdentityClient:
+    def __init__(self, lifetime: float):
+        self.lifetime = lifetime
+        self.calls = 0
+
+    def get_credentials_for_identity(self, IdentityId, Logins):
+        time.sleep(0.01)
+        self.calls += 1
+        return {
+            "Credentials": {
+                "AccessKeyId": f"key{self.calls}",
+                "SecretKey": f"secret{self.calls}",
+                "SessionToken": f"session{self.calls}",
+                "Expiration": datetime.now(timezone.utc)
+                + timedelta(seconds=self.lifetime),
+            }
+        }
+
+
+@pytest.mark.asyncio
+async def test_identity_credentials_are_single_flight():
+    """Concurrent callers share a renewal, and get consistent snapshots."""
+    user = CognitoUser(FakeCognito(lifetime=3600))  # type: ignore
+    await user.login("user", "password")
+    client = _FakeIdentityClient(lifetime=3600)
+    identity = CognitoIdentity(user, client)  # type: ignore
+
+    snapshots = await asyncio.gather(*(identity.credentials() for _ in range(10)))
+
+    assert client.calls == 1
+    assert {s.session_token for s in snapshots} == {"session1"}
+    assert identity.current_credentials == snapshots[0]
+    await identity.stop()
+    await user.stop()
+
+
+@pytest.mark.asyncio
+async def test_identity_credentials_are_refreshed_ahead():
+    """The credentials are renewed in the background before expiring."""
+    user = CognitoUser(FakeCognito(lifetime=3600))  # type: ignore
+    await user.login("user", "password")
+    client = _FakeIdentityClient(lifetime=1.2)
+    identity = CognitoIdentity(user, client, refresh_ahead=1)  # type: ignore
+
+    assert (await identity.credentials()).session_token == "session1"
+    client.lifetime = 3600
+    await asyncio.sleep(0.5)
+
+    assert client.calls == 2
+    assert identity.current_credentials.session_token == "session2"  # type: ignore
+    await identity.stop()
+    await user.stop()
+
+
+@pytest.mark.asyncio
+async def test_auth_service_stop_cancels_the_renewals():
+    """Stopping the auth service cancels the scheduled renewals."""
+    user = CognitoUser(FakeCognito(lifetime=3600))  # type: ignore
+    identity = CognitoIdentity(user, _FakeIdentityClient(lifetime=3600))  # type: ignore
+    auth = AuthService(user, identity)
+    await auth.login("user", "password")
+    await identity.credentials()
+    tasks = [user._auth_task, identity._refresh_task]
+
+    await auth.stop()
+
+    assert all(task is not None and task.cancelled() for task in tasks)
+    assert user._auth_task is None and identity._refresh_task is None
+
+
+@pytest.mark.asyncio
+async def test_app_stop_leaves_no_tasks():
+    """Stopping the app stops the auth service, and its background tasks."""
+    user = CognitoUser(FakeCognito(lifetime=3600))  # type: ignore
+    identity = CognitoIdentity(user, _FakeIdentityClient(lifetime=3600))  # type: ignore
+    auth = AuthService(user, identity)
+    await auth.login("user", "password")
+    await identity.credentials()
+    app = App(Mock(), Mock(), Mock(), Mock(), Mock(), auth_service=auth)
+
+    await app.stop()
+
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+    assert auth._executor._shutdown
+
+
+@pytest.mark.asyncio
+async def test_bounded_executor():
+    """Blocking calls beyond the workers wait in the queue, and are measured."""
+    executor = BoundedExecutor(max_workers=1)
+    calls = [asyncio.ensure_future(executor.run(time.sleep, 0.02)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    assert executor.stats().queued == 2
+    assert executor.stats().running == 1
+
+    await asyncio.gather(*calls)
+    with pytest.raises(ZeroDivisionError):
+        await executor.run(lambda: 1 / 0)
+    stats = executor.stats()
+    assert (stats.completed, stats.failed, stats.queued) == (3, 1, 0)
+    assert stats.wait_max >= 0.02
+    assert stats.duration_max >= 0.02
+
+    running = asyncio.ensure_future(executor.run(time.sleep, 0.02))
+    waiting = asyncio.ensure_future(executor.run(time.sleep, 0))
+    await asyncio.sleep(0.01)
+    waiting.cancel()
+    await asyncio.gather(running, waiting, return_exceptions=True)
+    assert executor.stats().queued == 0
+
+    await executor.shutdown()
+    with pytest.raises(RuntimeError):
+        await executor.run(time.sleep, 0)
+
+
+@pytest.mark.asyncio
+async def test_auth_service_executor():
+    """The blocking calls run in the executor owned by the auth service."""
+    user = CognitoUser(FakeCognito(lifetime=3600))  # type: ignore
+    auth = AuthService(user, CognitoIdentity(user, Mock()))
+    await auth.login("user", "password")
+
+    assert auth.executor_stats().completed == 1
+    await auth.stop()
+    assert auth._executor._shutdown
@@ -0,0 +1,16 @@
+"""Import unit tests."""
+import subprocess
+import sys
+
+
+def test_heavy_dependencies_are_imported_lazily():
+    """Importing the app and CLI doesn't load the AWS dependencies."""
+    code = (
+        "import sys, edp.redy.app, edp.redy.cli.cli; "
+        "print(sorted({m.split('.')[0] for m in sys.modules} "
+        "& {'boto3', 'botocore', 'warrant', 'awscrt', 'awsiot'}))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,504 @@
+"""Stream service unit tests."""
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+from unittest.mock import AsyncMock
+from unittest.mock import Mock
+
+import pytest
+from edp.redy.app import get_api_stream
+from edp.redy.app import POWER_VARIABLES
+from edp.redy.services import streampool
+from edp.redy.services.ingest import IngestQueue
+from edp.redy.services.ingest import OverflowPolicy
+from edp.redy.services.ingest import StreamMessage
+from edp.redy.services.jsonbackend import get_json_backend
+from edp.redy.services.jsonbackend import JsonBackend
+from edp.redy.services.keepalive import KeepaliveScheduler
+from edp.redy.services.retry import RetryPolicy
+from edp.redy.services.stream import DeviceType
+from edp.redy.services.stream import Stream
+from edp.redy.services.stream import StreamDevice
+from edp.redy.services.stream import StreamService
+from edp.redy.services.streampool import StreamPool
+from edp.redy.services.updates import UpdateFilter
+
+
+def _notification(local_id: str, power: int) -> bytes:
+    return json.dumps(
+        {
+            "messageType": "notification",
+            "operationType": "realtime",
+            "data": [
+                {
+                    "localId": local_id,
+                    "stateVariables": {"emeter:power_aplus": {"value": power}},
+                }
+            ],
+        }
+    ).encode()
+
+
+@pytest.mark.asyncio
+async def test_messages_handed_off_to_the_service_loop():
+    """The callbacks run in the service loop, whatever thread got the message."""
+    service = StreamService(auth=None)  # type: ignore
+    received = []
+    loop = asyncio.get_running_loop()
+
+    async def on_notification(operation_type, data):
+        assert asyncio.get_running_loop() is loop
+        received.append(data["stateVariables"]["emeter:power_aplus"]["value"])
+
+    service.add_callback(on_notification_cb=on_notification)
+    service._start_dispatcher()
+
+    def produce():
+        for power in range(100):
+            service._on_message_received("topic", _notification("m", power), 0, 1, 0)
+        service._on_message_received("topic", b"not json", 0, 1, 0)
+
+    thread = threading.Thread(target=produce)
+    thread.start()
+    thread.join()
+    while len(received) < 100:
+        await asyncio.sleep(0.01)
+    await service._stop_dispatcher()
+
+    assert received == list(range(100))
+    # Messages received once stopped are dropped
+    service._on_message_received("topic", _notification("m", 0), 0, 1, 0)
+    assert len(received) == 100
+
+
+@pytest.mark.asyncio
+async def test_failed_start_stops_the_dispatcher():
+    """Neither the dispatcher nor the socket outlive a failed start."""
+    service = StreamService(auth=Mock())
+    service.add_devices([StreamDevice("device", DeviceType.WIFI)])
+    stream = service._stream
+    connection = _FakeConnection(stream)
+    connection.disconnect = Mock(wraps=connection.disconnect)  # type: ignore
+
+    def subscribe(topic, qos, callback):
+        future = concurrent.futures.Future()
+        future.set_exception(ConnectionError("refused"))
+        return future, 1
+
+    connection.subscribe = subscribe  # type: ignore
+    stream._create_connection = AsyncMock(return_value=connection)  # type: ignore
+
+    with pytest.raises(ConnectionError):
+        await service.start()
+
+    connection.disconnect.assert_called_once()
+    assert service._dispatcher is None
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+    # Stopping a stream whose connection was never created is safe
+    await Stream(Mock()).stop()
+
+
+def _message(local_id: str, variables: dict) -> StreamMessage:
+    return StreamMessage(
+        "topic",
+        "notification",
+        "realtime",
+        {"localId": local_id, "stateVariables": variables},
+        received=time.monotonic(),
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "policy,expected",
+    [
+        (OverflowPolicy.DropOldest, [{"v": 2}, {"v": 3}]),
+        (OverflowPolicy.DropNewest, [{"v": 0, "w": 1}, {"v": 1}]),
+        (OverflowPolicy.Conflate, [{"v": 3, "w": 1}]),
+    ],
+)
+async def test_ingest_queue_overflow(policy, expected):
+    """A full queue drops or conflates the messages, as configured."""
+    queue = IngestQueue(maxsize=2, policy=policy)
+    queue.put_nowait(_message("m", {"v": 0, "w": 1}))
+    for value in range(1, 4):
+        queue.put_nowait(_message("m", {"v": value}))
+
+    stats = queue.stats()
+    assert stats.depth == len(expected)
+    assert stats.received == 4
+    assert stats.dropped + stats.conflated == 4 - len(expected)
+    assert [(await queue.get()).data["stateVariables"] for _ in expected] == expected
+    assert queue.stats().depth == 0
+
+
+@pytest.mark.asyncio
+async def test_ingest_queue_blocks_the_producer():
+    """With the block policy, the receiving thread waits for a free slot."""
+    queue = IngestQueue(maxsize=2, policy=OverflowPolicy.Block)
+    thread = threading.Thread(
+        target=lambda: [queue.put_threadsafe(_message(str(i), {})) for i in range(5)]
+    )
+    thread.start()
+    await asyncio.sleep(0.05)
+    assert thread.is_alive()
+    assert queue.stats().depth == 2
+
+    assert [(await queue.get()).data["localId"] for _ in range(5)] == list("01234")
+    thread.join(1)
+    assert not thread.is_alive()
+    assert queue.stats().dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_updates_iterator_filters_the_updates():
+    """The iterators yield the filtered updates, until the service stops."""
+    service = StreamService(auth=None)  # type: ignore
+    service._start_dispatcher()
+    updates = []
+
+    async def consume():
+        async for update in service.updates(
+            UpdateFilter(local_ids={"m"}, variables={"emeter:power_aplus"})
+        ):
+            updates.append(update)
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.sleep(0)
+    for power in range(3):
+        service._on_message_received("topic", _notification("m", power), 0, 1, 0)
+        service._on_message_received("topic", _notification("other", power), 0, 1, 0)
+    while len(updates) < 3:
+        await asyncio.sleep(0.01)
+    await service._stop_dispatcher()
+    await asyncio.wait_for(consumer, 1)
+
+    assert [(u.localId, u.variable, u.value) for u in updates] == [
+        ("m", "emeter:power_aplus", {"value": power}) for power in range(3)
+    ]
+    assert all(u.received <= time.time() for u in updates)
+    assert service._update_buffers == []
+
+
+class _FakeConnection:
+    """In memory stand-in for an awscrt MQTT connection."""
+
+    def __init__(self, stream, fail=False):
+        self.client_id = "client"
+        self.subscribed = []
+        self.published = []
+        self._stream = stream
+        self._fail = fail
+
+    def _done(self, result=None):
+        future = concurrent.futures.Future()
+        if self._fail:
+            future.set_exception(ConnectionError("refused"))
+        else:
+            future.set_result(result)
+        return future
+
+    def connect(self):
+        return self._done()
+
+    def disconnect(self):
+        return self._done()
+
+    def subscribe(self, topic, qos, callback):
+        self.subscribed.append(topic)
+        return self._done(), 1
+
+    def unsubscribe(self, topic):
+        self.subscribed.remove(topic)
+        return self._done(), 1
+
+    def publish(self, topic, payload, qos):
+        self.published.append(topic)
+        return self._done(), 1
+
+    def interrupt(self):
+        # As awscrt does, from one of its threads
+        thread = threading.Thread(
+            target=self._stream._on_connection_interrupted, args=(self, None)
+        )
+        thread.start()
+        thread.join()
+
+
+@pytest.mark.asyncio
+async def test_stream_rebuilds_a_lost_connection():
+    """A connection not resuming is rebuilt, with new credentials."""
+    auth = Mock()
+    auth.cognito_identity.refresh = AsyncMock()
+    stream = Stream(
+        auth,
+        reconnect_policy=RetryPolicy(base_delay=0.01, jitter=0),
+        reconnect_grace=0.01,
+    )
+    stream.add_devices([StreamDevice("device", DeviceType.WIFI)])
+    connections = [_FakeConnection(stream, fail=fail) for fail in (0, 1, 0)]
+    stream._create_connection = AsyncMock(side_effect=connections)  # type: ignore
+
+    await stream.start()
+    connections[0].interrupt()
+    while not stream.stats().reconnects:
+        await asyncio.sleep(0.01)
+    subscribed = list(connections[2].subscribed)
+    await stream.stop()
+
+    stats = stream.stats()
+    assert stats.interruptions == 1
+    assert stats.failed_reconnects == 1
+    assert stats.downtime_max > 0.01
+    assert auth.cognito_identity.refresh.await_count == 2
+    assert subscribed == list(stream._device_topics("device"))
+    assert connections[2].published == ["wifi/device/toDev/realtime"]
+    assert not stats.connected
+    assert not stream._keepalive.running
+
+
+@pytest.mark.asyncio
+async def test_keepalive_scheduler_renews_the_requests():
+    """A single task renews the requests, early when the timeout changes."""
+    requests = []
+
+    async def request(device_id, timeout):
+        requests.append((device_id, timeout))
+
+    scheduler = KeepaliveScheduler(request, margin=0.05, jitter=0.5)
+    scheduler.add("a", timeout=0.1)
+    scheduler.add("b", timeout=10)
+    scheduler.start()
+    await asyncio.sleep(0.2)
+    assert requests.count(("b", 10)) == 1
+    assert requests.count(("a", 0.1)) >= 3
+
+    scheduler.set_timeout("b", 20)
+    scheduler.remove("a")
+    await asyncio.sleep(0.01)
+    assert requests[-1] == ("b", 20)
+    count = len(requests)
+    await asyncio.sleep(0.1)
+    assert len(requests) == count
+
+    await scheduler.stop()
+    assert not scheduler.running
+    assert scheduler.devices == []
+
+
+@pytest.mark.asyncio
+async def test_keepalive_timeout_within_the_margin():
+    """A timeout not above the margin is still renewed, without spinning."""
+    requests = []
+
+    async def request(device_id, timeout):
+        requests.append(device_id)
+
+    scheduler = KeepaliveScheduler(request, margin=5, jitter=0)
+    assert scheduler._next_deadline(0.05) >= time.monotonic() + 0.02
+    with pytest.raises(ValueError):
+        scheduler.add("b", timeout=0)
+
+    scheduler.add("a", timeout=0.05)
+    scheduler.start()
+    await asyncio.sleep(0.1)
+    await scheduler.stop()
+    assert 2 <= len(requests) <= 10
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("wildcard", [False, True])
+async def test_stream_subscribes_concurrently(wildcard):
+    """The topics are subscribed concurrently, up to the cap."""
+    stream = Stream(Mock(), subscribe_concurrency=4, wildcard_topics=wildcard)
+    stream.add_devices([StreamDevice(f"d{i}", DeviceType.WIFI) for i in range(5)])
+    in_flight = set()
+    most_in_flight = 0
+    subscribed = []
+
+    async def subscribe(topic):
+        nonlocal most_in_flight
+        in_flight.add(topic)
+        most_in_flight = max(most_in_flight, len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.discard(topic)
+        subscribed.append(topic)
+
+    await stream._for_each_topic(subscribe, stream._devices)
+
+    assert len(subscribed) == (5 if wildcard else 15)
+    assert most_in_flight == 4
+    if wildcard:
+        assert sorted(subscribed) == [f"wifi/d{i}/fromDev/#" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_devices_added_and_removed_on_the_live_connection():
+    """Devices are (un)subscribed without rebuilding the connection."""
+    stream = Stream(Mock())
+    stream.add_devices([StreamDevice("a", DeviceType.WIFI)])
+    connection = _FakeConnection(stream)
+    stream._create_connection = AsyncMock(return_value=connection)  # type: ignore
+    await stream.start()
+
+    await stream.subscribe_device(StreamDevice("b", DeviceType.WIFI, timeout=30))
+    with pytest.raises(ValueError):
+        await stream.subscribe_device(StreamDevice("b", DeviceType.WIFI))
+    assert connection.subscribed == [
+        *stream._device_topics("a"),
+        *stream._device_topics("b"),
+    ]
+    assert stream._keepalive.devices == ["a", "b"]
+
+    await stream.unsubscribe_device("a")
+    assert connection.subscribed == list(stream._device_topics("b"))
+    assert stream._keepalive.devices == ["b"]
+    with pytest.raises(KeyError):
+        await stream.unsubscribe_device("a")
+    assert stream._create_connection.await_count == 1
+    await stream.stop()
+    assert connection.subscribed == []
+
+
+@pytest.mark.asyncio
+async def test_live_device_changes_survive_a_restart():
+    """The devices added and removed while started are kept on restart."""
+    service = StreamService(auth=Mock())
+    service.add_devices([StreamDevice("a", DeviceType.WIFI)])
+    stream = service._stream
+    connections = [_FakeConnection(stream), _FakeConnection(stream)]
+    stream._create_connection = AsyncMock(side_effect=connections)  # type: ignore
+    await service.start()
+
+    await service.subscribe_device(StreamDevice("b", DeviceType.WIFI))
+    await service.unsubscribe_device("a")
+    with pytest.raises(ValueError):
+        await service.subscribe_device(StreamDevice("b", DeviceType.WIFI))
+    with pytest.raises(ValueError):
+        await service.subscribe_device(StreamDevice("c", "zigbee"))  # type: ignore
+    await service.stop()
+    await service.start()
+
+    assert connections[1].subscribed == list(stream._device_topics("b"))
+    await service.stop()
+
+
+@pytest.mark.asyncio
+async def test_stream_pool_shards_and_rebalances_the_devices(monkeypatch):
+    """The devices are sharded, and moved off a connection staying down."""
+    monkeypatch.setattr(streampool, "REBALANCE_CHECK_PERIOD", 0.01)
+
+    def create_stream():
+        stream = Stream(Mock(), reconnect_grace=60)
+        connection = _FakeConnection(stream)
+        stream._create_connection = AsyncMock(return_value=connection)  # type: ignore
+        return stream
+
+    received = []
+    pool = StreamPool(
+        Mock(),
+        max_devices_per_connection=2,
+        max_connections=4,
+        rebalance_after=0.05,
+        stream_factory=Mock(side_effect=create_stream),
+    )
+    pool.add_devices([StreamDevice(f"d{i}", DeviceType.WIFI) for i in range(5)])
+    pool.add_callback(lambda topic, *args: received.append(topic))
+    await pool.start()
+    assert pool.connections == 3
+    # No connection is built just to read the capacity
+    assert pool._stream_factory.call_count == 3  # type: ignore
+    assert sorted(len(shard.devices) for shard in pool._shards) == [1, 2, 2]
+
+    pool._shards[1]._callback("wifi/d1/fromDev/realtime", b"{}", 0, 1, 0)
+    assert received == ["wifi/d1/fromDev/realtime"]
+
+    # The least loaded connection takes the new device
+    await pool.subscribe_device(StreamDevice("d5", DeviceType.WIFI))
+    assert pool.connection_of("d5") == 2
+    with pytest.raises(ValueError):
+        await pool.subscribe_device(StreamDevice("d5", DeviceType.WIFI))
+
+    lost = pool._shards[0]
+    lost_devices = lost.devices
+    lost._con.interrupt()
+    while pool.rebalanced < 2:
+        await asyncio.sleep(0.01)
+    assert lost.devices == []
+    assert pool.connections == 4
+    for device_id in lost_devices:
+        assert pool.connection_of(device_id) == 3
+    assert pool.stats().interruptions == 1
+
+    await pool.stop()
+    assert pool.connections == 0
+
+
+@pytest.mark.asyncio
+async def test_only_the_subscribed_variables_are_decoded():
+    """The unsubscribed variables are dropped, unparsed when possible."""
+    backend = get_json_backend()
+    loads = Mock(side_effect=backend.loads)
+    service = StreamService(
+        auth=None,  # type: ignore
+        json_backend=JsonBackend("spy", loads, backend.dumps),
+        variables=["emeter:power_aplus"],
+    )
+    service._start_dispatcher()
+    notifications = []
+    responses = []
+
+    async def on_notification(operation_type, data):
+        notifications.append(data)
+
+    async def on_response(operation_type, success, data):
+        responses.append(data)
+
+    service.add_callback(on_notification_cb=on_notification, on_response_cb=on_response)
+    voltage = json.dumps(
+        {
+            "messageType": "notification",
+            "operationType": "realtime",
+            "data": [{"localId": "m", "stateVariables": {"voltage": {"value": 230}}}],
+        }
+    ).encode()
+    response = json.dumps(
+        {
+            "messageType": "response",
+            "operationType": "realtime",
+            "success": True,
+            "data": {},
+        }
+    ).encode()
+    service._on_message_received("topic", voltage, 0, 1, 0)
+    assert loads.call_count == 0
+    both = json.dumps(
+        {
+            "messageType": "notification",
+            "operationType": "realtime",
+            "data": [
+                {
+                    "localId": "m",
+                    "stateVariables": {
+                        "emeter:power_aplus": {"value": 1},
+                        "voltage": {"value": 230},
+                    },
+                }
+            ],
+        }
+    ).encode()
+    service._on_message_received("topic", both, 0, 1, 0)
+    service._on_message_received("topic", response, 0, 1, 0)
+    while not responses:
+        await asyncio.sleep(0.01)
+    await service._stop_dispatcher()
+
+    assert loads.call_count == 2
+    assert loads.call_args.args[0] is response
+    assert notifications == [
+        {"localId": "m", "stateVariables": {"emeter:power_aplus": {"value": 1}}}
+    ]
+    # The app streams only the variables used by Power
+    assert get_api_stream(None)._variables == POWER_VARIABLES  # type: ignore